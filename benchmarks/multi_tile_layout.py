@@ -0,0 +1,103 @@
+'''
+Benchmark of the chip_channel_to_position builder of
+``multi_tile_layout.py`` on synthetic square tiles of chips with 8x8
+pixels each, one per channel: by default a tile of 10x10 chips (6400
+channels, as many as the 2.4.0 tile, whose 100 chips have 7x7 pixels
+and 15 unconnected channels each) and one of 20x20 chips.
+
+The legacy builder (the nested loops which recompute ``min(xs)`` and
+``min(ys)`` for every channel) is quadratic in the number of channels,
+so it is only run for tiles up to ``max_legacy_chips`` chips.
+
+    python benchmarks/multi_tile_layout.py --chips=100,400
+
+'''
+import time
+
+import numpy as np
+
+from larpixgeometry.layouts import patterngenerator as pg
+from larpixgeometry.layouts.multi_tile_layout import (PIXEL_PITCH,
+        chip_channel_positions)
+from larpixgeometry.pixelplane import PixelPlane
+
+def synthetic_tile(n_chips, pixel_pitch=PIXEL_PITCH):
+    '''
+    Return a square tile of ``n_chips`` chips (a perfect square) with 8x8
+    pixels per chip and one pixel per channel.
+
+    '''
+    side = int(round(np.sqrt(n_chips)))
+    if side * side != n_chips:
+        raise ValueError('Number of chips must be a perfect square')
+    chip_x, chip_y = np.meshgrid(np.arange(side), np.arange(side))
+    startx = chip_x.reshape(-1) * 8 * pixel_pitch + pixel_pitch/2
+    starty = chip_y.reshape(-1) * 8 * pixel_pitch + pixel_pitch/2
+    pixelids, x, y = pg.pixels_plain_grid_arrays(pixel_pitch, 1, 1, startx,
+            starty, np.arange(n_chips) * 64, batch_size=8, pixels_per_grid=64)
+    width = side * 8 * pixel_pitch
+    return PixelPlane.fromDict({
+        'pixels': pg.pixels_list(pixelids, x, y),
+        'chips': [[chipid + 11, pixelids[chipid*64:(chipid + 1)*64].tolist()]
+            for chipid in range(n_chips)],
+        'x': 0, 'y': 0, 'width': width, 'height': width})
+
+def legacy_chip_channel_positions(board, pixel_pitch=PIXEL_PITCH):
+    '''
+    The original chip_channel_to_position builder of
+    ``multi_tile_layout.generate_layout``.
+
+    '''
+    chipids = list(board.chips.keys())
+    chip_channel = {}
+
+    xs = []
+    ys = []
+    for chip in chipids:
+        for channel, pixel in enumerate(board.chips[chip].channel_connections):
+            if pixel.x !=0 and pixel.y != 0:
+                xs.append(pixel.x)
+                ys.append(pixel.y)
+
+    for chip in chipids:
+        for channel, pixel in enumerate(board.chips[chip].channel_connections):
+            if pixel.x !=0 and pixel.y != 0:
+                key = chip*1000+channel
+                chip_channel[key] = [round((pixel.x - min(xs))/pixel_pitch),
+                                     round((pixel.y - min(ys))/pixel_pitch)]
+    return chip_channel
+
+def _best_time(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def run(chips=(100, 400), repeat=3, max_legacy_chips=400):
+    '''
+    Time both builders for tiles with each number of chips in ``chips``
+    and print a table of the results.
+
+    '''
+    if isinstance(chips, int):
+        chips = (chips,)
+    print('%6s %9s %12s %14s %9s' % ('chips', 'channels', 'legacy [s]',
+        'vectorized [s]', 'speedup'))
+    for n_chips in chips:
+        board = synthetic_tile(n_chips)
+        fast, positions = _best_time(lambda: chip_channel_positions(board),
+                repeat)
+        slow = float('nan')
+        if n_chips <= max_legacy_chips:
+            slow, legacy = _best_time(lambda: legacy_chip_channel_positions(
+                board), 1)
+            if legacy != positions:
+                raise RuntimeError('Builders disagree for %d chips' % n_chips)
+        print('%6d %9d %12.3f %14.5f %9.0f' % (n_chips, len(positions), slow,
+            fast, slow / fast))
+
+if __name__ == '__main__':
+    import fire
+    fire.Fire(run)
@@ -0,0 +1,205 @@
+'''
+Benchmark suite for geometry generation, loading and lookup.
+
+Generates the shipped layouts by running the ``layout-*.py`` scripts in
+a temporary directory, then times for each layout:
+
+- ``generate``: running the layout script (``patterngenerator``)
+- ``load_yaml``: ``layouts.load`` parsing the YAML file
+- ``load_compiled``: ``layouts.load`` reading the compiled copy
+- ``from_dict``: ``PixelPlane.fromDict``
+- ``lookup_per_hit``: (chip, channel) -> (x, y) one hit at a time
+  through ``chips[chipid].channel_connections[channel]``
+- ``lookup_batch``: the same with ``channels_to_xy`` on arrays
+- ``channels_where``: selecting the pixels with ``x > 0``
+- ``channel_mask``: the same with a vectorized condition
+
+and ``multi_tile_layout.generate_layout`` on the 2.4.0 tile with
+synthetic network configurations for each number of tiles in
+``tiles``.
+
+Results are printed and, with ``--output``, written to a JSON file
+which records the environment along with one entry per measurement
+(``seconds`` is the best of ``repeat`` runs, ``rate`` is items per
+second where it applies), so runs can be compared over time::
+
+    python benchmarks/suite.py --output=results.json
+
+'''
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import larpixgeometry
+from larpixgeometry.layouts import load
+from larpixgeometry.layouts.multi_tile_layout import generate_layout
+from larpixgeometry.pixelplane import PixelPlane
+
+LAYOUTS_DIR = os.path.join(os.path.dirname(os.path.abspath(
+    larpixgeometry.__file__)), 'layouts')
+
+def _best_time(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def write_network_configs(directory, n_tiles, chipids=range(11, 111),
+        io_channels_per_tile=4):
+    '''
+    Write one synthetic network configuration per tile to
+    ``directory``, with the chips of each tile spread over
+    ``io_channels_per_tile`` IO channels and 8 tiles per IO group, and
+    return the path of the ``.txt`` file listing them.
+
+    '''
+    chipids = list(chipids)
+    per_channel = -(-len(chipids) // io_channels_per_tile)
+    names = []
+    for tile in range(n_tiles):
+        io_group = tile // 8 + 1
+        network = {}
+        for i in range(io_channels_per_tile):
+            io_channel = (tile % 8) * io_channels_per_tile + i + 1
+            nodes = [{'chip_id': 'ext'}] + [{'chip_id': chipid, 'root': True}
+                    for chipid in chipids[i*per_channel:(i + 1)*per_channel]]
+            network[str(io_channel)] = {'nodes': nodes}
+        name = os.path.join(directory, 'network-%03d.json' % (tile + 1))
+        with open(name, 'w') as f:
+            json.dump({'network': {str(io_group): network}}, f)
+        names.append(name)
+    listing = os.path.join(directory, 'network-%d.txt' % n_tiles)
+    with open(listing, 'w') as f:
+        f.write('\n'.join(names) + '\n')
+    return listing
+
+def generate_layouts(directory, repeat=1):
+    '''
+    Run every ``layout-*.py`` script in ``directory`` and return a dict
+    of layout version -> ``(yaml_path, seconds)``.
+
+    '''
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([LAYOUTS_DIR]
+            + env.get('PYTHONPATH', '').split(os.pathsep))
+    generated = {}
+    for script in sorted(glob.glob(os.path.join(LAYOUTS_DIR, 'layout-*.py'))):
+        version = os.path.basename(script)[len('layout-'):-len('.py')]
+        seconds = _best_time(lambda: subprocess.check_call(
+            [sys.executable, script], cwd=directory, env=env,
+            stdout=subprocess.DEVNULL), repeat)
+        generated[version] = (os.path.join(directory,
+            'layout-%s.yaml' % version), seconds)
+    return generated
+
+def benchmark_layout(path, repeat, hits, per_hit):
+    '''
+    Return the load and lookup measurements for one layout file.
+
+    '''
+    results = []
+    def record(name, seconds, n=None):
+        results.append({'name': name, 'seconds': seconds,
+            'n': n, 'rate': n / seconds if n and seconds else None})
+    for compiled_copy in glob.glob(os.path.splitext(path)[0] + '-*.npz'):
+        os.remove(compiled_copy)
+    record('load_yaml', _best_time(lambda: load(path, use_cache=False),
+        repeat))
+    load(path)
+    record('load_compiled', _best_time(lambda: load(path), repeat))
+    d = load(path)
+    record('from_dict', _best_time(lambda: PixelPlane.fromDict(d), repeat),
+            len(d['pixels']))
+    board = PixelPlane.fromDict(d)
+    columns = board.columns
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, len(columns['chipid']), hits)
+    chipids, channels = columns['chipid'][rows], columns['channel'][rows]
+    hit_list = list(zip(chipids[:per_hit].tolist(),
+        channels[:per_hit].tolist()))
+    def per_hit_lookup():
+        for chipid, channel in hit_list:
+            pixel = board.chips[chipid].channel_connections[channel]
+            pixel.x, pixel.y
+    record('lookup_per_hit', _best_time(per_hit_lookup, repeat), per_hit)
+    record('lookup_batch', _best_time(lambda: board.channels_to_xy(chipids,
+        channels), repeat), hits)
+    record('channels_where', _best_time(lambda: board.channels_where(
+        lambda pixel: pixel.x > 0), repeat), len(d['pixels']))
+    record('channel_mask', _best_time(lambda: board.channel_mask(
+        lambda c: c['x'] > 0), repeat), len(columns['x']))
+    return results
+
+def run(output=None, repeat=3, hits=1000000, per_hit=100000,
+        tiles=(1, 16, 64), layouts=None):
+    '''
+    Run the suite and print the results. ``layouts`` restricts the
+    per-layout measurements to the given versions (e.g. ``2.4.0``).
+    The compiled-layout cache is redirected to the temporary directory
+    for the duration of the run.
+
+    '''
+    if isinstance(tiles, int):
+        tiles = (tiles,)
+    if isinstance(layouts, str):
+        layouts = (layouts,)
+    directory = tempfile.mkdtemp(prefix='larpixgeometry-bench-')
+    cache_env = os.environ.get('LARPIXGEOMETRY_CACHE_DIR')
+    os.environ['LARPIXGEOMETRY_CACHE_DIR'] = os.path.join(directory, 'cache')
+    results = []
+    try:
+        generated = generate_layouts(directory)
+        for version, (path, seconds) in sorted(generated.items()):
+            if layouts is not None and version not in layouts:
+                continue
+            entries = [{'name': 'generate', 'seconds': seconds, 'n': None,
+                'rate': None}]
+            entries += benchmark_layout(path, repeat, hits, per_hit)
+            for entry in entries:
+                entry['layout'] = version
+            results += entries
+        tile_layout = generated['2.4.0'][0]
+        for n_tiles in tiles:
+            listing = write_network_configs(directory, n_tiles)
+            output_yaml = os.path.join(directory, 'multi-%d.yaml' % n_tiles)
+            seconds = _best_time(lambda: generate_layout(tile_layout, listing,
+                n_tiles, output=output_yaml), repeat)
+            results.append({'name': 'generate_layout', 'layout': '2.4.0',
+                'tiles': n_tiles, 'seconds': seconds, 'n': n_tiles,
+                'rate': n_tiles / seconds})
+    finally:
+        if cache_env is None:
+            del os.environ['LARPIXGEOMETRY_CACHE_DIR']
+        else:
+            os.environ['LARPIXGEOMETRY_CACHE_DIR'] = cache_env
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print('%-8s %-18s %6s %12s %14s' % ('layout', 'benchmark', 'tiles',
+        'seconds', 'rate [1/s]'))
+    for entry in results:
+        print('%-8s %-18s %6s %12.6f %14s' % (entry['layout'], entry['name'],
+            entry.get('tiles', ''), entry['seconds'],
+            '%.4g' % entry['rate'] if entry['rate'] else ''))
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'machine': platform.machine(),
+                'repeat': repeat,
+                'results': results}, f, indent=1)
+
+if __name__ == '__main__':
+    import fire
+    fire.Fire(run)
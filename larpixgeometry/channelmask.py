@@ -0,0 +1,367 @@
+'''
+Bitmaps of channels of a multi-tile anode, e.g. disabled channels.
+
+A ``ChannelMask`` holds one bit per dense channel index of a
+``MultiTileGeometry`` (one per row of its ``columns``, i.e. per
+channel connected to a pixel), packed 8 to a byte, so that the mask of
+a full module of 16 tiles (78400 connected channels) takes 9.8 kB.
+Masks of the same geometry combine with ``|``, ``&``, ``-``, ``^`` and
+``~`` one byte array operation at a time, and ``contains`` looks whole
+arrays of hits up in the mask.
+
+Channel lists are read and written in the format of the LArPix
+disabled channel lists: a dict from chip key
+``'<io_group>-<io_channel>-<chip_id>'`` to a list of channels, where
+the channels under the key ``'All'`` apply to every chip, stored as
+JSON or YAML.
+
+Channel lists often name channels which are not in the geometry, such
+as the channels of a chip which are not connected to a pixel. These
+have no bit, but are not dropped either: a mask keeps the channels
+named by ``fromDict`` and ``from_channels`` which are not in the
+geometry in ``unmatched``, a sorted array of packed keys (see
+``pack_address``), which set operations combine like the bits and
+``toDict`` writes back, so that a channel list read and written again
+names the same channels. ``contains`` is False for them, since they
+are not in the geometry, and ``~`` leaves them out. ``from_chips`` and
+``from_network_config`` only set the bits of the chips' connected
+channels.
+
+>>> geometry = MultiTileGeometry.fromDict(load('multi_tile_layout-2.1.16.yaml'))
+>>> disabled = ChannelMask.fromFile(geometry, 'disabled_channels.json')
+>>> disabled |= ChannelMask.from_channels(geometry, 1, 1, 11, [0, 1])
+>>> good_hits = ~disabled.contains_packets(packets)
+
+'''
+import json
+
+import numpy as np
+
+from larpixgeometry.layouts import yamlio
+from larpixgeometry.networkconfig import parse_network_config
+from larpixgeometry.packedkeys import (PACKING, clip_keys,
+        pack_chip_channel, pack_io)
+
+# Key of the channels of every chip in the channel lists
+ALL_CHIPS = 'All'
+
+def pack_address(io_group, io_channel, chipid, channel):
+    '''
+    Return the packed ``(io_group*1000 + io_channel)*1000000 + chip*1000
+    + channel`` key of each (io_group, io_channel, chip, channel), or of
+    each channel of the ``'All'`` key of a channel list if ``io_group``,
+    ``io_channel`` and ``chipid`` are None, which is ``-1 - channel``.
+    Raises ``ValueError`` if a field is negative or at least 1000.
+
+    '''
+    fields = [np.asarray(value, dtype=np.int64) for value in (io_group,
+        io_channel, chipid, channel) if value is not None]
+    if any(((value < 0) | (value >= PACKING)).any() for value in fields):
+        raise ValueError('Channel address fields must be between 0 and %d'
+                % (PACKING - 1))
+    if len(fields) == 1:
+        return -1 - fields[0]
+    io_group, io_channel, chipid, channel = fields
+    return (pack_io(io_group, io_channel) * PACKING**2
+            + pack_chip_channel(chipid, channel))
+
+def _unpack_keys(keys):
+    '''
+    Return the chip keys and channels of the channel list entries of
+    the packed ``keys`` (see ``pack_address``).
+
+    '''
+    io, chip_channel = np.divmod(keys, PACKING**2)
+    io_group, io_channel = np.divmod(io, PACKING)
+    chipid, channel = np.divmod(chip_channel, PACKING)
+    chip_keys = ['%d-%d-%d' % address if address[0] >= 0 else ALL_CHIPS
+            for address in zip(io_group.tolist(), io_channel.tolist(),
+                chipid.tolist())]
+    return chip_keys, np.where(keys < 0, -1 - keys, channel).tolist()
+
+class ChannelMask(object):
+    '''
+    A set of channels of ``geometry``, stored as a bitmap over its dense
+    channel indices (see the module docstring).
+
+    ``bits`` is the packed bitmap (``numpy.packbits`` with
+    ``bitorder='little'``), with a trailing sentinel bit, always 0,
+    which unknown channels resolve to, and any padding bits 0.
+    ``unmatched`` is the sorted array of the packed keys (see
+    ``pack_address``) of the channels in the mask which are not
+    channels of ``geometry``.
+
+    '''
+    def __init__(self, geometry, bits=None, unmatched=()):
+        self.geometry = geometry
+        self.size = len(geometry.columns['channel'])
+        n_bytes = self.size // 8 + 1
+        if bits is None:
+            bits = np.zeros(n_bytes, dtype=np.uint8)
+        bits = np.asarray(bits, dtype=np.uint8)
+        if bits.shape != (n_bytes,):
+            raise ValueError('Expected %d bytes for %d channels, got %s'
+                    % (n_bytes, self.size, bits.shape))
+        self.bits = bits
+        self.unmatched = np.unique(np.asarray(unmatched, dtype=np.int64))
+
+    @classmethod
+    def from_array(cls, geometry, mask):
+        '''
+        Create the mask from a boolean array over dense channel indices.
+
+        '''
+        mask = np.asarray(mask, dtype=bool)
+        size = len(geometry.columns['channel'])
+        if mask.shape != (size,):
+            raise ValueError('Expected a mask of %d channels, got %s'
+                    % (size, mask.shape))
+        padded = np.zeros(size + 1, dtype=bool)
+        padded[:-1] = mask
+        return cls(geometry, np.packbits(padded, bitorder='little'))
+
+    @classmethod
+    def from_rows(cls, geometry, rows):
+        '''
+        Create the mask from dense channel indices, ignoring -1.
+
+        '''
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        mask = np.zeros(len(geometry.columns['channel']) + 1, dtype=bool)
+        mask[clip_keys(rows, len(mask) - 1)] = True
+        return cls.from_array(geometry, mask[:-1])
+
+    @classmethod
+    def from_channels(cls, geometry, io_group, io_channel, chipid, channel):
+        '''
+        Create the mask of the given (io_group, io_channel, chip,
+        channel), broadcast against each other. Channels which are not
+        in the geometry go to ``unmatched``, see ``pack_address`` for
+        the addresses it can hold.
+
+        '''
+        addresses = np.column_stack([np.asarray(value, dtype=np.int64)
+            .reshape(-1) for value in np.broadcast_arrays(io_group,
+                io_channel, chipid, channel)]).reshape(-1, 4)
+        rows = geometry.channel_index(*addresses.T)
+        return cls(geometry, cls.from_rows(geometry, rows).bits,
+                pack_address(*addresses[rows < 0].T))
+
+    @classmethod
+    def from_chips(cls, geometry, io_group, io_channel, chipid):
+        '''
+        Create the mask of all of the channels of the given (io_group,
+        io_channel, chip) in the geometry.
+
+        '''
+        channels = geometry.columns['channel']
+        n_channels = int(channels.max()) + 1 if len(channels) else 0
+        io_group, io_channel, chipid = [np.asarray(value, dtype=np.int64)
+                .reshape(-1, 1) for value in np.broadcast_arrays(io_group,
+                    io_channel, chipid)]
+        return cls.from_rows(geometry, geometry.channel_index(io_group,
+            io_channel, chipid, np.arange(n_channels)))
+
+    @classmethod
+    def from_network_config(cls, geometry, network_config):
+        '''
+        Create the mask of all of the channels of the chips in a network
+        configuration file (or list of files), e.g. to mask out the
+        chips missing from the network with ``~``.
+
+        '''
+        if isinstance(network_config, str):
+            network_config = [network_config]
+        chips = np.concatenate([parse_network_config(config)
+            for config in network_config] + [np.zeros((0, 3), dtype=np.int64)])
+        return cls.from_chips(geometry, chips[:, 0], chips[:, 1], chips[:, 2])
+
+    @classmethod
+    def fromDict(cls, geometry, d):
+        '''
+        Create the mask from a channel list dict (see the module
+        docstring). Chips and channels which are not in the geometry go
+        to ``unmatched``, see ``pack_address`` for the addresses it can
+        hold.
+
+        '''
+        columns = geometry.columns
+        mask = np.zeros(len(columns['channel']), dtype=bool)
+        unmatched = np.zeros(0, dtype=np.int64)
+        addresses = []
+        for key, channels in d.items():
+            if key == ALL_CHIPS:
+                mask |= np.isin(columns['channel'], channels)
+                unmatched = pack_address(None, None, None, np.setdiff1d(
+                    np.asarray(channels, dtype=np.int64), columns['channel']))
+                continue
+            chip = [int(field) for field in key.split('-')]
+            addresses += [chip + [channel] for channel in channels]
+        addresses = np.array(addresses, dtype=np.int64).reshape(-1, 4)
+        listed = cls.from_channels(geometry, *addresses.T)
+        return cls(geometry, cls.from_array(geometry, mask).bits | listed.bits,
+                np.union1d(unmatched, listed.unmatched))
+
+    def toDict(self):
+        '''
+        Return the channel list dict (see the module docstring) of the
+        mask, with one chip key per chip with masked channels, including
+        the ``unmatched`` channels.
+
+        '''
+        rows = self.rows()
+        columns = self.geometry.columns
+        addresses = np.column_stack([columns[key][rows] for key in
+            ('io_group', 'io_channel', 'chipid', 'channel')])
+        addresses = addresses[np.lexsort(addresses.T[::-1])]
+        starts = np.flatnonzero(np.append(True,
+            np.any(addresses[1:, :3] != addresses[:-1, :3], axis=1)))
+        stops = np.append(starts[1:], len(addresses))
+        channels = addresses[:, 3].tolist()
+        d = {'%d-%d-%d' % tuple(addresses[start, :3].tolist()):
+                channels[start:stop] for start, stop in zip(starts.tolist(),
+                    stops.tolist())}
+        if not len(self.unmatched):
+            return d
+        for key, channel in zip(*_unpack_keys(self.unmatched)):
+            d.setdefault(key, []).append(channel)
+        return {key: sorted(channels) for key, channels in d.items()}
+
+    @classmethod
+    def fromFile(cls, geometry, filename):
+        '''
+        Read a channel list from a JSON file, or a YAML file (with a
+        ``.yaml`` or ``.yml`` extension).
+
+        '''
+        with open(filename, 'rb') as f:
+            data = f.read()
+        if filename.endswith(('.yaml', '.yml')):
+            d = yamlio.parse(data)
+        else:
+            d = json.loads(data.decode('utf-8'))
+        return cls.fromDict(geometry, d or {})
+
+    def toFile(self, filename):
+        '''
+        Write the channel list to a JSON file, or a YAML file (with a
+        ``.yaml`` or ``.yml`` extension).
+
+        '''
+        d = self.toDict()
+        with open(filename, 'w') as f:
+            if filename.endswith(('.yaml', '.yml')):
+                f.write(yamlio.dumps(d))
+            else:
+                json.dump(d, f, indent=1, sort_keys=True)
+
+    def to_array(self):
+        '''
+        Return the mask as a boolean array over dense channel indices.
+
+        '''
+        return np.unpackbits(self.bits, count=self.size,
+                bitorder='little').view(bool)
+
+    def rows(self):
+        '''
+        Return the dense channel indices in the mask.
+
+        '''
+        return np.flatnonzero(self.to_array())
+
+    def contains(self, io_group, io_channel, chipid, channel):
+        '''
+        Return a boolean array which is True where the (io_group,
+        io_channel, chip, channel) is in the mask. Channels which are
+        not in the geometry are not in any mask.
+
+        '''
+        rows = clip_keys(self.geometry.channel_index(io_group, io_channel,
+            chipid, channel), self.size)
+        return ((self.bits[rows >> 3] >> (rows & 7).astype(np.uint8)) & 1
+                ).astype(bool)
+
+    def contains_packets(self, packets):
+        '''
+        ``contains`` for a structured array (or dict of arrays) of
+        packets with ``'io_group'``, ``'io_channel'``, ``'chip_id'`` and
+        ``'channel_id'`` fields.
+
+        '''
+        return self.contains(packets['io_group'], packets['io_channel'],
+                packets['chip_id'], packets['channel_id'])
+
+    def __len__(self):
+        return int(np.unpackbits(self.bits, count=self.size,
+            bitorder='little').sum())
+
+    def __contains__(self, address):
+        '''
+        Whether the (io_group, io_channel, chip, channel) is in the mask.
+
+        '''
+        return bool(self.contains(*address))
+
+    def _check_other(self, other):
+        if not isinstance(other, ChannelMask):
+            return False
+        if other.geometry is not self.geometry:
+            raise ValueError('Cannot combine masks of different geometries')
+        return True
+
+    def _unmatched(self, function, other):
+        '''
+        Return ``function`` (a NumPy set operation) of the ``unmatched``
+        keys of the mask and ``other``, skipped when both are empty.
+
+        '''
+        if not len(self.unmatched) and not len(other.unmatched):
+            return self.unmatched
+        return function(self.unmatched, other.unmatched)
+
+    def __or__(self, other):
+        if not self._check_other(other):
+            return NotImplemented
+        return ChannelMask(self.geometry, self.bits | other.bits,
+                self._unmatched(np.union1d, other))
+
+    def __and__(self, other):
+        if not self._check_other(other):
+            return NotImplemented
+        return ChannelMask(self.geometry, self.bits & other.bits,
+                self._unmatched(np.intersect1d, other))
+
+    def __sub__(self, other):
+        if not self._check_other(other):
+            return NotImplemented
+        return ChannelMask(self.geometry, self.bits & ~other.bits,
+                self._unmatched(np.setdiff1d, other))
+
+    def __xor__(self, other):
+        if not self._check_other(other):
+            return NotImplemented
+        return ChannelMask(self.geometry, self.bits ^ other.bits,
+                self._unmatched(np.setxor1d, other))
+
+    def __invert__(self):
+        bits = ~self.bits
+        # Keep the sentinel and padding bits of the last byte 0
+        bits[-1] &= (1 << (self.size % 8)) - 1
+        return ChannelMask(self.geometry, bits)
+
+    def __eq__(self, other):
+        if not self._check_other(other):
+            return NotImplemented
+        return (bool(np.array_equal(self.bits, other.bits))
+                and np.array_equal(self.unmatched, other.unmatched))
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<ChannelMask of %d/%d channels, %d unmatched>' % (len(self),
+                self.size, len(self.unmatched))
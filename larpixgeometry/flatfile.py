@@ -0,0 +1,99 @@
+'''
+A flat, memory-mappable file of named NumPy arrays.
+
+The file starts with an 8-byte magic string and the length of a JSON
+header (little-endian uint64), followed by the header itself and then
+the raw array data, with every array aligned to 64 bytes. The header
+lists the dtype, shape and offset of each array plus any extra
+JSON-serializable metadata.
+
+``map_arrays`` maps the whole file read-only and returns arrays which
+point directly into the mapping, so opening a file costs the same no
+matter how large it is, and many processes reading the same file share
+a single copy of it through the OS page cache.
+
+'''
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+MAGIC = b'LPXGEOM\x00'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+def write_arrays(filename, arrays, meta=None):
+    '''
+    Write the dict of arrays ``arrays`` and the JSON-serializable
+    ``meta`` to ``filename``.
+
+    The file is written to a temporary name and then moved into place,
+    so processes which already have the old file mapped keep a
+    consistent view of it.
+
+    '''
+    arrays = {name: np.ascontiguousarray(array)
+            for name, array in arrays.items()}
+    entries = {}
+    offset = 0
+    for name, array in arrays.items():
+        if array.dtype.hasobject:
+            raise TypeError('Cannot store object array %s' % name)
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        entries[name] = {'dtype': array.dtype.str, 'shape': array.shape,
+                'offset': offset}
+        offset += array.nbytes
+    header = json.dumps({'format_version': FORMAT_VERSION,
+        'arrays': entries, 'meta': meta}).encode('utf-8')
+    data_start = len(MAGIC) + 8 + len(header)
+    data_start = -(-data_start // ALIGNMENT) * ALIGNMENT
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(data_start + entries[name]['offset'])
+                f.write(array.tobytes())
+            f.truncate(data_start + offset)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def map_arrays(filename):
+    '''
+    Memory-map ``filename`` and return ``(arrays, meta)``.
+
+    The arrays are read-only views into the mapping.
+
+    '''
+    with open(filename, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('Not a larpix-geometry flat file: %s' % filename)
+        header_length, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(header_length).decode('utf-8'))
+        if header['format_version'] != FORMAT_VERSION:
+            raise ValueError('Unsupported flat file format %s' %
+                    header['format_version'])
+        data_start = len(MAGIC) + 8 + header_length
+        data_start = -(-data_start // ALIGNMENT) * ALIGNMENT
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    arrays = {}
+    for name, entry in header['arrays'].items():
+        dtype = np.dtype(entry['dtype'])
+        shape = tuple(entry['shape'])
+        count = int(np.prod(shape))
+        if count == 0:
+            array = np.zeros(shape, dtype=dtype)
+            array.flags.writeable = False
+        else:
+            array = np.frombuffer(buffer, dtype=dtype, count=count,
+                    offset=data_start + entry['offset']).reshape(shape)
+        arrays[name] = array
+    return arrays, header['meta']
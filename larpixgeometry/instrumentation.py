@@ -0,0 +1,196 @@
+'''
+Opt-in timers and counters for geometry construction.
+
+Loading a layout (``layouts.load``), building a pixel plane
+(``PixelPlane.fromDict``) and generating a multi-tile layout
+(``multi_tile_layout.generate_layout``) record the time spent in each of
+their stages, e.g. ``load.read``, ``load.parse`` or
+``generate_layout.network_configs``, and counters such as
+``bytes_read``, ``pixels_created``, ``chips_created`` and
+``unconnected_channels``. Nothing is recorded, and nothing but a flag
+check is done, unless instrumentation is enabled, either for a block of
+code with ``instrument``:
+
+>>> with instrument(callback=print) as recorder:
+...     board = PixelPlane.fromDict(load('layout-2.4.0.yaml'))
+>>> recorder.timings['load.parse'], recorder.counters['pixels_created']
+
+or for the whole process with the environment variable
+``LARPIXGEOMETRY_INSTRUMENT``. If it is ``1`` or ``stderr``, a JSON
+line is written to stderr after each top-level operation. Any other
+value (except ``0``) is the path of a file the JSON lines are appended
+to.
+
+A report is a dict ``{'operation': name, 'timings': {stage: seconds},
+'counters': {counter: count}}``. Timings of a stage which runs more
+than once are summed.
+
+'''
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+ENVIRONMENT_VARIABLE = 'LARPIXGEOMETRY_INSTRUMENT'
+
+def _environment_log():
+    value = os.environ.get(ENVIRONMENT_VARIABLE, '')
+    if value in ('', '0'):
+        return None
+    if value in ('1', 'stderr'):
+        return sys.stderr
+    return value
+
+# Where every top-level operation is logged: None, a file or a path
+_log = _environment_log()
+# The active recorders of each thread, innermost last
+_local = threading.local()
+
+class Recorder(object):
+    '''
+    Stage timings and counters of one instrumented operation or block.
+
+    ``callback``, if given, is called with the report when the recorder
+    is closed, and ``log`` (a file or a path) gets the report as a JSON
+    line.
+
+    '''
+    def __init__(self, operation=None, callback=None, log=None):
+        self.operation = operation
+        self.callback = callback
+        self.log = log
+        self.timings = {}
+        self.counters = {}
+
+    def add_time(self, stage, seconds):
+        self.timings[stage] = self.timings.get(stage, 0) + seconds
+
+    def count(self, counter, n=1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def report(self):
+        return {'operation': self.operation, 'timings': dict(self.timings),
+                'counters': dict(self.counters)}
+
+    def to_json(self):
+        return json.dumps(self.report(), sort_keys=True)
+
+    def export(self):
+        '''
+        Pass the report to the callback and write it to the log.
+
+        '''
+        if self.callback is not None:
+            self.callback(self.report())
+        if self.log is not None:
+            line = self.to_json() + '\n'
+            if isinstance(self.log, str):
+                with open(self.log, 'a') as f:
+                    f.write(line)
+            else:
+                self.log.write(line)
+                self.log.flush()
+
+    def __enter__(self):
+        _stack().append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _stack().remove(self)
+        self.export()
+
+def _stack():
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
+
+def instrument(callback=None, log=None, operation=None):
+    '''
+    Return a recorder which, used as a context manager, records the
+    instrumented operations of the current thread within the block, and
+    exports the report on exit (see ``Recorder``).
+
+    '''
+    return Recorder(operation, callback, log)
+
+def current():
+    '''
+    Return the active recorder of the current thread, or None if
+    instrumentation is off.
+
+    '''
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else None
+
+class _Stage(object):
+    __slots__ = ('recorder', 'name', 'start')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.recorder
+
+    def __exit__(self, *exc_info):
+        self.recorder.add_time(self.name, time.perf_counter() - self.start)
+
+class _NullStage(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+def stage(name):
+    '''
+    Return a context manager adding the time spent in the block to the
+    stage ``name`` of the active recorder. It does nothing if
+    instrumentation is off.
+
+    '''
+    recorder = current()
+    if recorder is None:
+        return _NULL_STAGE
+    return _Stage(recorder, name)
+
+def count(counter, n=1):
+    '''
+    Add ``n`` to ``counter`` of the active recorder, if any.
+
+    '''
+    recorder = current()
+    if recorder is not None:
+        recorder.count(counter, n)
+
+def instrumented(operation):
+    '''
+    Decorator timing each call of the function as the stage
+    ``operation``. A call outside any recorder while the environment
+    variable is set gets a recorder of its own, which is logged when the
+    call returns.
+
+    '''
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            recorder = current()
+            if recorder is None:
+                if _log is None:
+                    return function(*args, **kwargs)
+                recorder = Recorder(operation, log=_log)
+                with recorder, _Stage(recorder, operation):
+                    return function(*args, **kwargs)
+            with _Stage(recorder, operation):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -12,10 +12,33 @@ Layouts are numbered as X.Y.Z, where:
   particular PCB (e.g. if it is only partially loaded).
 
 '''
-import yaml
 import os
+import re
+import time
 
-def load(filename):
+from larpixgeometry import instrumentation
+from larpixgeometry.layouts import yamlio
+
+# A top-level key of a block-style YAML mapping, at the start of a line
+_TOP_LEVEL_KEY = re.compile(br'^(?![\s#\-{}\[\]]).*?:(?:\s|$)', re.M)
+# A pixel written in flow style on one line, with its outlines
+_FLOW_PIXEL = re.compile(br'^- \[([^,\[\]]+), ([^,\[\]]+), ([^,\[\]]+), \[.*\]\]$', re.M)
+
+def find(filename):
+    '''
+    Return the path of the specified layout file, searched as in
+    ``load``.
+
+    '''
+    if os.path.isfile(filename):
+        return filename
+    elif os.path.isfile(os.path.join(os.path.dirname(__file__), filename)):
+        return os.path.join(os.path.dirname(__file__), filename)
+    raise IOError('File not found: %s' % filename)
+
+@instrumentation.instrumented('load')
+def load(filename, use_cache=True, sections=None, outlines=True,
+        timing=None, data=None):
     '''
     Load the specified layout file.
 
@@ -23,12 +46,106 @@ def load(filename):
     If no match is found, the path is searched relative to the "config"
     package directory (aka ``__file__`` directly in code).
 
+    Unless ``use_cache`` is False, the layout is read from its compiled
+    binary form if one exists for the current contents of the file
+    (see ``larpixgeometry.layouts.compiled``), which skips the YAML
+    parser completely. Otherwise the YAML file is parsed (with libyaml
+    if available) and a compiled copy is saved in the user cache
+    directory for next time.
+
+    To load only part of the file, pass the list of top-level keys to
+    read as ``sections`` (e.g. ``['chips', 'pixels']``), and/or
+    ``outlines=False`` to replace the pad and focus outlines of the
+    pixels with empty lists. Only the requested sections are parsed (or
+    read from the compiled copy) when the file allows it.
+
+    ``data``, if given, is the contents of the file (bytes) as already
+    read by the caller, which are then used instead of reading the file
+    again.
+
+    ``timing``, if given, is called as ``timing(stage, seconds)`` for
+    each stage of the load: ``'read'`` (reading the file), and then
+    either ``'compiled'`` (reading the compiled copy) or ``'parse'``
+    (parsing the YAML) followed by ``'store'`` (saving the compiled
+    copy). With instrumentation on (see
+    ``larpixgeometry.instrumentation``), the stages are recorded as
+    ``load.<stage>``, along with the ``bytes_read`` counter (which does
+    not count ``data`` passed in by the caller).
+
     '''
-    if os.path.isfile(filename):
-        with open(filename, 'r') as f:
-            return yaml.load(f, Loader=yaml.SafeLoader)
-    elif os.path.isfile(os.path.join(os.path.dirname(__file__), filename)):
-        with open(os.path.join(os.path.dirname(__file__), filename), 'r') as f:
-            return yaml.load(f, Loader=yaml.SafeLoader)
+    path = find(filename)
+    timer = _Timer(timing, instrumentation.current())
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if timer.recorder is not None:
+            timer.recorder.count('bytes_read', len(data))
+    timer('read')
+    complete = sections is None and outlines
+    if use_cache:
+        from larpixgeometry.layouts import compiled
+        result = compiled.load_cached(path, data, sections, outlines)
+        if result is not None:
+            timer('compiled')
+            return result
+    if complete:
+        result = yamlio.parse(data)
     else:
-        raise IOError('File not found: %s' % filename)
+        result = _parse_partial(data, sections, outlines)
+    timer('parse')
+    if use_cache and complete:
+        compiled.store_cached(path, data, result)
+        timer('store')
+    return result
+
+class _Timer(object):
+    '''
+    Calls ``timing(stage, seconds)`` with the time since the previous
+    call, and adds it to the stage ``load.<stage>`` of ``recorder``.
+
+    '''
+    def __init__(self, timing, recorder=None):
+        self.timing = timing
+        self.recorder = recorder
+        self.start = time.perf_counter()
+
+    def __call__(self, stage):
+        if self.timing is not None or self.recorder is not None:
+            now = time.perf_counter()
+            if self.timing is not None:
+                self.timing(stage, now - self.start)
+            if self.recorder is not None:
+                self.recorder.add_time('load.' + stage, now - self.start)
+            self.start = now
+
+def _parse_partial(data, sections, outlines):
+    '''
+    Parse the selected top-level ``sections`` of the YAML document
+    ``data``, dropping the pixel outlines unless ``outlines``.
+
+    If the document is a block-style mapping, only the lines of the
+    requested sections are parsed, and the flow-style pixel lines of the
+    ``pixels`` section have their outlines cut before parsing. Otherwise
+    the whole document is parsed and then trimmed.
+
+    '''
+    starts = [match.start() for match in _TOP_LEVEL_KEY.finditer(data)]
+    if starts and not data[:starts[0]].strip():
+        chunks = []
+        for start, stop in zip(starts, starts[1:] + [len(data)]):
+            chunk = data[start:stop]
+            key, = yamlio.parse(chunk.split(b'\n', 1)[0]).keys()
+            if sections is not None and key not in sections:
+                continue
+            if key == 'pixels' and not outlines:
+                chunk = _FLOW_PIXEL.sub(br'- [\1, \2, \3, [], []]', chunk)
+            chunks.append(chunk if chunk.endswith(b'\n') else chunk + b'\n')
+        data = b''.join(chunks)
+    result = yamlio.parse(data) or {}
+    if sections is not None:
+        result = {key: value for key, value in result.items()
+                if key in sections}
+    if not outlines and isinstance(result.get('pixels'), list):
+        result['pixels'] = [list(pixel[:3]) + [[], []]
+                for pixel in result['pixels']]
+    return result
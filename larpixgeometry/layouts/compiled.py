@@ -0,0 +1,331 @@
+'''
+Compiled (binary) form of the YAML layout files.
+
+Parsing a layout YAML file with the pure-Python YAML parser is slow, so
+``larpixgeometry.layouts.load`` keeps a compiled copy of each file it
+reads in an uncompressed ``.npz`` archive. The compiled file is named
+after the SHA-1 hash of the YAML source (e.g.
+``layout-2.4.0-<hash>.npz``), so an edited YAML file never picks up a
+stale compiled copy.
+
+Compiled files are looked up first next to the YAML file (this is where
+``precompile`` puts them for the layouts shipped with the package) and
+then in the user cache directory, which is
+``$LARPIXGEOMETRY_CACHE_DIR`` if set, or else
+``~/.cache/larpix-geometry``.
+
+The ``pixels`` and ``chips`` lists of a tile layout are stored as
+columns (with the pad and focus outlines packed into vertex arrays plus
+offsets; positions and vertices always come back as floats), int-keyed
+dicts of numbers or equal-length number lists (e.g.
+``chip_channel_to_position``) are stored as key and value arrays, and
+everything else is stored as a small JSON header.
+
+To precompile all of the layouts shipped with the package::
+
+    python -m larpixgeometry.layouts.compiled
+
+'''
+import hashlib
+import json
+import numbers
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+FORMAT_VERSION = 1
+CACHE_DIR_ENV = 'LARPIXGEOMETRY_CACHE_DIR'
+
+def source_hash(data):
+    '''
+    Return the hash used to key the compiled form of the given YAML
+    file contents (bytes).
+
+    '''
+    return hashlib.sha1(data).hexdigest()
+
+def compiled_filename(filename, digest):
+    '''
+    Return the file name (without directory) of the compiled form of
+    the given YAML file.
+
+    '''
+    base = os.path.splitext(os.path.basename(filename))[0]
+    return '%s-%s.npz' % (base, digest[:16])
+
+def cache_dir():
+    '''
+    Return the user cache directory for compiled layouts.
+
+    '''
+    return os.environ.get(CACHE_DIR_ENV,
+            os.path.join(os.path.expanduser('~'), '.cache', 'larpix-geometry'))
+
+def find_compiled(filename, digest):
+    '''
+    Return the path of an existing compiled form of the given YAML
+    file, or None.
+
+    '''
+    name = compiled_filename(filename, digest)
+    for directory in (os.path.dirname(os.path.abspath(filename)),
+            cache_dir()):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+def compile_layout(d):
+    '''
+    Return a dict of NumPy arrays holding the given layout dict.
+
+    Raises ``TypeError`` if the layout contains values which cannot be
+    stored, and ``ValueError`` if its pixels or chips are malformed
+    (e.g. a pixel entry with fewer than five fields).
+
+    '''
+    arrays = {}
+    header = {'format_version': FORMAT_VERSION}
+    rest = dict(d)
+    if isinstance(d.get('pixels'), list) and isinstance(d.get('chips'), list):
+        try:
+            _compile_pixels(rest.pop('pixels'), arrays)
+            _compile_chips(rest.pop('chips'), arrays)
+        except (IndexError, KeyError, TypeError, ValueError) as e:
+            raise ValueError('Malformed pixels or chips in layout: %r' % e)
+        header['tile'] = True
+    header['document'] = _encode(rest, '', arrays)
+    arrays['header'] = np.frombuffer(json.dumps(header).encode('utf-8'),
+            dtype=np.uint8)
+    return arrays
+
+def decompile_layout(arrays, sections=None, outlines=True):
+    '''
+    Return the layout dict stored in the given arrays (as returned by
+    ``compile_layout`` or read back from a compiled file).
+
+    Only the top-level keys in ``sections`` are decoded if it is given,
+    and the pixel outlines are left empty unless ``outlines``.
+
+    '''
+    header = json.loads(bytes(arrays['header']).decode('utf-8'))
+    if header['format_version'] != FORMAT_VERSION:
+        raise ValueError('Unsupported compiled layout format %s' %
+                header['format_version'])
+    document = header['document']
+    if sections is not None:
+        document = {'__dict__': [[key, value]
+            for key, value in document['__dict__'] if key in sections]}
+    d = _decode(document, arrays)
+    if header.get('tile'):
+        if sections is None or 'pixels' in sections:
+            d['pixels'] = _decompile_pixels(arrays, outlines)
+        if sections is None or 'chips' in sections:
+            d['chips'] = _decompile_chips(arrays)
+    return d
+
+def write_compiled(d, path):
+    '''
+    Write the compiled form of the layout dict to ``path``.
+
+    The file is written to a temporary name and then moved into place,
+    so concurrent readers never see a partial file.
+
+    '''
+    arrays = compile_layout(d)
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, tmp_path = tempfile.mkstemp(suffix='.npz', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def read_compiled(path, sections=None, outlines=True):
+    '''
+    Read the layout dict from the compiled file at ``path``. Only the
+    arrays needed for ``sections`` and ``outlines`` (see
+    ``decompile_layout``) are read.
+
+    '''
+    with np.load(path, allow_pickle=False) as arrays:
+        return decompile_layout(arrays, sections, outlines)
+
+def load_cached(filename, data, sections=None, outlines=True):
+    '''
+    Return the layout dict for the YAML file ``filename`` with contents
+    ``data`` (bytes) from its compiled form, or None if there is no
+    usable compiled form.
+
+    '''
+    path = find_compiled(filename, source_hash(data))
+    if path is None:
+        return None
+    try:
+        return read_compiled(path, sections, outlines)
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return None
+
+def store_cached(filename, data, d):
+    '''
+    Store the compiled form of the layout dict ``d`` parsed from the
+    YAML file ``filename`` with contents ``data`` (bytes) in the user
+    cache directory. Failures (e.g. a read-only file system or a layout
+    which cannot be compiled) are ignored.
+
+    '''
+    path = os.path.join(cache_dir(),
+            compiled_filename(filename, source_hash(data)))
+    try:
+        write_compiled(d, path)
+    except (OSError, TypeError, ValueError):
+        pass
+
+def precompile(directory=None, output_dir=None):
+    '''
+    Compile every ``*.yaml`` layout file in ``directory`` (by default
+    the directory of the layouts shipped with the package).
+
+    The compiled files are written to ``output_dir`` (by default next to
+    the YAML files), and the list of written paths is returned.
+
+    '''
+    from larpixgeometry.layouts import yamlio
+    if directory is None:
+        directory = os.path.dirname(os.path.abspath(__file__))
+    if output_dir is None:
+        output_dir = directory
+    written = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.yaml'):
+            continue
+        with open(os.path.join(directory, name), 'rb') as f:
+            data = f.read()
+        d = yamlio.parse(data)
+        path = os.path.join(output_dir,
+                compiled_filename(name, source_hash(data)))
+        write_compiled(d, path)
+        written.append(path)
+    return written
+
+def _compile_pixels(pixels, arrays):
+    arrays['pixels/pixelid'] = np.array([pixel[0] for pixel in pixels],
+            dtype=np.int64)
+    arrays['pixels/x'] = np.array([pixel[1] for pixel in pixels],
+            dtype=np.float64)
+    arrays['pixels/y'] = np.array([pixel[2] for pixel in pixels],
+            dtype=np.float64)
+    for index, name in ((3, 'pad'), (4, 'focus')):
+        outlines = [pixel[index] for pixel in pixels]
+        offsets = np.zeros(len(outlines) + 1, dtype=np.int64)
+        np.cumsum([len(outline) for outline in outlines], out=offsets[1:])
+        vertices = np.array([vertex for outline in outlines
+            for vertex in outline], dtype=np.float64).reshape(-1, 2)
+        arrays['pixels/%s_offsets' % name] = offsets
+        arrays['pixels/%s_vertices' % name] = vertices
+
+def _decompile_pixels(arrays, read_outlines=True):
+    outlines = []
+    for name in ('pad', 'focus'):
+        offsets = arrays['pixels/%s_offsets' % name]
+        if not read_outlines or offsets[-1] == 0:
+            outlines.append([[] for _ in range(len(offsets) - 1)])
+            continue
+        vertices = arrays['pixels/%s_vertices' % name].tolist()
+        outlines.append([vertices[start:stop] for start, stop in
+            zip(offsets[:-1].tolist(), offsets[1:].tolist())])
+    return [list(pixel) for pixel in zip(arrays['pixels/pixelid'].tolist(),
+        arrays['pixels/x'].tolist(), arrays['pixels/y'].tolist(), *outlines)]
+
+def _compile_chips(chips, arrays):
+    arrays['chips/chipid'] = np.array([chipid for chipid, _ in chips],
+            dtype=np.int64)
+    offsets = np.zeros(len(chips) + 1, dtype=np.int64)
+    np.cumsum([len(connections) for _, connections in chips],
+            out=offsets[1:])
+    arrays['chips/offsets'] = offsets
+    arrays['chips/pixelid'] = np.array([-1 if pixelid is None else pixelid
+        for _, connections in chips for pixelid in connections],
+        dtype=np.int64)
+
+def _decompile_chips(arrays):
+    offsets = arrays['chips/offsets'].tolist()
+    pixelids = [None if pixelid < 0 else pixelid
+            for pixelid in arrays['chips/pixelid'].tolist()]
+    return [[chipid, pixelids[start:stop]] for chipid, start, stop in
+            zip(arrays['chips/chipid'].tolist(), offsets[:-1], offsets[1:])]
+
+def _is_number(value):
+    return (isinstance(value, numbers.Real)
+            and not isinstance(value, bool))
+
+def _numeric_dtype(values):
+    '''
+    Return the dtype which stores ``values`` without changing their
+    Python types, or None if they mix integers and floats.
+
+    '''
+    n_integral = sum(isinstance(value, numbers.Integral) for value in values)
+    if n_integral == len(values):
+        return np.int64
+    if n_integral == 0:
+        return np.float64
+    return None
+
+def _encode(value, name, arrays):
+    '''
+    Return a JSON-serializable form of ``value``, moving int-keyed
+    tables of numbers into ``arrays``.
+
+    '''
+    if isinstance(value, dict):
+        keys = list(value.keys())
+        values = list(value.values())
+        if (keys and all(isinstance(key, numbers.Integral)
+                and not isinstance(key, bool) for key in keys)):
+            if all(isinstance(item, list) for item in values):
+                elements = [element for item in values for element in item]
+                if len(set(len(item) for item in values)) != 1:
+                    elements = None
+            else:
+                elements = values
+            if (elements and all(_is_number(element) for element in elements)
+                    and _numeric_dtype(elements) is not None):
+                arrays[name + '/keys'] = np.array(keys, dtype=np.int64)
+                arrays[name + '/values'] = np.array(values,
+                        dtype=_numeric_dtype(elements))
+                return {'__table__': name}
+        return {'__dict__': [[key, _encode(item, '%s/%s' % (name, key),
+            arrays)] for key, item in zip(keys, values)]}
+    if isinstance(value, list):
+        return [_encode(item, '%s/%d' % (name, i), arrays)
+                for i, item in enumerate(value)]
+    if value is None or isinstance(value, (bool, numbers.Real, str)):
+        if isinstance(value, numbers.Integral) and not isinstance(value,
+                bool):
+            return int(value)
+        if isinstance(value, numbers.Real) and not isinstance(value, bool):
+            return float(value)
+        return value
+    raise TypeError('Cannot compile value of type %s' % type(value).__name__)
+
+def _decode(value, arrays):
+    if isinstance(value, dict):
+        if '__table__' in value:
+            name = value['__table__']
+            return dict(zip(arrays[name + '/keys'].tolist(),
+                arrays[name + '/values'].tolist()))
+        return {key: _decode(item, arrays) for key, item in value['__dict__']}
+    if isinstance(value, list):
+        return [_decode(item, arrays) for item in value]
+    return value
+
+if __name__ == '__main__':
+    import fire
+    fire.Fire(precompile)
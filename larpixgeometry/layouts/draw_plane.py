@@ -1,116 +1,445 @@
 '''
-Generate a PDF of a pixel plane YAML file.
+Draw a pixel plane, or a multi-tile anode, to a PDF or SVG file.
+
+From the command line, draw a layout file as before::
+
+    python draw_plane.py 2.4.0 [--pixelside] [--output=layout.svg]
+
+From code, ``draw_plane`` draws a ``PixelPlane`` and ``draw_anode`` a
+``MultiTileGeometry``. Both can color each channel by a value, given as
+a NumPy array aligned with the ``columns`` of the plane or geometry:
+
+>>> board = PixelPlane.fromDict(load('layout-2.4.0.yaml'))
+>>> draw_plane(board, 'hits.svg', values=counts, labels=False)
+
+The output format is chosen from the file extension. Shapes of the same
+color are written as a single path, and the SVG file is written
+directly, so even whole anodes render in a fraction of a second.
 
 '''
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch, cm
-import yaml
-from larpixgeometry.pixelplane import PixelPlane
+from xml.sax.saxutils import escape
+
+import numpy as np
+from reportlab.lib.pagesizes import landscape, letter
+from reportlab.lib.units import inch
+
 from larpixgeometry.layouts import load
-import  numpy as np
-import argparse
-
-parser = argparse.ArgumentParser()
-parser.add_argument('layoutversion')
-parser.add_argument('--pixelside', action='store_true')
-args = parser.parse_args()
-version = args.layoutversion
-pixelside = args.pixelside
-if pixelside:
-    sidename = 'pixel'
-else:
-    sidename = 'chip'
-
-pixelplane = PixelPlane.fromDict(load('layout-' + version + '.yaml'))
-dimensions = pixelplane.dimensions
-x_orig = dimensions['x']
-y_orig = dimensions['y']
-width_orig = dimensions['width']
-height_orig = dimensions['height']
-
-colors = np.array([[228, 26, 28], [55, 126, 184], [77, 175, 74], [152,
+from larpixgeometry.pixelplane import PixelPlane
+
+# Colors of consecutive chips (or tiles), repeated as needed
+CHIP_COLORS = np.array([[228, 26, 28], [55, 126, 184], [77, 175, 74], [152,
     78, 163], [255, 127, 0]])/256.0
-colors = np.tile(colors, (100,1))
-print('colors',len(colors))
-
-
-canvas_width, canvas_height = letter
-c = canvas.Canvas('layout-' + version + '-' + sidename + 'side.pdf', pagesize=letter)
-
-margin = 1*inch
-page_center_x = canvas_width/2
-page_center_y = canvas_height/2
-
-remaining_width = canvas_width - 2*margin
-remaining_height = canvas_height - 2*margin
-width_scalefactor = remaining_width/width_orig
-height_scalefactor = remaining_height/height_orig
-scalefactor = min(width_scalefactor, height_scalefactor)
-x_scaled = x_orig * scalefactor
-y_scaled = y_orig * scalefactor
-width_final = width_orig * scalefactor
-height_final = height_orig * scalefactor
-center_scaled_x = x_scaled + width_final/2
-center_scaled_y = y_scaled + height_final/2
-translation_x = page_center_x - center_scaled_x
-translation_y = page_center_y - center_scaled_y
-x_final = x_scaled + translation_x
-y_final = y_scaled + translation_y
-c.rect(x_final, y_final, width_final, height_final, fill=0, stroke=1)
-
-def transform_x(xcoord):
-    result = xcoord * scalefactor + translation_x
-    if pixelside:
-        result = canvas_width - result
-    return result
-
-def transform_y(ycoord):
-    return (ycoord * scalefactor + translation_y)
-
-minor_font = 3
-major_font = 20
-
-c.setFont('Helvetica', major_font)
-c.drawString(3*inch, 10*inch, 'Layout %s (%d chips)' % (version,
-    len(pixelplane.chips)))
-c.drawString(3*inch, 9.6*inch, '(view from %s side)' % sidename)
-c.setFont('Courier', minor_font)
-colorkey = []
-for pixel in pixelplane.pixels.values():
-    c.circle(transform_x(pixel.x), transform_y(pixel.y), 0.4)
-    c.drawCentredString(transform_x(pixel.x), transform_y(pixel.y),
-            str(pixel.pixelid))
-c.circle(transform_x(0), transform_y(0), 1.0)
-p = c.beginPath()
-p.moveTo(transform_x(0),transform_y(0)); p.lineTo(transform_x(0),transform_y(height_orig/100))
-c.drawPath(p)
-c.drawCentredString(transform_x(0), transform_y(1.5*height_orig/100), 'Y')
-p = c.beginPath()
-p.moveTo(transform_x(0),transform_y(0)); p.lineTo(transform_x(width_orig/100),transform_y(0))
-c.drawPath(p)
-c.drawCentredString(transform_x(1.5*height_orig/100), transform_y(0), 'X')
-for chip, color in zip(pixelplane.chips.values(), colors):
-    c.setFont('Courier-Bold', minor_font)
-    c.setFillColorRGB(*color, alpha=1)
-    colorkey.append(['Chip %d' % chip.chipid, color])
-    x_sum = 0
-    y_sum = 0
-    count = 0
-    for channel, pixel in enumerate(chip.channel_connections):
-        if pixel != pixelplane.unconnected_pixel:
-            c.drawCentredString(transform_x(pixel.x),
-                    transform_y(pixel.y)-minor_font,
-                    str(channel))
-            x_sum += transform_x(pixel.x)
-            y_sum += transform_y(pixel.y) - 5
-            count += 1
-    x_avg = x_sum/float(count)
-    y_avg = y_sum/float(count)
-    font = ('Helvetica', major_font)
-    c.setFont(*font)
-    c.setFillColorRGB(*color, alpha=0.45)
-    width = c.stringWidth(str(chip.chipid), *font)
-    c.drawCentredString(x_avg, y_avg-major_font/2, str(chip.chipid))
-c.showPage()
-c.save()
+# Heat-map scale from low to high values (viridis)
+HEAT_COLORS = np.array([[68, 1, 84], [59, 82, 139], [33, 145, 140],
+    [94, 201, 98], [253, 231, 37]])/255.0
+# Number of distinct heat-map colors
+HEAT_LEVELS = 64
+MINOR_FONT = 3
+MAJOR_FONT = 20
+MARGIN = 1*inch
+
+def heat_colors(values, vmin=None, vmax=None, levels=HEAT_LEVELS):
+    '''
+    Return the heat-map level (0 to ``levels - 1``) of each value, -1
+    for NaN, and the RGB color of each level.
+
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values)
+    if vmin is None:
+        vmin = values[finite].min() if finite.any() else 0
+    if vmax is None:
+        vmax = values[finite].max() if finite.any() else 1
+    scale = (values - vmin) / (vmax - vmin) if vmax > vmin else values*0
+    level = np.full(len(values), -1, dtype=np.intp)
+    level[finite] = np.clip((scale[finite]*levels).astype(np.intp), 0,
+            levels - 1)
+    anchors = np.linspace(0, 1, len(HEAT_COLORS))
+    steps = (np.arange(levels) + 0.5)/levels
+    palette = np.column_stack([np.interp(steps, anchors, HEAT_COLORS[:, i])
+        for i in range(3)])
+    return level, palette
+
+class _Frame(object):
+    '''
+    Maps layout coordinates to page coordinates, scaling the rectangle
+    ``(x, y, width, height)`` to fit within the margins, centered, and
+    mirroring x if ``mirror``.
+
+    '''
+    def __init__(self, x, y, width, height, pagesize, mirror=False):
+        page_width, page_height = pagesize
+        self.scale = min((page_width - 2*MARGIN)/width,
+                (page_height - 2*MARGIN)/height)
+        self.translation_x = page_width/2 - (x + width/2)*self.scale
+        self.translation_y = page_height/2 - (y + height/2)*self.scale
+        self.page_width = page_width
+        self.mirror = mirror
+
+    def x(self, x):
+        result = np.asarray(x) * self.scale + self.translation_x
+        if self.mirror:
+            result = self.page_width - result
+        return result
+
+    def y(self, y):
+        return np.asarray(y) * self.scale + self.translation_y
+
+class _PDFCanvas(object):
+    '''
+    Batched drawing on a reportlab canvas. Coordinates are in points
+    from the bottom left of the page.
+
+    The shapes and labels of each call are formatted with one string
+    operation and added to the page as literal PDF operators, instead
+    of going through the reportlab path and text objects one item at a
+    time.
+
+    '''
+    # Bezier control point offset of a quarter circle of radius 1
+    _KAPPA = 0.5522847498
+
+    def __init__(self, filename, pagesize):
+        from reportlab.pdfgen import canvas
+        self.canvas = canvas.Canvas(filename, pagesize=pagesize)
+
+    def rect(self, x, y, width, height):
+        self.canvas.rect(x, y, width, height, fill=0, stroke=1)
+
+    def line(self, x0, y0, x1, y1):
+        self.canvas.line(x0, y0, x1, y1)
+
+    @staticmethod
+    def _coordinates(*columns):
+        return tuple(np.column_stack(columns).ravel().tolist())
+
+    def circles(self, x, y, r, color=(0, 0, 0)):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        k = r * self._KAPPA
+        # Start at the right of the circle, then four quarter curves
+        points = [x + r, y,
+                x + r, y + k, x + k, y + r, x, y + r,
+                x - k, y + r, x - r, y + k, x - r, y,
+                x - r, y - k, x - k, y - r, x, y - r,
+                x + k, y - r, x + r, y - k, x + r, y]
+        operators = ('%.3f %.3f m ' + '%.3f %.3f %.3f %.3f %.3f %.3f c '*4
+                + 'h ') * len(x)
+        self.canvas.setStrokeColorRGB(*color)
+        self.canvas.addLiteral(operators % self._coordinates(*points) + 'S')
+        self.canvas.setStrokeColorRGB(0, 0, 0)
+
+    def squares(self, x, y, half, color):
+        x = np.asarray(x, dtype=np.float64) - half
+        y = np.asarray(y, dtype=np.float64) - half
+        operators = ('%%.3f %%.3f %.3f %.3f re ' % (2*half, 2*half)) * len(x)
+        self.canvas.setFillColorRGB(*color)
+        self.canvas.addLiteral(operators % self._coordinates(x, y) + 'f')
+        self.canvas.setFillColorRGB(0, 0, 0)
+
+    def text(self, x, y, strings, font, size, color=(0, 0, 0), alpha=1,
+            centred=True):
+        strings = np.asarray(strings, dtype=str)
+        if not len(strings):
+            return
+        x = np.asarray(x, dtype=np.float64)
+        unique, inverse = np.unique(strings, return_inverse=True)
+        if centred:
+            widths = np.array([self.canvas.stringWidth(string, font, size)
+                for string in unique.tolist()])
+            x = x - widths[inverse]/2
+        escaped = [string.replace('\\', '\\\\').replace('(', '\\(')
+                .replace(')', '\\)') for string in unique.tolist()]
+        # The font set with setFont is part of the graphics state, which
+        # is kept across text objects
+        self.canvas.setFont(font, size)
+        self.canvas.setFillColorRGB(*color, alpha=alpha)
+        self.canvas.addLiteral('BT ' + ''.join([
+            '1 0 0 1 %.3f %.3f Tm (%s) Tj ' % item for item in zip(x.tolist(),
+                np.asarray(y, dtype=np.float64).tolist(),
+                [escaped[i] for i in inverse.ravel().tolist()])]) + 'ET')
+        self.canvas.setFillColorRGB(0, 0, 0, alpha=1)
+
+    def save(self):
+        self.canvas.showPage()
+        self.canvas.save()
+
+class _SVGCanvas(object):
+    '''
+    Direct SVG writer with the interface of ``_PDFCanvas``.
+
+    '''
+    _FONTS = {'Helvetica': 'Helvetica, Arial, sans-serif',
+            'Courier': 'Courier, monospace'}
+
+    def __init__(self, filename, pagesize):
+        self.filename = filename
+        self.width, self.height = pagesize
+        self.parts = ['<svg xmlns="http://www.w3.org/2000/svg" '
+                'width="%gpt" height="%gpt" viewBox="0 0 %g %g">\n'
+                % (self.width, self.height, self.width, self.height)]
+
+    @staticmethod
+    def _color(color):
+        return 'rgb(%d,%d,%d)' % tuple(int(round(c*255)) for c in color)
+
+    @staticmethod
+    def _coordinates(*columns):
+        return tuple(np.column_stack(columns).ravel().tolist())
+
+    def rect(self, x, y, width, height):
+        self.parts.append('<rect x="%.3f" y="%.3f" width="%.3f" '
+                'height="%.3f" fill="none" stroke="black"/>\n'
+                % (x, self.height - y - height, width, height))
+
+    def line(self, x0, y0, x1, y1):
+        self.parts.append('<path d="M%.3f %.3fL%.3f %.3f" stroke="black"/>\n'
+                % (x0, self.height - y0, x1, self.height - y1))
+
+    def circles(self, x, y, r, color=(0, 0, 0)):
+        x = np.asarray(x, dtype=np.float64) - r
+        path = ('M%%.3f %%.3fa%g %g 0 1 0 %g 0a%g %g 0 1 0 %g 0'
+                % (r, r, 2*r, r, r, -2*r)) * len(x)
+        self.parts.append('<path fill="none" stroke="%s" d="%s"/>\n'
+                % (self._color(color), path % self._coordinates(x,
+                    self.height - np.asarray(y, dtype=np.float64))))
+
+    def squares(self, x, y, half, color):
+        x = np.asarray(x, dtype=np.float64) - half
+        y = self.height - np.asarray(y, dtype=np.float64) - half
+        path = ('M%%.3f %%.3fh%.3fv%.3fh%.3fz'
+                % (2*half, 2*half, -2*half)) * len(x)
+        self.parts.append('<path fill="%s" d="%s"/>\n'
+                % (self._color(color), path % self._coordinates(x, y)))
+
+    def text(self, x, y, strings, font, size, color=(0, 0, 0), alpha=1,
+            centred=True):
+        family, _, weight = font.partition('-')
+        attributes = 'font-family="%s" font-size="%g" fill="%s"' % (
+                self._FONTS.get(family, family), size, self._color(color))
+        if weight:
+            attributes += ' font-weight="%s"' % weight.lower()
+        if alpha != 1:
+            attributes += ' fill-opacity="%g"' % alpha
+        if centred:
+            attributes += ' text-anchor="middle"'
+        y = self.height - np.asarray(y, dtype=np.float64)
+        self.parts.append('<g %s>\n%s</g>\n' % (attributes, ''.join([
+            '<text x="%.3f" y="%.3f">%s</text>\n' % (xi, yi, escape(string))
+            for xi, yi, string in zip(np.asarray(x).tolist(), y.tolist(),
+                strings)])))
+
+    def save(self):
+        self.parts.append('</svg>\n')
+        with open(self.filename, 'w') as f:
+            f.write(''.join(self.parts))
+
+def _canvas(filename, pagesize):
+    if filename.lower().endswith('.svg'):
+        return _SVGCanvas(filename, pagesize)
+    return _PDFCanvas(filename, pagesize)
+
+def _pitch(x, y):
+    '''
+    Return the smallest spacing between pixel centers along x or y.
+
+    '''
+    steps = np.concatenate([np.diff(np.unique(np.round(v, 3)))
+        for v in (x, y)])
+    steps = steps[steps > 0]
+    return steps.min() if len(steps) else 1.0
+
+def _draw_values(c, x, y, half, values, vmin, vmax):
+    '''
+    Draw a filled square per finite value, one path per color, and the
+    color scale below the drawing.
+
+    '''
+    level, palette = heat_colors(values, vmin, vmax)
+    order = np.argsort(level, kind='stable')
+    bounds = np.searchsorted(level[order], np.arange(len(palette) + 1))
+    for i, color in enumerate(palette):
+        rows = order[bounds[i]:bounds[i + 1]]
+        if len(rows):
+            c.squares(x[rows], y[rows], half, color)
+    finite = np.asarray(values, dtype=np.float64)
+    finite = finite[np.isfinite(finite)]
+    low = vmin if vmin is not None else (finite.min() if len(finite) else 0)
+    high = vmax if vmax is not None else (finite.max() if len(finite) else 1)
+    step = 3*inch/len(palette)
+    for i, color in enumerate(palette):
+        c.squares([MARGIN + (i + 0.5)*step], [MARGIN/2], step/2, color)
+    c.text([MARGIN, MARGIN + 3*inch], [MARGIN/2 - 2*step - 6]*2,
+            ['%g' % low, '%g' % high], 'Helvetica', 8)
+
+def draw_plane(pixelplane, filename, title=None, pixelside=False,
+        values=None, vmin=None, vmax=None, labels=True, pagesize=letter):
+    '''
+    Draw ``pixelplane`` to ``filename`` (PDF, or SVG if the name ends in
+    ``.svg``), viewed from the chip side or, if ``pixelside``, from the
+    pixel side.
+
+    Without ``values``, each pixel is a circle labeled with its pixel ID
+    and, in the color of its chip, its channel, with the chip ID at the
+    center of the chip's pixels. ``values``, one per row of
+    ``pixelplane.columns`` (NaN for none), colors each connected channel
+    on a heat-map scale from ``vmin`` to ``vmax`` (default the range of
+    the values). ``labels=False`` leaves out the pixel and channel
+    labels.
+
+    '''
+    dimensions = pixelplane.dimensions
+    frame = _Frame(dimensions['x'], dimensions['y'], dimensions['width'],
+            dimensions['height'], pagesize, pixelside)
+    c = _canvas(filename, pagesize)
+    width_final = dimensions['width'] * frame.scale
+    x_final = frame.translation_x + dimensions['x'] * frame.scale
+    c.rect(x_final, frame.y(dimensions['y']), width_final,
+            dimensions['height'] * frame.scale)
+    if title is not None:
+        c.text([3*inch], [10*inch], [title], 'Helvetica', MAJOR_FONT,
+                centred=False)
+    c.text([3*inch], [9.6*inch], ['(view from %s side)'
+        % ('pixel' if pixelside else 'chip')], 'Helvetica', MAJOR_FONT,
+        centred=False)
+
+    columns = pixelplane.columns
+    connected = columns['connected']
+    x = frame.x(columns['x'][connected])
+    y = frame.y(columns['y'][connected])
+    if values is not None:
+        values = np.asarray(values, dtype=np.float64)[connected]
+        half = _pitch(columns['x'][connected],
+                columns['y'][connected]) * frame.scale / 2
+        _draw_values(c, x, y, half, values, vmin, vmax)
+
+    # Every pixel: the positions of those connected to a channel from the
+    # columns, and of the few others through ``pixels``
+    pixel_ids = np.fromiter(pixelplane.pixels, dtype=np.int64,
+            count=len(pixelplane.pixels))
+    connected_ids = columns['pixelid'][connected]
+    found = np.isin(pixel_ids, connected_ids)
+    order = np.argsort(connected_ids)
+    rows = order[np.searchsorted(connected_ids, pixel_ids[found],
+        sorter=order)]
+    pixel_x = np.empty(len(pixel_ids), dtype=np.float64)
+    pixel_y = np.empty(len(pixel_ids), dtype=np.float64)
+    pixel_x[found] = columns['x'][connected][rows]
+    pixel_y[found] = columns['y'][connected][rows]
+    for i in np.flatnonzero(~found).tolist():
+        pixel = pixelplane.pixels[int(pixel_ids[i])]
+        pixel_x[i], pixel_y[i] = pixel.x, pixel.y
+    c.circles(frame.x(pixel_x), frame.y(pixel_y), 0.4)
+    if labels:
+        c.text(frame.x(pixel_x), frame.y(pixel_y), pixel_ids.astype(str),
+                'Courier', MINOR_FONT)
+
+    c.circles(frame.x([0]), frame.y([0]), 1.0)
+    c.line(frame.x(0), frame.y(0), frame.x(0),
+            frame.y(dimensions['height']/100))
+    c.line(frame.x(0), frame.y(0), frame.x(dimensions['width']/100),
+            frame.y(0))
+    c.text([frame.x(0), frame.x(1.5*dimensions['height']/100)],
+            [frame.y(1.5*dimensions['height']/100), frame.y(0)],
+            ['Y', 'X'], 'Courier', MINOR_FONT)
+
+    # Channels and chip IDs in the color of their chip
+    chipids = list(pixelplane.chips)
+    chip_order = np.argsort(chipids).astype(np.int64)
+    chip_rows = chip_order[np.searchsorted(chipids,
+        columns['chipid'][connected], sorter=chip_order)]
+    counts = np.bincount(chip_rows, minlength=len(chipids))
+    with np.errstate(invalid='ignore'):
+        x_avg = np.bincount(chip_rows, x, len(counts))/counts
+        y_avg = np.bincount(chip_rows, y - 5, len(counts))/counts
+    channel_labels = columns['channel'][connected].astype(str)
+    order = np.argsort(chip_rows, kind='stable')
+    bounds = np.searchsorted(chip_rows[order], np.arange(len(counts) + 1))
+    for i, chipid in enumerate(chipids):
+        color = CHIP_COLORS[i % len(CHIP_COLORS)]
+        rows = order[bounds[i]:bounds[i + 1]]
+        if labels:
+            c.text(x[rows], y[rows] - MINOR_FONT, channel_labels[rows],
+                    'Courier-Bold', MINOR_FONT, color)
+        if counts[i]:
+            c.text([x_avg[i]], [y_avg[i] - MAJOR_FONT/2], [str(chipid)],
+                    'Helvetica', MAJOR_FONT, color, alpha=0.45)
+    c.save()
+
+def draw_anode(geometry, filename, title=None, values=None, vmin=None,
+        vmax=None, pagesize=landscape(letter)):
+    '''
+    Draw every channel of the ``MultiTileGeometry`` ``geometry`` to
+    ``filename`` (PDF, or SVG if the name ends in ``.svg``) as a square,
+    with the outline of each tile. Each anode plane (distinct z) is drawn
+    side by side, in increasing z.
+
+    ``values``, one per row of ``geometry.columns`` (NaN for none),
+    colors each channel on a heat-map scale from ``vmin`` to ``vmax``
+    (default the range of the values). Without ``values``, channels are
+    colored by tile.
+
+    '''
+    columns = geometry.columns
+    half_pitch = geometry.pixel_pitch / 2
+    planes, plane_rows = np.unique(columns['z'], return_inverse=True)
+    x, y = columns['x'], columns['y']
+    if len(x):
+        x_min, x_max = x.min() - half_pitch, x.max() + half_pitch
+        y_min, y_max = y.min() - half_pitch, y.max() + half_pitch
+    else:
+        x_min, x_max, y_min, y_max = 0, 1, 0, 1
+    gap = (x_max - x_min) / 10
+    offset = (x_max - x_min + gap) * np.arange(len(planes))
+    x = x - x_min + offset[plane_rows]
+    y = y - y_min
+    width = max(len(planes), 1)*(x_max - x_min + gap) - gap
+    frame = _Frame(0, 0, width, y_max - y_min, pagesize)
+    c = _canvas(filename, pagesize)
+    px, py = frame.x(x), frame.y(y)
+    half = half_pitch * frame.scale
+    if values is not None:
+        _draw_values(c, px, py, half, values, vmin, vmax)
+    else:
+        tiles, tile_rows = np.unique(columns['tile'], return_inverse=True)
+        for i in range(len(CHIP_COLORS)):
+            rows = np.flatnonzero(tile_rows % len(CHIP_COLORS) == i)
+            if len(rows):
+                c.squares(px[rows], py[rows], half, CHIP_COLORS[i])
+    tiles, tile_rows = np.unique(columns['tile'], return_inverse=True)
+    labels = []
+    for i, tile in enumerate(tiles.tolist()):
+        rows = tile_rows == i
+        left, right = px[rows].min() - half, px[rows].max() + half
+        bottom, top = py[rows].min() - half, py[rows].max() + half
+        c.rect(left, bottom, right - left, top - bottom)
+        labels.append(((left + right)/2, (bottom + top)/2, str(tile)))
+    if labels:
+        label_x, label_y, label_text = zip(*labels)
+        c.text(label_x, label_y, label_text, 'Helvetica', MAJOR_FONT/2,
+                alpha=0.6)
+    for i, z in enumerate(planes.tolist()):
+        c.text([frame.x(offset[i] + (x_max - x_min)/2)],
+                [frame.y(y_max - y_min) + MINOR_FONT*3], ['z = %g' % z],
+                'Helvetica', MAJOR_FONT/2)
+    if title is not None:
+        c.text([pagesize[0]/2], [pagesize[1] - MARGIN/2], [title],
+                'Helvetica', MAJOR_FONT)
+    c.save()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('layoutversion')
+    parser.add_argument('--pixelside', action='store_true')
+    parser.add_argument('--output', help='output file (.pdf or .svg), '
+            'default is layout-<version>-<side>side.pdf')
+    args = parser.parse_args()
+    version = args.layoutversion
+    sidename = 'pixel' if args.pixelside else 'chip'
+    pixelplane = PixelPlane.fromDict(load('layout-' + version + '.yaml'))
+    output = args.output
+    if output is None:
+        output = 'layout-' + version + '-' + sidename + 'side.pdf'
+    draw_plane(pixelplane, output, 'Layout %s (%d chips)' % (version,
+        len(pixelplane.chips)), args.pixelside)
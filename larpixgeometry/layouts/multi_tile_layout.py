@@ -24,62 +24,264 @@ a multi-tile LArPix anode
     the format (module ID, anode ID, tile ID within the anode)
 """
 
+import hashlib
 import json
-import fire
-import yaml
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
 import larpixgeometry.pixelplane
+from larpixgeometry import instrumentation
+from larpixgeometry.layouts import find, load, compiled, yamlio
+from larpixgeometry.networkconfig import parse_network_config
 
 LAYOUT_VERSION = '2.4.0'
 FORMAT_VERSION = '2.1.16'
 PIXEL_PITCH = 4.434
 
-def generate_layout(tile_layout_file, network_config_file, n_tiles, pixel_pitch=PIXEL_PITCH):
+def file_hash(filename):
     """
-    Function that generates the multi-layout YAML file.
+    Function that returns the SHA-1 hash of the contents of a file.
 
     Args:
-        tile_layout_file (str): YAML file containing the tile layout
-        network_config_file (str): JSON file containing the network configuration
-            or txt file with a list of JSON files (one per tile)
-        n_tiles (int): number of tiles
-        pixel_pitch (float): value of pixel pitch, default is PIXEL_PITCH
+        filename (str): the file
     """
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
 
-    with open(tile_layout_file, 'r') as pf:
-        board = larpixgeometry.pixelplane.PixelPlane.fromDict(yaml.load(pf, Loader=yaml.FullLoader))
+def read_cached(cache_dir, name):
+    """
+    Function that returns the array stored under name in the cache
+    directory, or None if there is none.
+
+    Args:
+        cache_dir (str): cache directory
+        name (str): name of the array
+    """
+    try:
+        return np.load(os.path.join(cache_dir, name + '.npy'), allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+
+def write_cached(cache_dir, name, array):
+    """
+    Function that stores an array under name in the cache directory.
+    Failures (e.g. a read-only file system) are ignored.
+
+    Args:
+        cache_dir (str): cache directory
+        name (str): name of the array
+        array (array): the array to store
+    """
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        fd, tmp_path = tempfile.mkstemp(suffix='.npy', dir=cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, os.path.join(cache_dir, name + '.npy'))
+    except OSError:
+        pass
+
+def network_config_files(network_config_file, n_tiles=None):
+    """
+    Function that returns the network configuration file of each tile.
 
+    Args:
+        network_config_file (str or list): JSON file containing the network
+            configuration (used for every tile), txt file with a list of JSON
+            files (one per tile), or a list of such files whose tiles are
+            concatenated
+        n_tiles (int): number of tiles, only used for a JSON file, default is
+            one tile
+    """
+    if isinstance(network_config_file, (list, tuple)):
+        return [config for config_file in network_config_file
+                for config in network_config_files(config_file, n_tiles)]
     with open(network_config_file, 'r') as nc:
         if '.txt' in network_config_file:
-            network_configs = nc.read().splitlines()
+            return [line for line in nc.read().splitlines() if line]
         elif '.json' in network_config_file:
-            network_configs = [network_config_file]*n_tiles
+            return [network_config_file]*(1 if n_tiles is None else n_tiles)
         else:
             raise ValueError("Network configuration file must have txt or json extension")
 
-    chipids = list(board.chips.keys())
+def read_network_configs(network_configs, max_workers=None, processes=False, cache_dir=None):
+    """
+    Function that reads the network configuration of every tile.
+
+    Each distinct file is parsed once, in a pool of threads (or of
+    processes if processes is True), however many tiles it is listed for.
+    If cache_dir is given, the parsed form of each file is kept there, keyed
+    by the hash of the file contents, and only files which are not in the
+    cache are parsed.
+
+    Args:
+        network_configs (list): JSON network configuration file of each tile
+        max_workers (int): size of the pool, default is the executor default
+        processes (bool): parse in a process pool instead of a thread pool
+        cache_dir (str): directory of the parsed files cache, default is no
+            cache
+
+    Returns:
+        integer array with one (tile, IO group, IO channel, chip ID) row per
+        chip, in tile order (tiles are numbered from 1)
+    """
+    paths = [os.path.realpath(network_config) for network_config in network_configs]
+    unique = list(dict.fromkeys(paths))
+    parsed = {}
+    if cache_dir is not None:
+        names = {path: 'network-%s' % file_hash(path) for path in unique}
+        for path in unique:
+            cached = read_cached(cache_dir, names[path])
+            if cached is not None:
+                parsed[path] = cached
+    todo = [path for path in unique if path not in parsed]
+    if len(todo) > 1:
+        executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        with executor(max_workers=max_workers) as pool:
+            parsed.update(zip(todo, pool.map(parse_network_config, todo)))
+    else:
+        parsed.update((path, parse_network_config(path)) for path in todo)
+    if cache_dir is not None:
+        for path in todo:
+            write_cached(cache_dir, names[path], parsed[path])
+    recorder = instrumentation.current()
+    if recorder is not None:
+        recorder.count('network_configs_parsed', len(todo))
+        recorder.count('network_configs_cached', len(unique) - len(todo))
+        recorder.count('bytes_read', sum(os.path.getsize(path) for path in todo))
+    if not paths:
+        return np.zeros((0, 4), dtype=np.int64)
+    tables = [parsed[path] for path in paths]
+    tiles = np.repeat(np.arange(1, len(tables)+1), [len(t) for t in tables])
+    return np.column_stack((tiles, np.concatenate(tables)))
+
+def has_sidecar(filename):
+    """
+    Function that returns whether the compiled form of the current
+    contents of a YAML file exists next to it (see yamlio.write_sidecar).
+
+    Args:
+        filename (str): the YAML file
+    """
+    with open(filename, 'rb') as f:
+        digest = compiled.source_hash(f.read())
+    return os.path.isfile(os.path.join(os.path.dirname(os.path.abspath(filename)),
+                                       compiled.compiled_filename(filename, digest)))
+
+def tile_chip_to_io(network_table, n_tiles):
+    """
+    Function that returns the nested dictionary from tile ID and chip ID to
+    io_group*1000+io_channel.
+
+    Args:
+        network_table (array): (tile, IO group, IO channel, chip ID) table
+            returned by read_network_configs
+        n_tiles (int): number of tiles
+    """
+    tile_chip_io_channel_io_group = {it:{} for it in range(1,n_tiles+1)}
+    codes = network_table[:,1]*1000 + network_table[:,2]
+    for it, chip, code in zip(network_table[:,0].tolist(),
+                              network_table[:,3].tolist(), codes.tolist()):
+        if it in tile_chip_io_channel_io_group:
+            tile_chip_io_channel_io_group[it][chip] = code
+    return tile_chip_io_channel_io_group
+
+def chip_channel_positions(board, pixel_pitch=PIXEL_PITCH):
+    """
+    Function that returns the position of each connected channel of a tile,
+    as a dictionary from chip*1000+channel to (x, y) in multiples of the pixel
+    pitch from the lower edge of the tile.
+
+    Args:
+        board (PixelPlane): the single-tile pixel plane
+        pixel_pitch (float): value of pixel pitch, default is PIXEL_PITCH
+    """
+    columns = board.columns
+    x, y = columns['x'], columns['y']
+    connected = columns['connected'] & (x != 0) & (y != 0)
+    x, y = x[connected], y[connected]
+    if not len(x):
+        return {}
+    keys = columns['chipid'][connected]*1000 + columns['channel'][connected]
+    positions = np.column_stack((np.round((x - x.min())/pixel_pitch),
+                                 np.round((y - y.min())/pixel_pitch)))
+    return dict(zip(keys.tolist(), positions.astype(np.int64).tolist()))
+
+def tile_chip_channel_positions(tile_layout_file, pixel_pitch=PIXEL_PITCH, cache_dir=None):
+    """
+    Function that returns the chip_channel_to_position dictionary of a tile
+    layout file (see chip_channel_positions). If cache_dir is given, the
+    result is kept there, keyed by the hash of the file contents and the
+    pixel pitch.
+
+    Args:
+        tile_layout_file (str): YAML file containing the tile layout, found
+            as by larpixgeometry.layouts.load
+        pixel_pitch (float): value of pixel pitch, default is PIXEL_PITCH
+        cache_dir (str): directory of the cache, default is no cache
+    """
+    path = find(tile_layout_file)
+    data = None
+    if cache_dir is not None:
+        with open(path, 'rb') as f:
+            data = f.read()
+        name = 'positions-%s-%r' % (hashlib.sha1(data).hexdigest(), float(pixel_pitch))
+        cached = read_cached(cache_dir, name)
+        if cached is not None:
+            return dict(zip(cached[:,0].tolist(), cached[:,1:].tolist()))
+    board = larpixgeometry.pixelplane.PixelPlane.fromDict(load(path, data=data))
+    chip_channel = chip_channel_positions(board, pixel_pitch)
+    if cache_dir is not None:
+        write_cached(cache_dir, name, np.array([[key] + position
+            for key, position in chip_channel.items()], dtype=np.int64).reshape(-1, 3))
+    return chip_channel
+
+@instrumentation.instrumented('generate_layout')
+def generate_layout(tile_layout_file, network_config_file, n_tiles=None, pixel_pitch=PIXEL_PITCH, output=None, max_workers=None, incremental=False, cache_dir=None, sidecar=False):
+    """
+    Function that generates the multi-layout YAML file.
 
-    io_channels_tile = {}
-    io_group_tile = {}
+    Args:
+        tile_layout_file (str): YAML file containing the tile layout
+        network_config_file (str or list): JSON file containing the network
+            configuration, txt file with a list of JSON files (one per tile)
+            or a list of such files
+        n_tiles (int): number of tiles, default is the number of network
+            configuration files
+        pixel_pitch (float): value of pixel pitch, default is PIXEL_PITCH
+        output (str): output YAML file, default is
+            multi_tile_layout-FORMAT_VERSION.yaml
+        max_workers (int): number of threads reading the network configuration
+            files, default is the executor default
+        incremental (bool): keep the parsed form of each input file in a
+            cache keyed by the hash of its contents, and only parse the files
+            which changed since the last run. The output file is only
+            rewritten if its contents change
+        cache_dir (str): cache directory for incremental mode, default is
+            the multi_tile directory of the compiled layouts cache directory
+        sidecar (bool): also write the compiled binary form of the output
+            next to it (see larpixgeometry.layouts.yamlio)
 
-    for it,network_config in enumerate(network_configs):
+    With instrumentation on (see larpixgeometry.instrumentation), the
+    network_configs, positions and write stages are timed as
+    generate_layout.<stage>, and the network configuration files parsed and
+    found in the cache are counted.
+    """
 
-        with open(network_config, 'r') as nc:
-            nc_json = json.load(nc)
+    if incremental and cache_dir is None:
+        cache_dir = os.path.join(compiled.cache_dir(), 'multi_tile')
+    elif not incremental:
+        cache_dir = None
 
-        io_group = list(nc_json['network'].keys())[0]
-        io_channels = nc_json['network'][io_group]
-        io_channels_tile[it+1] = {}
-        io_group_tile[it+1] = int(io_group)
+    network_configs = network_config_files(network_config_file, n_tiles)
+    if n_tiles is None:
+        n_tiles = len(network_configs)
 
-        for io_channel in io_channels:
-            nodes = io_channels[io_channel]['nodes']
-            for node in nodes:
-                chip_id = node['chip_id']
-                if isinstance(chip_id, int):
-                    if int(io_channel) in io_channels_tile[it+1]:
-                        io_channels_tile[it+1][int(io_channel)].append(chip_id)
-                    else:
-                        io_channels_tile[it+1][int(io_channel)] = [chip_id]
+    with instrumentation.stage('generate_layout.network_configs'):
+        network_table = read_network_configs(network_configs, max_workers,
+                                             cache_dir=cache_dir)
 
     ## These positions comes from the GDML file.
     ## The numbers are in mm and were provided by Patrick Koller.
@@ -140,41 +342,43 @@ def generate_layout(tile_layout_file, network_config_file, n_tiles, pixel_pitch=
                          15: [-1,-1,-1],
                          16: [-1, 1, 1]}
 
-    tile_chip_io_channel_io_group = {it:{} for it in range(1,n_tiles+1)}
+    tile_chip_io_channel_io_group = tile_chip_to_io(network_table, n_tiles)
+
+    with instrumentation.stage('generate_layout.positions'):
+        chip_channel = tile_chip_channel_positions(tile_layout_file, pixel_pitch,
+                                                   cache_dir)
+
+    if output is None:
+        output = 'multi_tile_layout-%s.yaml' % FORMAT_VERSION
+
+    layout = {'tile_layout_version': LAYOUT_VERSION,
+              'multitile_layout_version': FORMAT_VERSION,
+              'pixel_pitch': pixel_pitch,
+              'tile_positions': tile_positions,
+              'tile_orientations': tile_orientations,
+              'tpc_centers': tpc_centers,
+              'tile_chip_to_io': tile_chip_io_channel_io_group,
+              'tile_indeces': tile_indeces,
+              'chip_channel_to_position': chip_channel}
+
+    if cache_dir is not None:
+        # Skip rewriting the output if it was written from the same layout
+        layout_hash = hashlib.sha1(json.dumps(layout, sort_keys=True).encode('utf-8')).hexdigest()
+        name = 'output-%s' % hashlib.sha1(os.path.realpath(output).encode('utf-8')).hexdigest()
+        written = read_cached(cache_dir, name)
+        if (written is not None and os.path.isfile(output)
+                and written.tolist() == [layout_hash, file_hash(output)]):
+            if sidecar and not has_sidecar(output):
+                with open(output, 'rb') as f:
+                    yamlio.write_sidecar(output, f.read(), layout)
+            return
+
+    with instrumentation.stage('generate_layout.write'):
+        yamlio.dump(layout, output, sidecar)
 
-    for it in tile_chip_io_channel_io_group:
-        io_channels = io_channels_tile[it]
-        for io_channel in io_channels:
-            for chip in io_channels[io_channel]:
-                tile_chip_io_channel_io_group[it][chip] = io_group_tile[it]*1000 + io_channel
-
-    chip_channel = {}
-
-    xs = []
-    ys = []
-    for chip in chipids:
-        for channel, pixel in enumerate(board.chips[chip].channel_connections):
-            if pixel.x !=0 and pixel.y != 0:
-                xs.append(pixel.x)
-                ys.append(pixel.y)
-
-    for chip in chipids:
-        for channel, pixel in enumerate(board.chips[chip].channel_connections):
-            if pixel.x !=0 and pixel.y != 0:
-                key = chip*1000+channel
-                chip_channel[key] = [round((pixel.x - min(xs))/pixel_pitch),
-                                     round((pixel.y - min(ys))/pixel_pitch)]
-
-    with open('multi_tile_layout-%s.yaml' % FORMAT_VERSION, 'w') as f:
-        yaml.dump({'tile_layout_version': LAYOUT_VERSION,
-                   'multitile_layout_version': FORMAT_VERSION,
-                   'pixel_pitch': pixel_pitch,
-                   'tile_positions': tile_positions,
-                   'tile_orientations': tile_orientations,
-                   'tpc_centers': tpc_centers,
-                   'tile_chip_to_io': tile_chip_io_channel_io_group,
-                   'tile_indeces': tile_indeces,
-                   'chip_channel_to_position': chip_channel}, f)
+    if cache_dir is not None:
+        write_cached(cache_dir, name, np.array([layout_hash, file_hash(output)]))
 
 if __name__ == "__main__":
+    import fire
     fire.Fire(generate_layout)
@@ -3,7 +3,6 @@ Generate pixel plane patterns.
 
 '''
 
-from itertools import product
 import numpy as np
 
 def pixels_plain_grid(pixel_pitch, nblocksx, nblocksy, startx, starty, start_index, batch_size=4, pixels_per_grid=16):
@@ -11,23 +10,36 @@ def pixels_plain_grid(pixel_pitch, nblocksx, nblocksy, startx, starty, start_ind
     A plain grid of no-pad no-focus pixels, numbered in batches of batch_size x batch_size.
 
     '''
-    pixels = []
+    return pixels_list(*pixels_plain_grid_arrays(pixel_pitch, nblocksx,
+        nblocksy, startx, starty, start_index, batch_size, pixels_per_grid))
+
+def pixels_plain_grid_arrays(pixel_pitch, nblocksx, nblocksy, startx,
+        starty, start_index, batch_size=4, pixels_per_grid=16):
+    '''
+    Array version of ``pixels_plain_grid``, returning ``(pixelids, x,
+    y)`` with the same IDs, positions and ordering.
+
+    ``startx``, ``starty`` and ``start_index`` may also be 1D arrays (of
+    the same length) to generate one grid per entry in a single call,
+    e.g. one grid per chip. The grids are concatenated in order.
+
+    '''
     repetition_period = batch_size * pixel_pitch
     x, y, = np.meshgrid(pixel_pitch*np.arange(batch_size),
             pixel_pitch*np.arange(batch_size))
-    subgrid = np.array(list(zip(x.reshape(-1), y.reshape(-1))))
-    # This line forms the list of blocks going along rows. Without this
-    # nonsense (just using product(range, range) goes down columns).
-    blocklist = np.array(list(product(range(nblocksy), range(nblocksx))))[:, ::-1]
-    for block_index, (xblock, yblock) in enumerate(blocklist):
-        pixelids = range(block_index*pixels_per_grid + start_index,
-                (block_index+1)*pixels_per_grid + start_index)
-        offset = np.array([xblock*repetition_period + startx,
-            yblock*repetition_period + starty])
-        pixel_locations = subgrid + offset
-        for pixelid, (x, y) in zip(pixelids, pixel_locations):
-            pixels.append([pixelid, float(x), float(y), [], []])
-    return pixels
+    return _block_grid_arrays(x.reshape(-1), y.reshape(-1),
+            repetition_period, nblocksx, nblocksy, startx, starty,
+            start_index, pixels_per_grid)
+
+# Pixel positions within a block of the triangle grid, in units of 1/8
+# of the repetition period, laid out here in the orientation on the board
+_TRIANGLE_SUBGRID = np.array(
+              [[2, 1],              [6, 1],
+        [1, 2],       [3, 2],       [5, 2],       [7, 2],
+              [2, 10/3.],           [6, 10/3.],
+              [2, 14/3.],           [6, 14/3.],
+        [1, 6],       [3, 6],       [5, 6],       [7, 6],
+              [2, 7],               [6, 7]])
 
 def pixels_triangle_grid(repetition_period, nblocksx, nblocksy, startx,
         starty, start_index):
@@ -35,28 +47,68 @@ def pixels_triangle_grid(repetition_period, nblocksx, nblocksy, startx,
     A grid of triangle pixels specific to the LArPix sensor board.
 
     '''
-    pixels = []
-    unit = repetition_period / 8.0
-    subgrid = np.array(  # Laid out here in the orientation on the board
-              [[2*unit, unit],                [6*unit, unit],
-        [unit, 2*unit], [3*unit, 2*unit], [5*unit, 2*unit], [7*unit, 2*unit],
-               [2*unit, 10/3.*unit],          [6*unit, 10/3.*unit],
-               [2*unit, 14/3.*unit],          [6*unit, 14/3.*unit],
-        [unit, 6*unit], [3*unit, 6*unit], [5*unit, 6*unit], [7*unit, 6*unit],
-               [2*unit, 7*unit],              [6*unit, 7*unit]])
+    return pixels_list(*pixels_triangle_grid_arrays(repetition_period,
+        nblocksx, nblocksy, startx, starty, start_index))
+
+def pixels_triangle_grid_arrays(repetition_period, nblocksx, nblocksy,
+        startx, starty, start_index):
+    '''
+    Array version of ``pixels_triangle_grid``, returning ``(pixelids,
+    x, y)`` with the same IDs, positions and ordering.
+
+    ``startx``, ``starty`` and ``start_index`` may also be 1D arrays, as
+    for ``pixels_plain_grid_arrays``.
+
+    '''
+    subgrid = _TRIANGLE_SUBGRID * (repetition_period / 8.0)
     pixels_per_grid = len(subgrid)
-    # This line forms the list of blocks going along rows. Without this
-    # nonsense (just using product(range, range) goes down columns).
-    blocklist = np.array(list(product(range(nblocksy), range(nblocksx))))[:, ::-1]
-    for block_index, (xblock, yblock) in enumerate(blocklist):
-        pixelids = range(block_index*pixels_per_grid + start_index,
-                (block_index+1)*pixels_per_grid + start_index)
-        offset = np.array([xblock*repetition_period + startx,
-            yblock*repetition_period + starty])
-        pixel_locations = subgrid + offset
-        for pixelid, (x, y) in zip(pixelids, pixel_locations):
-            pixels.append([pixelid, float(x), float(y), [], []])
-    return pixels
+    return _block_grid_arrays(subgrid[:, 0], subgrid[:, 1],
+            repetition_period, nblocksx, nblocksy, startx, starty,
+            start_index, pixels_per_grid)
+
+def _block_grid_arrays(subgrid_x, subgrid_y, repetition_period, nblocksx,
+        nblocksy, startx, starty, start_index, pixels_per_grid):
+    '''
+    Repeat the subgrid over nblocksx x nblocksy blocks (going along
+    rows) for every (startx, starty, start_index), in one broadcast
+    operation.
+
+    The arithmetic is the same as in the original per-block loop, so
+    the positions are identical to the last bit.
+
+    '''
+    startx, starty, start_index = np.broadcast_arrays(np.asarray(startx),
+            np.asarray(starty), np.asarray(start_index))
+    single = startx.ndim == 0
+    startx, starty, start_index = (np.atleast_1d(startx),
+            np.atleast_1d(starty), np.atleast_1d(start_index))
+    xblock = np.tile(np.arange(nblocksx), nblocksy)
+    yblock = np.repeat(np.arange(nblocksy), nblocksx)
+    block_index = np.arange(nblocksx * nblocksy)
+    # Only as many pixels per block as both the subgrid and the ID range
+    # provide (the original zipped the two together)
+    n_pixels = min(len(subgrid_x), pixels_per_grid)
+    # Axes: (grid, block, pixel within block)
+    offset_x = xblock*repetition_period + startx[:, None]
+    offset_y = yblock*repetition_period + starty[:, None]
+    x = subgrid_x[:n_pixels] + offset_x[:, :, None]
+    y = subgrid_y[:n_pixels] + offset_y[:, :, None]
+    pixelids = (block_index[:, None]*pixels_per_grid + np.arange(n_pixels)
+            + start_index[:, None, None])
+    if single:
+        x, y, pixelids = x[0], y[0], pixelids[0]
+    return (pixelids.reshape(-1).astype(np.int64),
+            x.reshape(-1).astype(np.float64), y.reshape(-1).astype(np.float64))
+
+def pixels_list(pixelids, x, y):
+    '''
+    Convert ``(pixelids, x, y)`` arrays into the list-of-pixels format
+    of the layout files (with no pad or focus outlines).
+
+    '''
+    return [[pixelid, x, y, [], []] for pixelid, x, y in
+            zip(np.asarray(pixelids).tolist(), np.asarray(x).tolist(),
+                np.asarray(y).tolist())]
 
 grid_4x4_assignments_v1 = [14, 13, 15, 12, 10, 9, 11, 8, 7, 4, 6, 5, 3, 0, 2, 1]
 '''
@@ -186,6 +238,192 @@ are numbered according to the following grid::
 '''
 
 
+class AssignmentTable(object):
+    '''
+    An assignment list as NumPy arrays, with its inverse and the
+    variants of the upside-down chip precomputed:
+
+    - ``forward[channel]``: the position of the channel's pixel (the
+      assignment list, -1 for None)
+    - ``flipped[channel]``: the same for an upside-down chip, i.e. the
+      reversed list, as used by ``assign_pixels``
+    - ``inverse[position]``, ``inverse_flipped[position]``: the channel
+      of the pixel at each position, -1 if none
+    - ``positions``: the ``(x, y)`` of each position within the grid the
+      list assigns, in units of the pixel pitch for square grids of
+      ``side`` x ``side`` pixels (numbered along rows, as in
+      ``pixels_plain_grid``) and of 1/8 of the repetition period for the
+      triangle grid (``side`` is None)
+
+    Each array has a trailing -1 (or NaN) sentinel entry, which
+    out-of-range channels and positions are clipped to.
+
+    '''
+    def __init__(self, assignments, side=None, positions=None):
+        forward = np.array([-1 if assignment is None else assignment
+            for assignment in assignments], dtype=np.int64)
+        n_positions = int(forward.max()) + 1 if len(forward) else 0
+        if positions is None:
+            if side is None:
+                side = int(np.ceil(np.sqrt(n_positions)))
+            n_positions = side * side
+            positions = np.column_stack((np.arange(n_positions) % side,
+                np.arange(n_positions) // side))
+        else:
+            positions = np.asarray(positions, dtype=np.float64)
+            n_positions = len(positions)
+        self.side = side
+        self.n_channels = len(forward)
+        self.n_positions = n_positions
+        self.positions = np.vstack((positions.astype(np.float64),
+            [[np.nan, np.nan]]))
+        self.forward = np.append(forward, -1)
+        self.flipped = np.append(forward[::-1], -1)
+        connected = np.flatnonzero(forward >= 0)
+        self.inverse = np.full(n_positions + 1, -1, dtype=np.int64)
+        self.inverse[forward[connected]] = connected
+        self.inverse_flipped = np.where(self.inverse >= 0,
+                self.n_channels - 1 - self.inverse, -1)
+        for array in (self.positions, self.forward, self.flipped,
+                self.inverse, self.inverse_flipped):
+            array.flags.writeable = False
+
+    def channel_positions(self, channels, right_side_up=True):
+        '''
+        Return the position of the pixel of each channel, -1 for
+        unconnected and out-of-range channels. ``right_side_up`` may be
+        a single bool or one per channel.
+
+        '''
+        channels = clip_keys(channels, self.n_channels)
+        return np.where(right_side_up, self.forward[channels],
+                self.flipped[channels])
+
+    def position_channels(self, positions, right_side_up=True):
+        '''
+        Return the channel of the pixel at each position, -1 if none.
+
+        '''
+        positions = clip_keys(positions, self.n_positions)
+        return np.where(right_side_up, self.inverse[positions],
+                self.inverse_flipped[positions])
+
+    def xy_positions(self, x, y):
+        '''
+        Return the position at each local ``(x, y)`` (within half a unit
+        of it), -1 if none.
+
+        '''
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if self.side is not None:
+            with np.errstate(invalid='ignore'):
+                column, row = np.rint(x), np.rint(y)
+                inside = ((column >= 0) & (column < self.side)
+                        & (row >= 0) & (row < self.side))
+            return np.where(inside, np.where(inside, row, 0) * self.side
+                    + np.where(inside, column, 0), -1).astype(np.int64)
+        # Nearest of the few positions of the triangle grid
+        distance = ((x[..., None] - self.positions[:-1, 0])**2
+                + (y[..., None] - self.positions[:-1, 1])**2)
+        nearest = np.argmin(distance, axis=-1)
+        with np.errstate(invalid='ignore'):
+            found = np.min(distance, axis=-1) <= 0.25
+        return np.where(found, nearest, -1)
+
+def clip_keys(keys, size):
+    '''
+    Return ``keys`` as unsigned indices, with negative keys and keys of
+    at least ``size`` clipped to ``size``, the row of a table's trailing
+    sentinel.
+
+    The same as ``larpixgeometry.packedkeys.clip_keys``, which this
+    module does not import so that the layout scripts can use it
+    without the package installed.
+
+    '''
+    keys = np.asarray(keys).astype(np.intp, copy=False)
+    return np.minimum(keys.view(np.uintp), size)
+
+assignment_tables = {
+        'grid_4x4_assignments_v1':
+            AssignmentTable(grid_4x4_assignments_v1, side=4),
+        'grid_4x4_assignments_0_15_v1_2':
+            AssignmentTable(grid_4x4_assignments_0_15_v1_2, side=4),
+        'grid_4x4_assignments_16_31_v1_2':
+            AssignmentTable(grid_4x4_assignments_16_31_v1_2, side=4),
+        'triangle_assignments_v1':
+            AssignmentTable(triangle_assignments_v1,
+                positions=_TRIANGLE_SUBGRID),
+        'grid_4x4_assignments_0_16_v2_2':
+            AssignmentTable(grid_4x4_assignments_0_16_v2_2, side=4),
+        'grid_4x4_assignments_16_31_v2_2':
+            AssignmentTable(grid_4x4_assignments_16_31_v2_2, side=4),
+        'grid_4x4_assignments_31_46_v2_2':
+            AssignmentTable(grid_4x4_assignments_31_46_v2_2, side=4),
+        'grid_4x4_assignments_46_64_v2_2':
+            AssignmentTable(grid_4x4_assignments_46_64_v2_2, side=4),
+        'grid_7x7_assignments_0_64_v2_2_1':
+            AssignmentTable(grid_7x7_assignments_0_64_v2_2_1, side=7),
+        }
+'''
+The ``AssignmentTable`` of each assignment list of this module, by name.
+
+'''
+
+def assignment_table(assignments):
+    '''
+    Return the ``AssignmentTable`` of ``assignments``: a table, the name
+    of one of the assignment lists of this module, or an assignment
+    list, whose table (on the smallest square grid holding its
+    positions, unless it is one of this module's lists) is built once
+    and cached.
+
+    '''
+    if isinstance(assignments, AssignmentTable):
+        return assignments
+    if isinstance(assignments, str):
+        return assignment_tables[assignments]
+    key = tuple(assignments)
+    table = _list_tables.get(key)
+    if table is None:
+        for name, named in assignment_tables.items():
+            if globals()[name] == list(key):
+                table = named
+                break
+        else:
+            table = AssignmentTable(key)
+        _list_tables[key] = table
+    return table
+
+_list_tables = {}
+
+def channel_to_local_xy(channels, assignments, right_side_up=True):
+    '''
+    Return ``(x, y)`` arrays with the local position (see
+    ``AssignmentTable.positions``) of the pixel of each channel assigned
+    by ``assignments`` (see ``assignment_table``), NaN for unconnected
+    and out-of-range channels. ``right_side_up`` may be a single bool
+    or one per channel.
+
+    >>> x, y = channel_to_local_xy(np.arange(64),
+    ...     'grid_7x7_assignments_0_64_v2_2_1')
+
+    '''
+    table = assignment_table(assignments)
+    positions = clip_keys(table.channel_positions(channels, right_side_up),
+            table.n_positions)
+    return table.positions[positions, 0], table.positions[positions, 1]
+
+def local_xy_to_channel(x, y, assignments, right_side_up=True):
+    '''
+    Inverse of ``channel_to_local_xy``: return the channel of the pixel
+    at each local ``(x, y)``, -1 where there is no connected pixel.
+
+    '''
+    table = assignment_table(assignments)
+    return table.position_channels(table.xy_positions(x, y), right_side_up)
+
 def assign_pixels(pixelids, assignments, right_side_up=True, channel_ids=None):
     '''
     Return a list assigning the given pixelids to a chip's channels
@@ -216,3 +454,217 @@ def assign_pixels(pixelids, assignments, right_side_up=True, channel_ids=None):
         else:
             channel_connections.append(pixelids[assignments[channel_id]])
     return channel_connections
+
+def assign_pixels_arrays(pixelids, assignments, right_side_up=True,
+        n_channels=None):
+    '''
+    Batch version of ``assign_pixels`` for many chips at once.
+
+    ``assignments`` may also be a name or an ``AssignmentTable`` (see
+    ``assignment_table``). ``pixelids`` is a 2D array with one row of
+    pixel IDs per chip (use -1 where ``assign_pixels`` would get None),
+    and ``right_side_up`` may be a single bool or one bool per chip.
+    ``n_channels`` plays the role of ``len(channel_ids)`` and defaults
+    to the number of pixel IDs per chip.
+
+    Returns a 2D array with one row of channel connections per chip,
+    with -1 for unconnected channels where ``assign_pixels`` gives None.
+
+    '''
+    pixelids = np.atleast_2d(np.asarray(pixelids, dtype=np.int64))
+    if n_channels is None:
+        n_channels = pixelids.shape[1]
+    table = assignment_table(assignments)
+    forward, backward = table.forward[:-1], table.flipped[:-1]
+    right_side_up = np.broadcast_to(np.asarray(right_side_up, dtype=bool),
+            (len(pixelids),))
+    channel_assignments = np.where(right_side_up[:, None],
+            forward[:n_channels], backward[:n_channels])
+    connections = np.take_along_axis(pixelids,
+            np.maximum(channel_assignments, 0), axis=1)
+    return np.where(channel_assignments >= 0, connections, -1)
+
+def chip_starts(columns, rows, chip_cells, pixel_pitch, width, height):
+    '''
+    Return the ``(x, y)`` start (first pixel center) of the pixel grid of
+    each chip of a tile of square chips, from the column and row of each
+    chip, as in the 2.x layouts: ``column * chip_cells * pixel_pitch +
+    pixel_pitch/2 - width/2``.
+
+    '''
+    columns = np.asarray(columns, dtype=np.int64)
+    rows = np.asarray(rows, dtype=np.int64)
+    return np.column_stack((
+        (columns * chip_cells) * pixel_pitch + pixel_pitch/2 - width/2,
+        (rows * chip_cells) * pixel_pitch + pixel_pitch/2 - height/2))
+
+def tile_spec(chip_ids, columns, rows, pixel_pitch=4.434, chip_cells=7,
+        assignment='grid_7x7_assignments_0_64_v2_2_1', width=None,
+        height=None):
+    '''
+    Return the layout spec (see ``build_layout``) of a tile of chips
+    with a ``chip_cells`` x ``chip_cells`` grid of pixels each, in the
+    style of the 2.x layouts, with chip ``chip_ids[i]`` at
+    ``(columns[i], rows[i])`` (column 0 at the left and row 0 at the
+    bottom: x increases with the column and y with the row). Pixel IDs
+    are numbered chip by chip in the order of ``chip_ids``. ``width``
+    and ``height`` default to the size of the chip grid.
+
+    >>> ids = range(400)
+    >>> spec = tile_spec(ids, [i % 20 for i in ids], [i // 20 for i in ids])
+
+    '''
+    chip_ids = list(chip_ids)
+    if width is None:
+        width = pixel_pitch * (chip_cells * (max(columns) + 1))
+    if height is None:
+        height = pixel_pitch * (chip_cells * (max(rows) + 1))
+    n_pixels = chip_cells * chip_cells
+    return {
+            'x': -width/2,
+            'y': -height/2,
+            'width': width,
+            'height': height,
+            'grids': [{'pattern': 'plain', 'pitch': pixel_pitch,
+                'blocks': [1, 1], 'batch_size': chip_cells,
+                'pixels_per_grid': n_pixels,
+                'start': chip_starts(columns, rows, chip_cells, pixel_pitch,
+                    width, height).tolist()}],
+            'chips': [{'chipid': chipid, 'right_side_up': True,
+                'assignments': [[assignment, index * n_pixels]]}
+                for index, chipid in enumerate(chip_ids)],
+            }
+
+def _grid_arrays(grid):
+    '''
+    Return ``(pixelids, x, y)`` of one ``grids`` entry of a layout spec,
+    with pixel IDs starting at 0, one grid per start, numbered as if each
+    grid started where the previous one ended.
+
+    '''
+    start = np.asarray(grid['start'], dtype=np.float64).reshape(-1, 2)
+    nblocksx, nblocksy = grid['blocks']
+    if grid['pattern'] == 'plain':
+        pixelids, x, y = pixels_plain_grid_arrays(grid['pitch'], nblocksx,
+                nblocksy, start[:, 0], start[:, 1], 0,
+                grid.get('batch_size', 4), grid.get('pixels_per_grid', 16))
+    elif grid['pattern'] == 'triangle':
+        pixelids, x, y = pixels_triangle_grid_arrays(grid['pitch'], nblocksx,
+                nblocksy, start[:, 0], start[:, 1], 0)
+    else:
+        raise ValueError('Unknown pixel pattern: %s' % grid['pattern'])
+    per_grid = len(pixelids) // max(len(start), 1)
+    pixelids = pixelids + np.repeat(np.arange(len(start)) * per_grid, per_grid)
+    return pixelids, x, y
+
+def build_layout_arrays(spec):
+    '''
+    Build the layout described by ``spec`` (see ``build_layout``) into
+    arrays, with one vectorized call per entry of ``grids`` and per
+    distinct assignment list.
+
+    Returns a dict with ``'pixelids'``, ``'x'``, ``'y'`` (one entry per
+    pixel), ``'chipids'``, ``'chip_offsets'`` (channels of chip ``i`` at
+    ``chip_offsets[i]:chip_offsets[i + 1]``) and ``'channel_pixelids'``
+    (-1 for unconnected channels).
+
+    '''
+    pixelids, xs, ys = [], [], []
+    n_pixels = 0
+    for grid in spec['grids']:
+        grid_pixelids, x, y = _grid_arrays(grid)
+        pixelids.append(grid_pixelids + n_pixels)
+        xs.append(x)
+        ys.append(y)
+        n_pixels += len(grid_pixelids)
+
+    # One entry per block of channels: (chip row, assignments name,
+    # first pixel ID or None, number of channels)
+    chips = spec['chips']
+    blocks = []
+    for row, chip in enumerate(chips):
+        for block in chip['assignments']:
+            name, first = block[0], block[1]
+            n_channels = (block[2] if len(block) > 2
+                    else assignment_table(name).n_channels)
+            blocks.append((row, name, first, n_channels))
+    block_channels = np.array([block[3] for block in blocks], dtype=np.int64)
+    block_offsets = np.zeros(len(blocks) + 1, dtype=np.int64)
+    np.cumsum(block_channels, out=block_offsets[1:])
+    block_rows = np.array([block[0] for block in blocks], dtype=np.int64)
+    chip_offsets = np.zeros(len(chips) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(block_rows, block_channels, len(chips)).astype(
+        np.int64), out=chip_offsets[1:])
+    channel_pixelids = np.full(block_offsets[-1], -1, dtype=np.int64)
+    groups = {}
+    for index, (_, name, _, n_channels) in enumerate(blocks):
+        key = (name if isinstance(name, str) else tuple(name), n_channels)
+        groups.setdefault(key, []).append(index)
+    for (name, n_channels), indices in groups.items():
+        table = assignment_table(name)
+        n_ids = int(table.forward.max()) + 1
+        first = np.array([-1 if blocks[i][2] is None else blocks[i][2]
+            for i in indices], dtype=np.int64)
+        ids = np.where(first[:, None] >= 0, first[:, None] + np.arange(n_ids),
+                -1)
+        right_side_up = [chips[blocks[i][0]].get('right_side_up', True)
+                for i in indices]
+        connections = assign_pixels_arrays(ids, table, right_side_up,
+                n_channels)
+        positions = (block_offsets[indices][:, None]
+                + np.arange(n_channels)).reshape(-1)
+        channel_pixelids[positions] = connections.reshape(-1)
+    return {
+            'pixelids': np.concatenate(pixelids) if pixelids
+                else np.zeros(0, dtype=np.int64),
+            'x': np.concatenate(xs) if xs else np.zeros(0),
+            'y': np.concatenate(ys) if ys else np.zeros(0),
+            'chipids': np.array([chip['chipid'] for chip in chips],
+                dtype=np.int64),
+            'chip_offsets': chip_offsets,
+            'channel_pixelids': channel_pixelids,
+            }
+
+def build_layout(spec):
+    '''
+    Return the layout file contents (the dict written by the
+    ``layout-*.py`` scripts) described by the declarative ``spec``, a
+    dict with:
+
+    - ``'x'``, ``'y'``, ``'width'``, ``'height'``: the bounding rectangle
+    - ``'grids'``: the pixel grids, whose pixel IDs are numbered
+      consecutively in order. Each is a dict with ``'pattern'``
+      (``'plain'`` or ``'triangle'``), ``'pitch'`` (the pixel pitch, or
+      the repetition period for triangle grids), ``'blocks'`` (``[nx,
+      ny]``), ``'start'`` (one ``[x, y]`` per grid, e.g. one per chip)
+      and, for plain grids, the optional ``'batch_size'`` and
+      ``'pixels_per_grid'`` of ``pixels_plain_grid``.
+    - ``'chips'``: one dict per chip with ``'chipid'``,
+      ``'right_side_up'`` and ``'assignments'``, a list of ``[name,
+      first_pixelid]`` or ``[name, first_pixelid, n_channels]`` blocks of
+      channels, in channel order. ``name`` is one of the assignment
+      lists of this module (or a list), ``first_pixelid`` the first of
+      the consecutive pixel IDs it assigns (None for no pixels), and
+      ``n_channels`` defaults to the length of the assignment list, as
+      in ``assign_pixels``.
+
+    The result is identical to the one built chip by chip with
+    ``pixels_plain_grid``, ``pixels_triangle_grid`` and
+    ``assign_pixels``.
+
+    '''
+    arrays = build_layout_arrays(spec)
+    offsets = arrays['chip_offsets'].tolist()
+    channels = [None if pixelid < 0 else pixelid
+            for pixelid in arrays['channel_pixelids'].tolist()]
+    return {
+            'pixels': pixels_list(arrays['pixelids'], arrays['x'],
+                arrays['y']),
+            'chips': [[chipid, channels[start:stop]] for chipid, start, stop
+                in zip(arrays['chipids'].tolist(), offsets[:-1],
+                    offsets[1:])],
+            'x': spec['x'],
+            'y': spec['y'],
+            'width': spec['width'],
+            'height': spec['height'],
+            }
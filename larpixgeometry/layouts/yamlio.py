@@ -0,0 +1,189 @@
+'''
+Reading and writing layout YAML files.
+
+Uses libyaml (``CSafeLoader`` and ``CSafeDumper``) when PyYAML was built
+with it, and the pure-Python ``SafeLoader`` and ``SafeDumper``
+otherwise. Either way the files are plain YAML.
+
+``dump`` writes the short lists which make up most of a layout file
+(pixels, outlines, channel lists, positions) in flow style, e.g. one
+``- [1, 2.217, 2.217, [], []]`` line per pixel, which makes the files
+several times smaller and faster to write and to parse than the block
+style that ``yaml.dump`` uses by default. It can also write a compiled
+binary "sidecar" next to the YAML file (see
+``larpixgeometry.layouts.compiled``), which ``larpixgeometry.layouts.load``
+then reads instead of parsing the YAML.
+
+'''
+import os
+import re
+import warnings
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as Loader, CSafeDumper as _BaseDumper
+except ImportError:
+    from yaml import SafeLoader as Loader, SafeDumper as _BaseDumper
+
+class Dumper(_BaseDumper):
+    '''
+    YAML dumper writing flat lists, and lists of flat lists, in flow
+    style.
+
+    '''
+
+# Line width passed to the PyYAML emitter, i.e. no line wrapping
+_WIDTH = 2**31 - 1
+
+class _Unsupported(Exception):
+    pass
+
+def _format_scalar(value):
+    '''
+    Format a scalar as PyYAML's ``SafeRepresenter`` does.
+
+    '''
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if type(value) is int:
+        return str(value)
+    if type(value) is float:
+        if value != value:
+            return '.nan'
+        if value in (float('inf'), float('-inf')):
+            return '.inf' if value > 0 else '-.inf'
+        text = repr(value).lower()
+        if '.' not in text and 'e' in text:
+            text = text.replace('e', '.0e', 1)
+        return text
+    if isinstance(value, str):
+        text = yaml.dump(value, Dumper=Dumper, allow_unicode=True,
+                width=_WIDTH)
+        if text.endswith('\n...\n'):
+            text = text[:-len('\n...\n')]
+        text = text.rstrip('\n')
+        if '\n' not in text:
+            return text
+    raise _Unsupported()
+
+def _format_flow(value):
+    if isinstance(value, list):
+        return '[' + ', '.join([_format_flow(item) for item in value]) + ']'
+    return _format_scalar(value)
+
+def _format_mapping(d, indent, lines):
+    if not isinstance(d, dict):
+        raise _Unsupported()
+    try:
+        items = sorted(d.items())
+    except TypeError:
+        items = list(d.items())
+    for key, value in items:
+        key = _format_scalar(key)
+        if isinstance(value, dict):
+            if not value:
+                lines.append('%s%s: {}' % (indent, key))
+                continue
+            lines.append('%s%s:' % (indent, key))
+            _format_mapping(value, indent + '  ', lines)
+        elif isinstance(value, list) and not _is_flow(value):
+            lines.append('%s%s:' % (indent, key))
+            for item in value:
+                if isinstance(item, list) and not _is_flow(item):
+                    raise _Unsupported()
+                lines.append('%s- %s' % (indent, _format_flow(item)))
+        else:
+            lines.append('%s%s: %s' % (indent, key, _format_flow(value)))
+
+def _is_flat(data):
+    return not any(isinstance(item, (list, dict)) for item in data)
+
+def _is_flow(data):
+    '''
+    Return whether the list ``data`` is written in flow style: lists
+    containing scalars, or only flat lists, but no dicts.
+
+    '''
+    if any(isinstance(item, dict) for item in data):
+        return False
+    return (not all(isinstance(item, list) for item in data)
+            or all(_is_flat(item) for item in data))
+
+def _represent_list(dumper, data):
+    return dumper.represent_sequence('tag:yaml.org,2002:seq', data,
+            flow_style=_is_flow(data))
+
+Dumper.add_representer(list, _represent_list)
+
+def parse(data):
+    '''
+    Parse the YAML document ``data`` (bytes or str).
+
+    '''
+    return yaml.load(data, Loader=Loader)
+
+def dumps(d):
+    '''
+    Return the layout dict ``d`` as a YAML document (str), in the style
+    of ``Dumper`` with unlimited line width.
+
+    Dicts of scalar keys with scalar, list or dict values, as in the
+    layout files, are formatted directly, which is much faster than
+    going through the PyYAML representer. Anything else falls back to
+    ``yaml.dump``.
+
+    '''
+    lines = []
+    try:
+        _format_mapping(d, '', lines)
+    except _Unsupported:
+        return yaml.dump(d, Dumper=Dumper, default_flow_style=False,
+                allow_unicode=True, width=_WIDTH)
+    lines.append('')
+    return '\n'.join(lines)
+
+def dump(d, filename, sidecar=False):
+    '''
+    Write the layout dict ``d`` to the YAML file ``filename``.
+
+    If ``sidecar`` is True, also write its compiled form next to the
+    YAML file, replacing the compiled forms of earlier versions of the
+    file.
+
+    '''
+    data = dumps(d).encode('utf-8')
+    with open(filename, 'wb') as f:
+        f.write(data)
+    if sidecar:
+        write_sidecar(filename, data, d)
+
+def write_sidecar(filename, data, d):
+    '''
+    Write the compiled form of the layout dict ``d``, read from the YAML
+    file ``filename`` with contents ``data`` (bytes), next to the YAML
+    file, and remove compiled forms of other versions of the file.
+
+    This needs the ``larpixgeometry`` package to be importable; if it is
+    not (e.g. for a script run from the layouts directory), nothing is
+    written and a warning is issued.
+
+    '''
+    try:
+        from larpixgeometry.layouts import compiled
+    except ImportError as e:
+        warnings.warn('Not writing the compiled form of %s: %s'
+                % (filename, e))
+        return
+    directory = os.path.dirname(os.path.abspath(filename))
+    name = compiled.compiled_filename(filename, compiled.source_hash(data))
+    compiled.write_compiled(d, os.path.join(directory, name))
+    base = os.path.splitext(os.path.basename(filename))[0]
+    stale = re.compile(re.escape(base) + r'-[0-9a-f]{16}\.npz$')
+    for other in os.listdir(directory):
+        if other != name and stale.match(other):
+            os.remove(os.path.join(directory, other))
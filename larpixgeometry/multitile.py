@@ -0,0 +1,255 @@
+'''
+Global geometry of a multi-tile LArPix anode.
+
+Reads the YAML files written by ``layouts/multi_tile_layout.py`` and
+builds dense lookup tables so that whole arrays of packet fields
+(io_group, io_channel, chip_id, channel_id) can be turned into detector
+coordinates with a handful of vectorized indexing operations.
+
+Coordinates follow the convention of the multi-tile layout files, where
+``tile_positions`` and ``tile_orientations`` are given in (z, y, x)
+order: the pixel position within the tile (in units of the pixel pitch
+in ``chip_channel_to_position``) is centered on the tile, flipped by the
+tile orientation and shifted by the tile position, and ``z`` is the
+position of the tile's anode plane::
+
+    x = (i * pitch + pitch/2 - tile_width/2) * orientation[2] + position[2]
+    y = (j * pitch + pitch/2 - tile_height/2) * orientation[1] + position[1]
+    z = position[0]
+
+'''
+import numpy as np
+
+from larpixgeometry.packedkeys import (PackedLookup, clip_keys,
+        unpack_chip_channel, unpack_io)
+from larpixgeometry.spatialindex import neighbor_graph
+
+class MultiTileGeometry(object):
+    '''
+    The pixels of a multi-tile anode in global coordinates.
+
+    Like ``PixelPlane``, the geometry is kept in ``columns``, a dict of
+    arrays with one row per connected (tile, chip, channel), ordered by
+    tile, chip and channel. The row number is the dense channel index
+    of a channel in the detector. ``columns`` keys are ``'tile'``,
+    ``'io_group'``, ``'io_channel'``, ``'chipid'``, ``'channel'``,
+    ``'x'``, ``'y'`` and ``'z'``.
+
+    ``chip_channel_to_position`` is kept as a ``PackedLookup`` of the
+    position (in units of the pixel pitch) of each packed
+    ``chip*1000 + channel`` key.
+
+    >>> geometry = MultiTileGeometry.fromDict(load('multi_tile_layout-2.1.16.yaml'))
+    >>> x, y, z = geometry.to_global(packets['io_group'],
+    ...     packets['io_channel'], packets['chip_id'], packets['channel_id'])
+
+    '''
+    def __init__(self):
+        self.pixel_pitch = 0.
+        self.tile_positions = {}
+        self.tile_orientations = {}
+        self.tile_chip_to_io = {}
+        self.chip_channel_to_position = PackedLookup([], np.zeros((0, 2)))
+        self._io_shape = np.zeros(4, dtype=np.uintp)
+        self._block_table = np.zeros((1, 1, 1), dtype=np.intp)
+        self._row_table = np.full((1, 1), -1, dtype=np.intp)
+        self._block_tiles = np.full(1, -1, dtype=np.int64)
+        self._neighbors = {}
+        self._set_columns({key: np.zeros(0, dtype=dtype)
+            for key, dtype in self._COLUMN_DTYPES})
+
+    _COLUMN_DTYPES = (('tile', np.int64), ('io_group', np.int64),
+            ('io_channel', np.int64), ('chipid', np.int64),
+            ('channel', np.int64), ('x', np.float64), ('y', np.float64),
+            ('z', np.float64))
+
+    @classmethod
+    def fromDict(cls, d):
+        '''
+        Create the geometry from the contents of a multi-tile layout
+        file (see ``layouts/multi_tile_layout.py``).
+
+        '''
+        result = cls()
+        pitch = float(d['pixel_pitch'])
+        result.pixel_pitch = pitch
+        result.tile_positions = d['tile_positions']
+        result.tile_orientations = d['tile_orientations']
+        result.tile_chip_to_io = d['tile_chip_to_io']
+
+        # Single-tile channel table, with the position of each channel in
+        # mm from the tile center
+        result.chip_channel_to_position = PackedLookup.fromDict(
+                d['chip_channel_to_position'])
+        keys = result.chip_channel_to_position.keys
+        local = result.chip_channel_to_position.values.reshape(-1, 2) * pitch
+        if len(local):
+            size = local.max(axis=0) - local.min(axis=0) + pitch
+            local = local + pitch/2 - size/2
+        local_chips, local_channels = unpack_chip_channel(keys)
+
+        # Chips of each tile with their (io_group, io_channel)
+        tiles = sorted(result.tile_chip_to_io)
+        io = np.array([(tile, chip, io_code) for tile in tiles
+            for chip, io_code in sorted(result.tile_chip_to_io[tile].items())],
+            dtype=np.int64).reshape(-1, 3)
+        io = np.column_stack((io[:, :2],) + unpack_io(io[:, 2]))
+
+        # One row per (tile chip, channel of that chip), in tile, chip and
+        # channel order
+        chip_start = np.searchsorted(local_chips, io[:, 1], side='left')
+        chip_stop = np.searchsorted(local_chips, io[:, 1], side='right')
+        counts = chip_stop - chip_start
+        io_rows = np.repeat(np.arange(len(io)), counts)
+        local_rows = (np.arange(counts.sum())
+                - np.repeat(np.cumsum(counts) - counts, counts)
+                + np.repeat(chip_start, counts))
+        tile_ids = io[io_rows, 0]
+        position = np.array([result.tile_positions[tile] for tile in tiles],
+                dtype=np.float64).reshape(-1, 3)
+        orientation = np.array([result.tile_orientations[tile]
+            for tile in tiles], dtype=np.float64).reshape(-1, 3)
+        tile_rows = np.searchsorted(tiles, tile_ids)
+        columns = {
+                'tile': tile_ids,
+                'io_group': io[io_rows, 2],
+                'io_channel': io[io_rows, 3],
+                'chipid': local_chips[local_rows],
+                'channel': local_channels[local_rows],
+                'x': (local[local_rows, 0] * orientation[tile_rows, 2]
+                    + position[tile_rows, 2]),
+                'y': (local[local_rows, 1] * orientation[tile_rows, 1]
+                    + position[tile_rows, 1]),
+                'z': position[tile_rows, 0],
+                }
+        result._set_columns(columns)
+
+        # Dense (io_group, io_channel, chip) -> chip block table and
+        # (chip block, channel) -> dense channel index table, each with an
+        # extra trailing slot along every axis which out of range values
+        # are clipped to, and an extra all -1 block for unknown chips
+        shape = tuple(int(io[:, i].max()) + 1 if len(io) else 0
+                for i in (2, 3, 1))
+        n_channels = int(local_channels.max()) + 1 if len(keys) else 0
+        result._io_shape = np.array(shape + (n_channels,), dtype=np.uintp)
+        result._block_table = np.full(tuple(n + 1 for n in shape), len(io),
+                dtype=np.intp)
+        result._block_table[io[:, 2], io[:, 3], io[:, 1]] = np.arange(len(io))
+        result._row_table = np.full((len(io) + 1, n_channels + 1), -1,
+                dtype=np.intp)
+        result._row_table[io_rows, columns['channel']] = np.arange(
+                len(io_rows))
+        result._block_tiles = np.append(io[:, 0], -1)
+        return result
+
+    def _set_columns(self, columns):
+        '''
+        Store ``columns``, each as a view of an array with a trailing
+        sentinel row (-1 or NaN) which a dense channel index of -1
+        resolves to.
+
+        '''
+        self._column_storage = {}
+        for key, dtype in self._COLUMN_DTYPES:
+            storage = np.empty(len(columns[key]) + 1, dtype=dtype)
+            storage[:-1] = columns[key]
+            storage[-1] = np.nan if storage.dtype.kind == 'f' else -1
+            self._column_storage[key] = storage
+        self.columns = {key: value[:-1]
+                for key, value in self._column_storage.items()}
+
+    def _clipped(self, values):
+        '''
+        Return the given (io_group, io_channel, chip[, channel]) arrays
+        as unsigned indices, with negative and out of range values
+        clipped to the trailing slot of the lookup tables.
+
+        '''
+        values = np.broadcast_arrays(*[np.asarray(value) for value in values])
+        return [clip_keys(value, n) for value, n in zip(values,
+            self._io_shape)]
+
+    def _blocks(self, io_group, io_channel, chipid):
+        '''
+        Return the chip block (row of ``_row_table``) of each clipped
+        (io_group, io_channel, chip).
+
+        '''
+        _, n_io_channels, n_chips = self._block_table.shape
+        flat = io_group * n_io_channels
+        flat += io_channel
+        flat *= n_chips
+        flat += chipid
+        return self._block_table.reshape(-1)[flat]
+
+    def channel_index(self, io_group, io_channel, chipid, channel):
+        '''
+        Return the dense channel index (the row in ``columns``) of each
+        (io_group, io_channel, chip, channel), or -1 if the channel is
+        not in the geometry. The arguments may be scalars or arrays and
+        are broadcast against each other.
+
+        '''
+        io_group, io_channel, chipid, channel = self._clipped((io_group,
+            io_channel, chipid, channel))
+        flat = self._blocks(io_group, io_channel, chipid)
+        flat *= self._row_table.shape[1]
+        flat += channel.view(np.intp)
+        return self._row_table.reshape(-1)[flat]
+
+    def to_global(self, io_group, io_channel, chipid, channel):
+        '''
+        Return ``(x, y, z)`` arrays with the detector coordinates of
+        each (io_group, io_channel, chip, channel). Unknown channels
+        give NaN.
+
+        '''
+        rows = self.channel_index(io_group, io_channel, chipid, channel)
+        return (self._column_storage['x'][rows],
+                self._column_storage['y'][rows],
+                self._column_storage['z'][rows])
+
+    def tiles(self, io_group, io_channel, chipid):
+        '''
+        Return the tile ID of each (io_group, io_channel, chip), or -1.
+
+        '''
+        return self._block_tiles[self._blocks(*self._clipped((io_group,
+            io_channel, chipid)))]
+
+    def iter_global(self, chunks):
+        '''
+        Convert an iterable of packet chunks, yielding ``(x, y, z)`` for
+        each chunk.
+
+        Each chunk is either a structured array (or dict of arrays) with
+        ``'io_group'``, ``'io_channel'``, ``'chip_id'`` and
+        ``'channel_id'`` fields, as in the LArPix packet format, or a
+        tuple of those four arrays.
+
+        >>> for x, y, z in geometry.iter_global(packets[i:i + n] for i in range(0, len(packets), n)):
+        ...     ...
+
+        '''
+        for chunk in chunks:
+            if isinstance(chunk, tuple):
+                yield self.to_global(*chunk)
+            else:
+                yield self.to_global(chunk['io_group'], chunk['io_channel'],
+                        chunk['chip_id'], chunk['channel_id'])
+
+    def neighbors(self, connectivity=4):
+        '''
+        Return the 4- or 8-connected neighbors of every channel in the
+        detector as a CSR pair ``(offsets, indices)`` over dense channel
+        indices, including neighbors across chip and tile boundaries.
+        Pixels on different anode planes (different ``z``) are never
+        neighbors. Computed on first use and cached.
+
+        '''
+        if connectivity not in self._neighbors:
+            _, planes = np.unique(self.columns['z'], return_inverse=True)
+            self._neighbors[connectivity] = neighbor_graph(
+                    self.columns['x'], self.columns['y'], connectivity,
+                    pitch=self.pixel_pitch, groups=planes)
+        return self._neighbors[connectivity]
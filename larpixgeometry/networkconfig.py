@@ -0,0 +1,30 @@
+'''
+Reading LArPix network configuration files.
+
+A network configuration is a JSON file listing the chips reachable on
+each IO channel of an IO group: ``{'network': {io_group: {io_channel:
+{'nodes': [{'chip_id': ...}, ...]}}}}``, where nodes with a non-integer
+``chip_id`` (e.g. ``'ext'``) are not chips.
+
+'''
+import json
+
+import numpy as np
+
+def parse_network_config(network_config):
+    '''
+    Return the (io_group, io_channel, chip) of each chip in the network
+    configuration file ``network_config``, as an integer array with one
+    row per chip, in the order of the file. Only the first IO group of
+    the file is read.
+
+    '''
+    with open(network_config, 'r') as nc:
+        nc_json = json.load(nc)
+    io_group = list(nc_json['network'].keys())[0]
+    io_channels = nc_json['network'][io_group]
+    rows = [(int(io_group), int(io_channel), node['chip_id'])
+            for io_channel in io_channels
+            for node in io_channels[io_channel]['nodes']
+            if isinstance(node['chip_id'], int)]
+    return np.array(rows, dtype=np.int64).reshape(-1, 3)
@@ -0,0 +1,270 @@
+'''
+Packed polygon outlines with vectorized geometry queries.
+
+``Outlines`` stores one polygon per item (e.g. the pad outline of each
+pixel of a plane) in CSR form: the vertices of all polygons in one
+``(n, 2)`` array, and the vertices of polygon ``i`` at
+``vertices[offsets[i]:offsets[i + 1]]``. Polygons may be empty (no
+outline), and the closing edge from the last vertex back to the first
+is implied.
+
+>>> pads = Outlines.from_lists([pixel[3] for pixel in d['pixels']])
+>>> rows = pads.locate(hits_x, hits_y)  # polygon containing each point
+>>> areas, (cx, cy) = pads.areas(), pads.centroids()
+
+'''
+import numpy as np
+
+class Outlines(object):
+    '''
+    Polygons in CSR form, see the module docstring.
+
+    ``locate`` finds the polygon containing each of many points through
+    a uniform grid over the polygons' bounding boxes, built on first
+    use, so only the few polygons whose boxes overlap a point's grid
+    cell are tested against it.
+
+    '''
+    # Number of query points processed at once by ``locate``
+    chunk_size = 16384
+
+    def __init__(self, offsets=(0,), vertices=()):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+        self._edges = None
+        self._bounds = None
+        self._grid = None
+
+    @classmethod
+    def from_lists(cls, outlines):
+        '''
+        Create the outlines from a list with one list of ``(x, y)``
+        vertices (possibly empty) per polygon.
+
+        '''
+        offsets = np.zeros(len(outlines) + 1, dtype=np.int64)
+        np.cumsum([len(outline) for outline in outlines], out=offsets[1:])
+        vertices = np.array([vertex for outline in outlines
+            for vertex in outline], dtype=np.float64).reshape(-1, 2)
+        return cls(offsets, vertices)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        '''
+        Return the vertices of polygon ``row`` as a list of ``[x, y]``.
+
+        '''
+        return self.vertices[self.offsets[row]:self.offsets[row + 1]].tolist()
+
+    def tolist(self):
+        vertices = self.vertices.tolist()
+        offsets = self.offsets.tolist()
+        return [vertices[start:stop]
+                for start, stop in zip(offsets[:-1], offsets[1:])]
+
+    def counts(self):
+        '''
+        Return the number of vertices of each polygon.
+
+        '''
+        return np.diff(self.offsets)
+
+    def _edge_table(self):
+        '''
+        Return ``(owner, following)``: the polygon of each vertex and the
+        index of the next vertex around its polygon.
+
+        '''
+        if self._edges is None:
+            counts = self.counts()
+            owner = np.repeat(np.arange(len(self)), counts)
+            following = np.arange(len(self.vertices)) + 1
+            nonempty = counts > 0
+            following[self.offsets[1:][nonempty] - 1] = \
+                    self.offsets[:-1][nonempty]
+            self._edges = (owner, following)
+        return self._edges
+
+    def _cross(self):
+        owner, following = self._edge_table()
+        x, y = self.vertices[:, 0], self.vertices[:, 1]
+        return owner, following, (x * y[following] - x[following] * y)
+
+    def areas(self):
+        '''
+        Return the area of each polygon (0 for empty outlines).
+
+        '''
+        owner, _, cross = self._cross()
+        return np.abs(np.bincount(owner, cross, len(self))) / 2
+
+    def centroids(self):
+        '''
+        Return ``(x, y)`` arrays with the centroid of each polygon, the
+        mean of the vertices for polygons with no area, and NaN for empty
+        outlines.
+
+        '''
+        owner, following, cross = self._cross()
+        x, y = self.vertices[:, 0], self.vertices[:, 1]
+        counts = self.counts()
+        signed = np.bincount(owner, cross, len(self)) / 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cx = (np.bincount(owner, (x + x[following]) * cross, len(self))
+                    / (6 * signed))
+            cy = (np.bincount(owner, (y + y[following]) * cross, len(self))
+                    / (6 * signed))
+            mean_x = np.bincount(owner, x, len(self)) / counts
+            mean_y = np.bincount(owner, y, len(self)) / counts
+        flat = signed == 0
+        cx[flat] = mean_x[flat]
+        cy[flat] = mean_y[flat]
+        return cx, cy
+
+    def bounds(self):
+        '''
+        Return the bounding box of each polygon as an ``(n, 4)`` array of
+        ``(xmin, xmax, ymin, ymax)``, NaN for empty outlines.
+
+        '''
+        if self._bounds is None:
+            bounds = np.full((len(self), 4), np.nan)
+            nonempty = np.flatnonzero(self.counts() > 0)
+            if len(nonempty):
+                starts = self.offsets[nonempty]
+                for i, (axis, reduce) in enumerate(((0, np.minimum),
+                        (0, np.maximum), (1, np.minimum), (1, np.maximum))):
+                    bounds[nonempty, i] = reduce.reduceat(
+                            self.vertices[:, axis], starts)
+            self._bounds = bounds
+        return self._bounds
+
+    def contains(self, rows, x, y):
+        '''
+        Return whether each point ``(x, y)`` is inside the polygon
+        ``rows`` (False for rows of -1 and empty outlines). ``rows``,
+        ``x`` and ``y`` are broadcast against each other.
+
+        '''
+        rows, x, y = np.broadcast_arrays(np.asarray(rows, dtype=np.int64),
+                np.asarray(x, dtype=np.float64),
+                np.asarray(y, dtype=np.float64))
+        shape = rows.shape
+        rows, x, y = rows.reshape(-1), x.reshape(-1), y.reshape(-1)
+        inside = np.zeros(len(rows), dtype=bool)
+        valid = np.flatnonzero((rows >= 0) & (rows < len(self)))
+        inside[valid] = self._inside(rows[valid], x[valid], y[valid])
+        return inside.reshape(shape)
+
+    def _inside(self, rows, x, y):
+        '''
+        Crossing-number test of each point against its polygon, over all
+        the (point, edge) pairs at once.
+
+        '''
+        _, following = self._edge_table()
+        counts = self.counts()[rows]
+        pair = np.repeat(np.arange(len(rows)), counts)
+        vertex = (np.arange(counts.sum())
+                - np.repeat(np.cumsum(counts) - counts, counts)
+                + np.repeat(self.offsets[rows], counts))
+        x1, y1 = self.vertices[vertex, 0], self.vertices[vertex, 1]
+        x2 = self.vertices[following[vertex], 0]
+        y2 = self.vertices[following[vertex], 1]
+        px, py = x[pair], y[pair]
+        straddles = (y1 > py) != (y2 > py)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            crossing = straddles & (px < (x2 - x1) * (py - y1) / (y2 - y1) + x1)
+        return np.bincount(pair, crossing, len(rows)) % 2 == 1
+
+    def _build_grid(self):
+        '''
+        Build the uniform grid over the bounding boxes: a padded table
+        of the polygons overlapping each cell, with a trailing empty row
+        for points off the grid.
+
+        '''
+        bounds = self.bounds()
+        polygons = np.flatnonzero(self.counts() > 0)
+        grid = {'table': np.full((1, 1), -1, dtype=np.int64), 'nx': 0,
+                'ny': 0, 'x0': 0., 'y0': 0., 'cell_size': 1.}
+        if len(polygons):
+            boxes = bounds[polygons]
+            x0, y0 = boxes[:, 0].min(), boxes[:, 2].min()
+            extent = max(boxes[:, 1].max() - x0, boxes[:, 3].max() - y0)
+            sizes = np.maximum(boxes[:, 1] - boxes[:, 0],
+                    boxes[:, 3] - boxes[:, 2])
+            cell_size = float(np.median(sizes))
+            if cell_size <= 0:
+                cell_size = extent / np.sqrt(len(polygons)) if extent else 1.
+            nx = int((boxes[:, 1].max() - x0) // cell_size) + 1
+            ny = int((boxes[:, 3].max() - y0) // cell_size) + 1
+            ix0 = ((boxes[:, 0] - x0) // cell_size).astype(np.int64)
+            ix1 = ((boxes[:, 1] - x0) // cell_size).astype(np.int64)
+            iy0 = ((boxes[:, 2] - y0) // cell_size).astype(np.int64)
+            iy1 = ((boxes[:, 3] - y0) // cell_size).astype(np.int64)
+            # One (cell, polygon) entry per cell overlapped by each box
+            width, height = ix1 - ix0 + 1, iy1 - iy0 + 1
+            n_cells = width * height
+            polygon = np.repeat(np.arange(len(polygons)), n_cells)
+            k = (np.arange(n_cells.sum())
+                    - np.repeat(np.cumsum(n_cells) - n_cells, n_cells))
+            cells = ((iy0[polygon] + k // width[polygon]) * nx
+                    + ix0[polygon] + k % width[polygon])
+            order = np.lexsort((polygon, cells))
+            cells, polygon = cells[order], polygons[polygon[order]]
+            starts = np.searchsorted(cells, np.arange(nx * ny + 1))
+            rank = np.arange(len(cells)) - starts[cells]
+            table = np.full((nx * ny + 1, int(np.diff(starts).max())), -1,
+                    dtype=np.int64)
+            table[cells, rank] = polygon
+            grid = {'table': table, 'nx': nx, 'ny': ny, 'x0': float(x0),
+                    'y0': float(y0), 'cell_size': cell_size}
+        self._grid = grid
+        return grid
+
+    def locate(self, x, y):
+        '''
+        Return the index of the polygon containing each point ``(x,
+        y)``, or -1 if there is none. If polygons overlap, the one with
+        the lowest index is returned.
+
+        '''
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=np.float64),
+                np.asarray(y, dtype=np.float64))
+        shape = x.shape
+        x, y = x.reshape(-1), y.reshape(-1)
+        result = np.full(len(x), -1, dtype=np.int64)
+        for start in range(0, len(x), self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+            result[chunk] = self._locate(x[chunk], y[chunk])
+        return result.reshape(shape)
+
+    def _locate(self, x, y):
+        grid = self._grid if self._grid is not None else self._build_grid()
+        table = grid['table']
+        with np.errstate(invalid='ignore'):
+            ix = np.floor((x - grid['x0']) / grid['cell_size'])
+            iy = np.floor((y - grid['y0']) / grid['cell_size'])
+            on_grid = ((ix >= 0) & (ix < grid['nx'])
+                    & (iy >= 0) & (iy < grid['ny']))
+        cells = np.where(on_grid, np.where(on_grid, iy, 0) * grid['nx']
+                + np.where(on_grid, ix, 0), len(table) - 1).astype(np.int64)
+        candidates = table[cells]
+        point, column = np.nonzero(candidates >= 0)
+        rows = candidates[point, column]
+        bounds = self.bounds()[rows]
+        px, py = x[point], y[point]
+        in_box = ((px >= bounds[:, 0]) & (px <= bounds[:, 1])
+                & (py >= bounds[:, 2]) & (py <= bounds[:, 3]))
+        point, rows = point[in_box], rows[in_box]
+        inside = self._inside(rows, x[point], y[point])
+        point, rows = point[inside], rows[inside]
+        result = np.full(len(x), -1, dtype=np.int64)
+        # Candidates are sorted by polygon within a cell, so the first
+        # hit of each point is the lowest polygon index
+        first = np.unique(point, return_index=True)[1]
+        result[point[first]] = rows[first]
+        return result
@@ -0,0 +1,133 @@
+'''
+Dense lookup tables for packed integer keys.
+
+The multi-tile layout files key their tables by packed integers,
+``chip*1000 + channel`` in ``chip_channel_to_position`` and
+``io_group*1000 + io_channel`` in the values of ``tile_chip_to_io``.
+``PackedLookup`` turns such a sparse table into an offset array indexed
+directly by the packed key, so a whole array of keys is resolved with a
+single fancy-indexing operation instead of one dict probe per key.
+
+>>> positions = PackedLookup.fromDict(d['chip_channel_to_position'])
+>>> ij = positions[pack_chip_channel(chipids, channels)]
+
+'''
+import numpy as np
+
+# Multiplier of the major field of the packed keys
+PACKING = 1000
+
+def pack_chip_channel(chipid, channel):
+    '''
+    Return the packed ``chip*1000 + channel`` key.
+
+    '''
+    return np.asarray(chipid, dtype=np.int64) * PACKING + channel
+
+def unpack_chip_channel(key):
+    '''
+    Return ``(chipid, channel)`` from packed ``chip*1000 + channel`` keys.
+
+    '''
+    return np.divmod(np.asarray(key, dtype=np.int64), PACKING)
+
+def pack_io(io_group, io_channel):
+    '''
+    Return the packed ``io_group*1000 + io_channel`` key.
+
+    '''
+    return np.asarray(io_group, dtype=np.int64) * PACKING + io_channel
+
+def unpack_io(key):
+    '''
+    Return ``(io_group, io_channel)`` from packed ``io_group*1000 +
+    io_channel`` keys.
+
+    '''
+    return np.divmod(np.asarray(key, dtype=np.int64), PACKING)
+
+def clip_keys(keys, size):
+    '''
+    Return ``keys`` as unsigned indices, with negative keys and keys of
+    at least ``size`` clipped to ``size``. Tables with a trailing
+    sentinel entry at ``size`` can then be indexed without a mask.
+
+    '''
+    keys = np.asarray(keys).astype(np.intp, copy=False)
+    return np.minimum(keys.view(np.uintp), size)
+
+class PackedLookup(object):
+    '''
+    A table of ``values`` keyed by the non-negative integers ``keys``,
+    stored as a dense offset array.
+
+    ``offsets[key]`` is the row of ``key`` in ``keys`` and ``values``, or
+    -1 if there is no such key, and ``table[key]`` is the value of
+    ``key``, or ``fill``. Both have a trailing sentinel entry which
+    negative and too large keys are clipped to. ``keys`` are sorted, and
+    ``values`` has one row per key.
+
+    '''
+    def __init__(self, keys, values=None, fill=-1):
+        keys = np.asarray(keys, dtype=np.int64).reshape(-1)
+        if values is None:
+            values = np.arange(len(keys))
+        values = np.asarray(values)
+        if len(keys) and keys.min() < 0:
+            raise ValueError('Packed keys must be non-negative')
+        if len(np.unique(keys)) != len(keys):
+            raise ValueError('Duplicate packed keys')
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        size = int(self.keys[-1]) + 1 if len(keys) else 0
+        # The row -1 resolves to the trailing fill entry of storage
+        self.offsets = np.full(size + 1, -1, dtype=np.intp)
+        self.offsets[self.keys] = np.arange(len(keys))
+        storage = np.empty((len(keys) + 1,) + values.shape[1:],
+                dtype=np.result_type(values, np.min_scalar_type(fill)))
+        storage[:-1] = values[order]
+        storage[-1] = fill
+        self.values = storage[:-1]
+        self.table = storage[self.offsets]
+        self.fill = fill
+
+    @classmethod
+    def fromDict(cls, d, fill=-1):
+        '''
+        Create the table from a dict of packed keys to numbers or
+        equal-length lists of numbers.
+
+        '''
+        return cls(list(d.keys()), list(d.values()), fill)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def rows(self, keys):
+        '''
+        Return the row in ``keys`` and ``values`` of each of the given
+        packed keys, or -1 if missing.
+
+        '''
+        return self.offsets[clip_keys(keys, len(self.offsets) - 1)]
+
+    def contains(self, keys):
+        '''
+        Return whether each of the given packed keys is in the table.
+
+        '''
+        return self.rows(keys) >= 0
+
+    def __getitem__(self, keys):
+        '''
+        Return the value of each of the given packed keys, or ``fill``.
+
+        '''
+        return self.table[clip_keys(keys, len(self.table) - 1)]
+
+    def toDict(self):
+        '''
+        Return the table as a dict of packed keys to values.
+
+        '''
+        return dict(zip(self.keys.tolist(), self.values.tolist()))
@@ -2,20 +2,136 @@
 Geometry of the LArPix pixel plane.
 
 '''
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import types
+
+import numpy as np
+
+from larpixgeometry import flatfile, instrumentation
+from larpixgeometry.layouts import find, load
+from larpixgeometry.outlines import Outlines
+from larpixgeometry.packedkeys import clip_keys
+from larpixgeometry.spatialindex import GridIndex, neighbor_graph
 
 class PixelPlane(object):
     '''
     The pixel plane for LArPix including pixel pads and LArPix chips.
 
+    The geometry is stored in flat NumPy arrays. ``pixels`` is a
+    read-only mapping from pixel ID to ``Pixel`` which only creates a
+    ``Pixel`` object when one is asked for (and then keeps it, so
+    repeated lookups return the same object). Similarly, a
+    ``GeomChip`` only builds its ``channel_connections`` list on first
+    access. For the 2.4.0 layout (4900 pixels, 6400 channels) this
+    takes ``fromDict`` from about 250 bytes per pixel for the
+    object-per-pixel representation to about 117 bytes per pixel
+    including the ``columns`` below (measured with ``tracemalloc``), as
+    long as no ``Pixel`` objects are requested.
+
+    Besides ``pixels`` and ``chips``, the plane keeps a columnar view of
+    its channels in ``columns``: a dict of contiguous arrays with one
+    row per (chip, channel), in the order of ``chips`` and then channel
+    number. The row number is the "dense channel index" of a channel
+    (see ``channel_index``), and the batch methods such as
+    ``channels_to_xy`` resolve whole NumPy arrays of chip IDs and
+    channels against these columns in one vectorized call.
+
+    ``columns`` keys:
+
+    - ``'chipid'``, ``'channel'``: the electronics address of the row
+    - ``'pixelid'``: the connected pixel ID, or -1 if unconnected
+    - ``'x'``, ``'y'``: the pixel position, or NaN if unconnected
+    - ``'connected'``: False for channels assigned to
+      ``unconnected_pixel``
+
+    A plane can be saved with ``toFile`` and opened again with
+    ``fromFile``, which memory-maps the file read-only so that many
+    processes can share one copy of the geometry.
+
+    ``freeze`` makes a plane read-only so that it can be shared between
+    threads; ``get_pixel_plane`` returns such shared planes.
+
     '''
+    # Arrays (attribute names without the leading underscore) written by
+    # toFile in addition to the columns and the outlines
+    _FILE_ARRAYS = ('pixel_ids', 'pixel_x', 'pixel_y', 'pixel_rows',
+            'pixel_channels', 'channel_pixels', 'chip_offsets',
+            'channel_rows')
+
     def __init__(self):
-        self.pixels = {}
         self.chips = {}
         self.dimensions = {'x': 0, 'y': 0, 'width': 0, 'height': 0}
-        self.unconnected_pixel = Pixel()
-        self.unconnected_pixel.channel_connection = []
+        self.unconnected_pixel = _UnconnectedPixel(self)
+        self._pixel_ids = np.zeros(0, dtype=np.int64)
+        self._pixel_x = np.zeros(0, dtype=np.float64)
+        self._pixel_y = np.zeros(0, dtype=np.float64)
+        # Pad and focus outline of each pixel row
+        self._pad_outlines = Outlines()
+        self._focus_outlines = Outlines()
+        # Dense pixel ID -> pixel row table, -1 for unknown pixel IDs
+        self._pixel_rows = np.full(1, -1, dtype=np.int32)
+        # Pixel row -> dense channel index, -1 for unconnected pixels
+        self._pixel_channels = np.zeros(0, dtype=np.int32)
+        self.pixels = PixelMap(self)
+        self._spatial_index = None
+        self._lattice = False
+        self._neighbors = {}
+        self._pixel_addresses = None
+        self._mask_columns = None
+        self._masks = {}
+        self._frozen = False
+        self._build_columns(np.zeros(0, dtype=np.int64),
+                np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32))
+
+    def __setattr__(self, name, value):
+        if not name.startswith('_') and getattr(self, '_frozen', False):
+            raise AttributeError('Cannot set %s of a frozen PixelPlane' % name)
+        super(PixelPlane, self).__setattr__(name, value)
+
+    def freeze(self):
+        '''
+        Make the plane read-only and return it.
+
+        All of the plane's arrays (including ``columns``) become
+        read-only, and ``chips`` and ``dimensions`` become read-only
+        mappings. The ``Pixel`` and ``GeomChip`` objects handed out by a
+        frozen plane are shared by all of its users, so they are
+        read-only too: setting their attributes raises
+        ``AttributeError``, and their outlines, ``channel_connections``
+        and the ``channel_connection`` list of ``unconnected_pixel`` are
+        tuples. Objects handed out before ``freeze`` are dropped from
+        the plane and stay mutable. The lazily built parts of the plane
+        (``Pixel`` objects, the spatial index, the neighbor graphs) are
+        still built on first use, which is safe to do from several
+        threads.
+
+        '''
+        self.pixels._cache.clear()
+        for chip in self.chips.values():
+            chip._channel_connections = None
+            chip._frozen = True
+        self.unconnected_pixel._channel_connection = None
+        self.unconnected_pixel._frozen = True
+        for value in list(self.__dict__.values()) + list(
+                self._column_storage.values()) + list(self.columns.values()) + [
+                self._pad_outlines.offsets, self._pad_outlines.vertices,
+                self._focus_outlines.offsets, self._focus_outlines.vertices]:
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+        self.__dict__['chips'] = types.MappingProxyType(self.chips)
+        self.__dict__['dimensions'] = types.MappingProxyType(self.dimensions)
+        self._frozen = True
+        return self
 
     @classmethod
+    @instrumentation.instrumented('from_dict')
     def fromDict(cls, d):
         '''
         Create a new pixel plane using the data in the dict.
@@ -31,41 +147,527 @@ class PixelPlane(object):
         vertices. If there is no focusing grid, pass an empty list for
         the focus vertices.
 
+        With instrumentation on (see ``larpixgeometry.instrumentation``),
+        the ``pixels_created``, ``chips_created`` and
+        ``unconnected_channels`` counters are recorded.
+
         '''
         result = cls()
-        for i, (pixelid, x, y, pad_outline, focus_outline) in enumerate(d['pixels']):
-            pixel = Pixel()
-            pixel.pixelid = pixelid
-            pixel.x = x
-            pixel.y = y
-            pixel.pad_outline = pad_outline
-            pixel.focus_outline = focus_outline
-            result.pixels[pixelid] = pixel
-        for i, (chipid, channel_connections) in enumerate(d['chips']):
+        pixels = d['pixels']
+        result._pixel_ids = np.array([pixel[0] for pixel in pixels],
+                dtype=np.int64)
+        result._pixel_x = np.array([pixel[1] for pixel in pixels],
+                dtype=np.float64)
+        result._pixel_y = np.array([pixel[2] for pixel in pixels],
+                dtype=np.float64)
+        result._pad_outlines = Outlines.from_lists(
+                [pixel[3] for pixel in pixels])
+        result._focus_outlines = Outlines.from_lists(
+                [pixel[4] for pixel in pixels])
+        n_pixelids = int(result._pixel_ids.max()) + 1 if len(pixels) else 1
+        result._pixel_rows = np.full(n_pixelids, -1, dtype=np.int32)
+        result._pixel_rows[result._pixel_ids] = np.arange(len(pixels))
+        chipids = np.array([chipid for chipid, _ in d['chips']],
+                dtype=np.int64)
+        n_channels = np.array([len(connections)
+            for _, connections in d['chips']], dtype=np.int64)
+        channel_pixelids = np.array([-1 if pixelid is None else pixelid
+            for _, connections in d['chips'] for pixelid in connections],
+            dtype=np.int64)
+        unknown = (channel_pixelids >= n_pixelids) | (channel_pixelids < -1)
+        if np.any(unknown):
+            raise KeyError(int(channel_pixelids[unknown][0]))
+        channel_pixels = np.where(channel_pixelids >= 0,
+                result._pixel_rows[channel_pixelids], -1).astype(np.int32)
+        if np.any(channel_pixels[channel_pixelids >= 0] < 0):
+            raise KeyError(int(channel_pixelids[(channel_pixelids >= 0)
+                & (channel_pixels < 0)][0]))
+        for chipid in chipids:
             chip = GeomChip()
-            chip.chipid = chipid
-            for channel, pixelid in enumerate(channel_connections):
-                if pixelid == None:
-                    chip.channel_connections.append(result.unconnected_pixel)
-                    result.unconnected_pixel.channel_connection.append((chip,
-                        channel))
-                else:
-                    chip.channel_connections.append(result.pixels[pixelid])
-                    result.pixels[pixelid].channel_connection = (chip, channel)
-            result.chips[chipid] = chip
+            chip.chipid = int(chipid)
+            chip._plane = result
+            chip._channel_connections = None
+            result.chips[chip.chipid] = chip
+        with instrumentation.stage('from_dict.columns'):
+            result._build_columns(chipids, n_channels, channel_pixels)
+        recorder = instrumentation.current()
+        if recorder is not None:
+            recorder.count('pixels_created', len(pixels))
+            recorder.count('chips_created', len(chipids))
+            recorder.count('unconnected_channels',
+                    int(np.count_nonzero(channel_pixels < 0)))
         result.dimensions['x'] = d['x']
         result.dimensions['y'] = d['y']
         result.dimensions['width'] = d['width']
         result.dimensions['height'] = d['height']
         return result
 
+    def toFile(self, filename):
+        '''
+        Write the plane to a flat binary file which ``fromFile`` can
+        memory-map.
+
+        >>> PixelPlane.fromDict(load('layout-2.4.0.yaml')).toFile('layout-2.4.0.lpg')
+
+        '''
+        arrays = {name: getattr(self, '_' + name)
+                for name in self._FILE_ARRAYS}
+        arrays.update(('column_' + key, value)
+                for key, value in self._column_storage.items())
+        for name, outlines in (('pad', self._pad_outlines),
+                ('focus', self._focus_outlines)):
+            arrays[name + '_offsets'] = outlines.offsets
+            arrays[name + '_vertices'] = outlines.vertices
+        chipids = np.array(list(self.chips), dtype=np.int64)
+        arrays['chipids'] = chipids
+        flatfile.write_arrays(filename, arrays,
+                {'dimensions': self.dimensions})
+
+    @classmethod
+    def fromFile(cls, filename):
+        '''
+        Open a plane written by ``toFile``.
+
+        The file is memory-mapped read-only and the plane's arrays point
+        straight into the mapping, so opening costs about the same
+        regardless of the size of the layout, and processes which open
+        the same file share one copy of the geometry through the OS page
+        cache. ``Pixel`` objects are still created on demand in each
+        process.
+
+        '''
+        arrays, meta = flatfile.map_arrays(filename)
+        result = cls()
+        for name in cls._FILE_ARRAYS:
+            setattr(result, '_' + name, arrays[name])
+        result._column_storage = {key: arrays['column_' + key]
+                for key in result._column_storage}
+        result.columns = {key: value[:-1]
+                for key, value in result._column_storage.items()}
+        for name in ('pad', 'focus'):
+            setattr(result, '_%s_outlines' % name, Outlines(
+                arrays[name + '_offsets'], arrays[name + '_vertices']))
+        chipids = arrays['chipids'].tolist()
+        result._chip_rows = dict(zip(chipids, range(len(chipids))))
+        for chipid in chipids:
+            chip = GeomChip()
+            chip.chipid = chipid
+            chip._plane = result
+            chip._channel_connections = None
+            result.chips[chipid] = chip
+        result.dimensions.update(meta['dimensions'])
+        return result
+
+    def _build_columns(self, chipids, n_channels, channel_pixels):
+        '''
+        Build ``columns`` and the lookup tables from the chip IDs, the
+        number of channels of each chip and the pixel row of each
+        channel (-1 if unconnected).
+
+        Each column is a view of an array with one extra trailing
+        "sentinel" row (unconnected, NaN position), so that a dense
+        channel index of -1 resolves to the sentinel with a plain
+        fancy-indexing operation.
+
+        '''
+        n_rows = len(channel_pixels)
+        connected = np.zeros(n_rows + 1, dtype=bool)
+        connected[:-1] = channel_pixels >= 0
+        pixel_rows = channel_pixels[connected[:-1]]
+        pixelids = np.full(n_rows + 1, -1, dtype=np.int64)
+        pixelids[:-1][connected[:-1]] = self._pixel_ids[pixel_rows]
+        x = np.full(n_rows + 1, np.nan)
+        x[:-1][connected[:-1]] = self._pixel_x[pixel_rows]
+        y = np.full(n_rows + 1, np.nan)
+        y[:-1][connected[:-1]] = self._pixel_y[pixel_rows]
+        chip_offsets = np.zeros(len(chipids) + 1, dtype=np.int64)
+        np.cumsum(n_channels, out=chip_offsets[1:])
+        row_chipids = np.full(n_rows + 1, -1, dtype=np.int64)
+        row_chipids[:-1] = np.repeat(chipids, n_channels)
+        row_channels = np.full(n_rows + 1, -1, dtype=np.int64)
+        row_channels[:-1] = (np.arange(n_rows)
+                - np.repeat(chip_offsets[:-1], n_channels))
+        self._chip_offsets = chip_offsets
+        self._chip_rows = dict(zip(chipids.tolist(), range(len(chipids))))
+        self._channel_pixels = channel_pixels
+        self._column_storage = {
+                'pixelid': pixelids,
+                'x': x,
+                'y': y,
+                'chipid': row_chipids,
+                'channel': row_channels,
+                'connected': connected,
+                }
+        self.columns = {key: value[:-1]
+                for key, value in self._column_storage.items()}
+        # Dense (chipid, channel) -> row table, -1 for unknown channels
+        table_shape = (int(chipids.max()) + 1 if len(chipids) else 1,
+                int(n_channels.max()) if len(n_channels) else 1)
+        self._channel_rows = np.full(table_shape, -1, dtype=np.int32)
+        self._channel_rows[row_chipids[:-1], row_channels[:-1]] = \
+                np.arange(n_rows)
+        self._pixel_channels = np.full(len(self._pixel_ids), -1,
+                dtype=np.int32)
+        self._pixel_channels[pixel_rows] = np.nonzero(connected[:-1])[0]
+
+    def _pixel(self, row):
+        '''
+        Create the ``Pixel`` object for the given pixel row.
+
+        '''
+        pixel = Pixel()
+        pixel.pixelid = int(self._pixel_ids[row])
+        pixel.x = float(self._pixel_x[row])
+        pixel.y = float(self._pixel_y[row])
+        pixel.pad_outline = self._pad_outlines[row]
+        pixel.focus_outline = self._focus_outlines[row]
+        channel_row = self._pixel_channels[row]
+        if channel_row >= 0:
+            pixel.channel_connection = (
+                    self.chips[int(self.columns['chipid'][channel_row])],
+                    int(self.columns['channel'][channel_row]))
+        if self._frozen:
+            pixel.pad_outline = _frozen_outline(pixel.pad_outline)
+            pixel.focus_outline = _frozen_outline(pixel.focus_outline)
+            pixel._frozen = True
+        return pixel
+
+    def _chip_connections(self, chip):
+        '''
+        Create the ``channel_connections`` list of the given chip.
+
+        '''
+        chip_row = self._chip_rows[chip.chipid]
+        start, stop = self._chip_offsets[chip_row:chip_row + 2]
+        connections = [self.unconnected_pixel if row < 0
+                else self.pixels._materialize(row)
+                for row in self._channel_pixels[start:stop]]
+        return tuple(connections) if self._frozen else connections
+
+    def channel_index(self, chipids, channels):
+        '''
+        Return the dense channel index (the row in ``columns``) of each
+        (chip, channel) pair, or -1 if the chip or channel is not on
+        this plane.
+
+        ``chipids`` and ``channels`` may be scalars or array-like, and
+        are broadcast against each other.
+
+        >>> rows = pixelplane.channel_index(packets['chip_id'], packets['channel_id'])
+
+        '''
+        chipids = np.asarray(chipids, dtype=np.int64)
+        channels = np.asarray(channels, dtype=np.int64)
+        n_chipids, n_channels = self._channel_rows.shape
+        valid = ((chipids >= 0) & (chipids < n_chipids)
+                & (channels >= 0) & (channels < n_channels))
+        if np.all(valid):
+            return self._channel_rows[chipids, channels]
+        rows = self._channel_rows[np.where(valid, chipids, 0),
+                np.where(valid, channels, 0)]
+        return np.where(valid, rows, -1)
+
+    def channels_to_xy(self, chipids, channels):
+        '''
+        Return ``(x, y)`` arrays with the pixel position of each
+        (chip, channel) pair.
+
+        Unconnected channels (those assigned to ``unconnected_pixel``)
+        and unknown chips or channels come back as NaN. Use
+        ``channels_connected`` for the equivalent boolean mask.
+
+        >>> x, y = pixelplane.channels_to_xy(packets['chip_id'], packets['channel_id'])
+
+        '''
+        rows = self.channel_index(chipids, channels)
+        return (self._column_storage['x'][rows],
+                self._column_storage['y'][rows])
+
+    def channels_connected(self, chipids, channels):
+        '''
+        Return a boolean array which is True where the (chip, channel)
+        pair is on this plane and connected to a pixel.
+
+        '''
+        rows = self.channel_index(chipids, channels)
+        return self._column_storage['connected'][rows]
+
+    @property
+    def spatial_index(self):
+        '''
+        The ``GridIndex`` over the pixel positions, built on first use.
+        Its indices are pixel rows (positions in the layout's pixel
+        list).
+
+        '''
+        if self._spatial_index is None:
+            self._spatial_index = GridIndex(self._pixel_x, self._pixel_y)
+        return self._spatial_index
+
+    def _pixel_rows_to_channels(self, rows):
+        '''
+        Return ``(chipids, channels)`` for the given pixel rows, with -1
+        for unconnected pixels and for rows of -1.
+
+        '''
+        if len(self._pixel_channels):
+            channel_rows = np.where(rows >= 0,
+                    self._pixel_channels[np.maximum(rows, 0)], -1)
+        else:
+            channel_rows = np.full(np.shape(rows), -1)
+        return (self._column_storage['chipid'][channel_rows],
+                self._column_storage['channel'][channel_rows])
+
+    def _addresses(self):
+        '''
+        Return the pixel ID -> chip ID and pixel ID -> channel arrays,
+        each with a trailing -1 sentinel entry, built on first use.
+
+        '''
+        if self._pixel_addresses is None:
+            pixel_rows = self._pixel_rows
+            channel_rows = np.full(len(pixel_rows) + 1, -1, dtype=np.int64)
+            known = pixel_rows >= 0
+            channel_rows[:-1][known] = self._pixel_channels[pixel_rows[known]]
+            addresses = (self._column_storage['chipid'][channel_rows],
+                    self._column_storage['channel'][channel_rows])
+            for array in addresses:
+                array.flags.writeable = False
+            self._pixel_addresses = addresses
+        return self._pixel_addresses
+
+    @property
+    def pixel_to_chipid(self):
+        '''
+        Read-only array of the chip ID connected to each pixel, indexed
+        by pixel ID, with -1 for unconnected and unused pixel IDs.
+
+        '''
+        return self._addresses()[0][:-1]
+
+    @property
+    def pixel_to_channel(self):
+        '''
+        Read-only array of the channel connected to each pixel, indexed
+        by pixel ID, with -1 for unconnected and unused pixel IDs.
+
+        '''
+        return self._addresses()[1][:-1]
+
+    def pixels_to_channels(self, pixelids):
+        '''
+        Return ``(chipids, channels)`` arrays with the electronics
+        address of each pixel ID, with -1 for unconnected and unknown
+        pixels.
+
+        >>> chipids, channels = pixelplane.pixels_to_channels(hits['pixel_id'])
+
+        '''
+        chipids, channels = self._addresses()
+        keys = clip_keys(pixelids, len(chipids) - 1)
+        return chipids[keys], channels[keys]
+
+    def nearest_pixel(self, x, y):
+        '''
+        Return ``(chipids, channels)`` of the pixel nearest to each
+        point. ``x`` and ``y`` may be scalars or arrays and are broadcast
+        against each other.
+
+        If the nearest pixel is not connected to a channel, or the point
+        has a NaN coordinate, the chip ID and channel are -1.
+
+        >>> chipids, channels = pixelplane.nearest_pixel(hits_x, hits_y)
+
+        '''
+        rows, _ = self.spatial_index.nearest(x, y)
+        return self._pixel_rows_to_channels(rows)
+
+    def pixels_in_box(self, xmin, xmax, ymin, ymax):
+        '''
+        Return ``(chipids, channels)`` of the connected pixels with
+        ``xmin <= x <= xmax`` and ``ymin <= y <= ymax``.
+
+        '''
+        rows = self.spatial_index.query_box(xmin, xmax, ymin, ymax)
+        chipids, channels = self._pixel_rows_to_channels(rows)
+        connected = chipids >= 0
+        return chipids[connected], channels[connected]
+
+    def pixels_within_radius(self, x, y, radius):
+        '''
+        Return ``(chipids, channels)`` of the connected pixels within
+        ``radius`` of ``(x, y)``.
+
+        '''
+        rows = self.spatial_index.query_radius(x, y, radius)
+        chipids, channels = self._pixel_rows_to_channels(rows)
+        connected = chipids >= 0
+        return chipids[connected], channels[connected]
+
+    @property
+    def lattice(self):
+        '''
+        The regular grid the pixels sit on, as a dict with keys ``'x0'``,
+        ``'y0'`` (the position of lattice site (0, 0)), ``'pitch_x'``,
+        ``'pitch_y'`` and ``'table'`` (a 2D array indexed by ``[iy,
+        ix]`` giving the pixel row at each site, or -1), or None if the
+        pixels are not on a regular grid (e.g. the triangle grids of
+        ``pixels_triangle_grid``). Computed on first use.
+
+        '''
+        if self._lattice is False:
+            lattice = _find_lattice(self._pixel_x, self._pixel_y)
+            if lattice is not None:
+                lattice['table'].flags.writeable = False
+            self._lattice = lattice
+        return self._lattice
+
+    def assign_points(self, points, max_distance=None):
+        '''
+        Return ``(pixelids, chipids, channels)`` of the pixel which
+        collects each point of the N x 2 array ``points``.
+
+        If the pixels are on a regular grid (see ``lattice``), each point
+        is binned with plain arithmetic into the pitch x pitch cell
+        around a pixel center, and points which do not fall into any
+        pixel's cell get -1. Otherwise the nearest pixel is used (from
+        ``spatial_index``), optionally only within ``max_distance``.
+        The chip ID and channel are also -1 for pixels which are not
+        connected to a channel.
+
+        >>> pixelids, chipids, channels = pixelplane.assign_points(electrons[:, :2])
+
+        '''
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        x, y = points[:, 0], points[:, 1]
+        lattice = self.lattice
+        if lattice is not None:
+            table = lattice['table']
+            ix = np.floor((x - lattice['x0']) / lattice['pitch_x'] + 0.5)
+            iy = np.floor((y - lattice['y0']) / lattice['pitch_y'] + 0.5)
+            inside = ((ix >= 0) & (ix < table.shape[1])
+                    & (iy >= 0) & (iy < table.shape[0]))
+            rows = np.where(inside, table[np.where(inside, iy, 0).astype(int),
+                np.where(inside, ix, 0).astype(int)], -1)
+        else:
+            rows, distances = self.spatial_index.nearest(x, y)
+            if max_distance is not None:
+                rows = np.where(distances <= max_distance, rows, -1)
+        if len(self._pixel_ids):
+            pixelids = np.where(rows >= 0,
+                    self._pixel_ids[np.maximum(rows, 0)], -1)
+        else:
+            pixelids = np.full(len(rows), -1, dtype=np.int64)
+        chipids, channels = self._pixel_rows_to_channels(rows)
+        return pixelids, chipids, channels
+
+    @property
+    def pad_outlines(self):
+        '''
+        The pad outline of each pixel as ``Outlines`` (see
+        ``larpixgeometry.outlines``), indexed by pixel row (position in
+        the layout's pixel list), e.g. for ``pad_outlines.areas()`` and
+        ``pad_outlines.centroids()``.
+
+        '''
+        return self._pad_outlines
+
+    @property
+    def focus_outlines(self):
+        '''
+        The focusing grid outline of each pixel as ``Outlines``, indexed
+        by pixel row.
+
+        '''
+        return self._focus_outlines
+
+    def pixels_containing(self, x, y, outline='pad'):
+        '''
+        Return ``(pixelids, chipids, channels)`` of the pixel whose pad
+        outline (or focus outline, if ``outline`` is ``'focus'``)
+        contains each point, with -1 for points outside every outline
+        and for pixels which are not connected to a channel.
+
+        >>> pixelids, chipids, channels = pixelplane.pixels_containing(electrons[:, 0], electrons[:, 1])
+
+        '''
+        outlines = {'pad': self._pad_outlines,
+                'focus': self._focus_outlines}[outline]
+        rows = outlines.locate(x, y)
+        pixelids = np.where(rows >= 0,
+                self._pixel_ids[np.maximum(rows, 0)], -1) if len(
+                        self._pixel_ids) else np.full(np.shape(rows), -1)
+        chipids, channels = self._pixel_rows_to_channels(rows)
+        return pixelids, chipids, channels
+
+    def pixel_neighbors(self, connectivity=4):
+        '''
+        Return the 4- or 8-connected neighbors of every pixel as a CSR
+        pair ``(offsets, pixelids)``: the neighbors of the ``i``-th pixel
+        of ``pixels`` (for the generated layouts, the pixel with ID
+        ``i``) are ``pixelids[offsets[i]:offsets[i + 1]]``.
+
+        Adjacency is geometric (see
+        ``larpixgeometry.spatialindex.neighbor_graph``), so it crosses
+        chip boundaries. The result is computed on first use and cached.
+
+        '''
+        if connectivity not in self._neighbors:
+            offsets, rows = neighbor_graph(self._pixel_x, self._pixel_y,
+                    connectivity)
+            offsets.flags.writeable = False
+            self._neighbors[connectivity] = (offsets, rows)
+        offsets, rows = self._neighbors[connectivity]
+        return offsets, self._pixel_ids[rows]
+
+    def channel_neighbors(self, connectivity=4):
+        '''
+        Return the 4- or 8-connected neighbors of every channel as a CSR
+        pair ``(offsets, indices)`` over dense channel indices (rows of
+        ``columns``): the neighbors of channel row ``i`` are the rows
+        ``indices[offsets[i]:offsets[i + 1]]``, and their addresses are
+        ``columns['chipid'][...]`` and ``columns['channel'][...]``.
+
+        Unconnected channels have no neighbors, and unconnected pixels
+        are skipped. Computed from ``pixel_neighbors`` and cached; the
+        returned arrays are the cached ones and are read-only.
+
+        '''
+        key = ('channel', connectivity)
+        if key not in self._neighbors:
+            self.pixel_neighbors(connectivity)
+            pixel_offsets, pixel_rows = self._neighbors[connectivity]
+            n_rows = len(self._channel_pixels)
+            connected = self._channel_pixels >= 0
+            channel_pixels = self._channel_pixels[connected]
+            # Slice of pixel_rows holding the neighbors of each channel
+            starts = np.zeros(n_rows, dtype=np.int64)
+            starts[connected] = pixel_offsets[channel_pixels]
+            counts = np.zeros(n_rows, dtype=np.int64)
+            counts[connected] = np.diff(pixel_offsets)[channel_pixels]
+            source = np.repeat(np.arange(n_rows), counts)
+            position = (np.arange(counts.sum())
+                    - np.repeat(np.cumsum(counts) - counts, counts)
+                    + np.repeat(starts, counts))
+            neighbors = self._pixel_channels[pixel_rows[position]]
+            keep = neighbors >= 0
+            offsets = np.zeros(n_rows + 1, dtype=np.int64)
+            np.cumsum(np.bincount(source[keep], minlength=n_rows),
+                    out=offsets[1:])
+            neighbors = neighbors[keep].astype(np.int64)
+            offsets.flags.writeable = False
+            neighbors.flags.writeable = False
+            self._neighbors[key] = (offsets, neighbors)
+        return self._neighbors[key]
+
     def channels_where(self, condition):
         '''
         Return a list of (chip, channel) for the pixels that satisfy the
         given condition.
 
         ``condition`` should be a function of one argument, a ``Pixel``
-        object.
+        object. ``channels_where_arrays`` is the vectorized equivalent,
+        with a condition over NumPy columns.
 
         >>> pixelplane.channels_where(lambda pixel: pixel.x > 30 and not pixel.focus_outline)
 
@@ -73,6 +675,205 @@ class PixelPlane(object):
         good_pixels = filter(condition, self.pixels.values())
         return [pixel.channel_connection for pixel in good_pixels]
 
+    def _condition_columns(self):
+        '''
+        Return the read-only columns passed to the conditions of
+        ``channel_mask``, built on first use.
+
+        '''
+        if self._mask_columns is None:
+            columns = dict(self.columns)
+            columns['chip'] = columns['chipid']
+            connected = self.columns['connected']
+            pixel_rows = self._channel_pixels[connected]
+            for name, outlines in (('has_pad', self._pad_outlines),
+                    ('has_focus', self._focus_outlines)):
+                has_outline = np.zeros(len(connected), dtype=bool)
+                has_outline[connected] = outlines.counts()[pixel_rows] > 0
+                has_outline.flags.writeable = False
+                columns[name] = has_outline
+            self._mask_columns = columns
+        return self._mask_columns
+
+    def channel_mask(self, condition, name=None):
+        '''
+        Return a read-only boolean array over dense channel indices
+        (rows of ``columns``) which is True for the channels satisfying
+        the vectorized ``condition``.
+
+        ``condition`` is a function of one argument, a dict with the
+        ``columns`` arrays plus ``'chip'`` (the same as ``'chipid'``),
+        ``'has_pad'`` and ``'has_focus'`` (whether the connected pixel
+        has a pad or focus outline), returning a boolean array or
+        scalar. Unconnected channels have a NaN position and no
+        outlines.
+
+        If ``name`` is given, the mask is cached on the plane under that
+        name: later calls with the same name return the cached mask
+        without evaluating ``condition``, and ``condition`` may then be
+        the name alone. ``masks`` lists the cached masks.
+
+        >>> fiducial = pixelplane.channel_mask(lambda c: (abs(c['x']) < 140) & (abs(c['y']) < 140), name='fiducial')
+
+        '''
+        return self._mask_storage(condition, name)[:-1]
+
+    def _mask_storage(self, condition, name):
+        '''
+        Return the mask of ``channel_mask`` with a trailing False
+        sentinel row.
+
+        '''
+        if isinstance(condition, str):
+            return self._masks[condition]
+        if name is not None and name in self._masks:
+            return self._masks[name]
+        columns = self._condition_columns()
+        mask = np.zeros(len(columns['x']) + 1, dtype=bool)
+        mask[:-1] = condition(columns)
+        mask.flags.writeable = False
+        if name is not None:
+            mask = self._masks.setdefault(name, mask)
+        return mask
+
+    @property
+    def masks(self):
+        '''
+        Read-only mapping of the named masks cached by ``channel_mask``.
+
+        '''
+        return types.MappingProxyType({name: mask[:-1]
+            for name, mask in self._masks.items()})
+
+    def channels_selected(self, condition, chipids, channels, name=None):
+        '''
+        Return a boolean array which is True where the (chip, channel)
+        pair is on this plane and satisfies ``condition`` (see
+        ``channel_mask``), e.g. to apply a cached fiducial cut to hits.
+
+        >>> keep = pixelplane.channels_selected('fiducial', packets['chip_id'], packets['channel_id'])
+
+        '''
+        rows = self.channel_index(chipids, channels)
+        return self._mask_storage(condition, name)[rows]
+
+    def channel_rows_where(self, condition, name=None):
+        '''
+        Return the dense channel indices of the connected channels
+        satisfying ``condition`` (see ``channel_mask``).
+
+        '''
+        return np.flatnonzero(self.channel_mask(condition, name)
+                & self.columns['connected'])
+
+    def channels_where_arrays(self, condition, name=None):
+        '''
+        Vectorized ``channels_where``: return ``(chipids, channels)``
+        arrays of the connected channels satisfying ``condition`` (see
+        ``channel_mask``), in the order of ``columns``.
+
+        >>> chipids, channels = pixelplane.channels_where_arrays(lambda c: (c['x'] > 30) & ~c['has_focus'])
+
+        '''
+        rows = self.channel_rows_where(condition, name)
+        return self.columns['chipid'][rows], self.columns['channel'][rows]
+
+
+def _frozen_outline(outline):
+    return tuple(tuple(vertex) for vertex in outline)
+
+def _find_lattice(x, y, tolerance=1e-6):
+    '''
+    Return the regular grid of the points ``(x, y)`` (see
+    ``PixelPlane.lattice``), or None if there isn't one.
+
+    Points are on a grid if every coordinate is within ``tolerance``
+    (relative to the pitch) of a lattice site, no two points share a
+    site, and the lattice is not much larger than the number of points.
+
+    '''
+    if len(x) < 2:
+        return None
+    lattice = {}
+    indices = []
+    for axis, values in (('x', x), ('y', y)):
+        origin = values.min()
+        gaps = np.diff(np.unique(values))
+        extent = values.max() - origin
+        gaps = gaps[gaps > tolerance * max(extent, 1.)]
+        pitch = gaps.min() if len(gaps) else 1.
+        # Spread rounding errors in the smallest gap over the whole extent
+        if extent > 0:
+            pitch = extent / np.round(extent / pitch)
+        index = np.round((values - origin) / pitch)
+        if np.max(np.abs(values - (origin + index * pitch))) > tolerance * pitch:
+            return None
+        lattice[axis + '0'] = float(origin)
+        lattice['pitch_' + axis] = float(pitch)
+        indices.append(index.astype(np.int64))
+    ix, iy = indices
+    shape = (int(iy.max()) + 1, int(ix.max()) + 1)
+    if shape[0] * shape[1] > 16 * len(x):
+        return None
+    table = np.full(shape, -1, dtype=np.int32)
+    table[iy, ix] = np.arange(len(x))
+    if np.count_nonzero(table >= 0) != len(x):
+        return None
+    lattice['table'] = table
+    return lattice
+
+
+class PixelMap(Mapping):
+    '''
+    A read-only mapping from pixel ID to ``Pixel`` for a
+    ``PixelPlane``.
+
+    ``Pixel`` objects are created the first time they are looked up and
+    are kept afterwards, so the same pixel ID always gives the same
+    object. Iteration follows the order of the pixels in the layout.
+
+    '''
+    def __init__(self, plane):
+        self._plane = plane
+        self._cache = {}
+
+    def _materialize(self, row):
+        pixel = self._cache.get(row)
+        if pixel is None:
+            # setdefault keeps the first object if two threads race
+            pixel = self._cache.setdefault(row, self._plane._pixel(row))
+        return pixel
+
+    def _row(self, pixelid):
+        pixel_rows = self._plane._pixel_rows
+        try:
+            row = pixel_rows[pixelid] if pixelid >= 0 else -1
+        except (IndexError, TypeError):
+            row = -1
+        if row < 0:
+            raise KeyError(pixelid)
+        return row
+
+    def __getitem__(self, pixelid):
+        return self._materialize(self._row(pixelid))
+
+    def __contains__(self, pixelid):
+        try:
+            self._row(pixelid)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return (int(pixelid) for pixelid in self._plane._pixel_ids)
+
+    def __len__(self):
+        return len(self._plane._pixel_ids)
+
+    def values(self):
+        return [self._materialize(row)
+                for row in range(len(self._plane._pixel_ids))]
+
 
 class GeomChip(object):
     '''
@@ -82,19 +883,213 @@ class GeomChip(object):
     convention, are assigned to a pixel index of None.
 
     '''
+    __slots__ = ('chipid', '_plane', '_channel_connections', '_frozen')
+
     def __init__(self):
-        self.channel_connections = []
+        self._channel_connections = []
+        self._plane = None
+        self._frozen = False
         self.chipid = None
 
+    def __setattr__(self, name, value):
+        if not name.startswith('_') and self._frozen:
+            raise AttributeError('Cannot set %s of a chip of a frozen '
+                    'PixelPlane' % name)
+        super(GeomChip, self).__setattr__(name, value)
+
+    @property
+    def channel_connections(self):
+        if self._channel_connections is None:
+            self._channel_connections = self._plane._chip_connections(self)
+        return self._channel_connections
+
+    @channel_connections.setter
+    def channel_connections(self, value):
+        self._channel_connections = value
+
 class Pixel(object):
     '''
     A pixel pad + focusing region on the LArPix pixel plane.
 
     '''
+    __slots__ = ('pixelid', 'x', 'y', 'pad_outline', 'focus_outline',
+            'channel_connection', '_frozen')
+
     def __init__(self):
+        self._frozen = False
         self.pixelid = None
         self.x = 0
         self.y = 0
         self.pad_outline = []
         self.focus_outline = []
         self.channel_connection = None
+
+    def __setattr__(self, name, value):
+        if not name.startswith('_') and self._frozen:
+            raise AttributeError('Cannot set %s of a pixel of a frozen '
+                    'PixelPlane' % name)
+        super(Pixel, self).__setattr__(name, value)
+
+class _UnconnectedPixel(Pixel):
+    '''
+    The pixel shared by all channels that are not connected to any
+    pixel. Its ``channel_connection`` list is built on first access.
+
+    '''
+    __slots__ = ('_plane', '_channel_connection')
+
+    def __init__(self, plane):
+        self._plane = plane
+        super(_UnconnectedPixel, self).__init__()
+
+    @property
+    def channel_connection(self):
+        if self._channel_connection is None:
+            plane = self._plane
+            unconnected = np.nonzero(~plane.columns['connected'])[0]
+            connection = [
+                    (plane.chips[int(plane.columns['chipid'][row])],
+                        int(plane.columns['channel'][row]))
+                    for row in unconnected]
+            self._channel_connection = (tuple(connection) if self._frozen
+                    else connection)
+        return self._channel_connection
+
+    @channel_connection.setter
+    def channel_connection(self, value):
+        self._channel_connection = value
+
+
+class PlaneCache(object):
+    '''
+    A thread-safe, bounded LRU cache of frozen ``PixelPlane`` objects
+    keyed by layout file.
+
+    An entry is rebuilt when its layout file changes: the file's
+    modification time and size are checked on every lookup, and if they
+    changed, the contents are hashed, so that a file which was only
+    touched does not trigger a rebuild. ``hits``, ``misses`` (including
+    rebuilds) and ``invalidations`` count lookups, see ``stats``.
+
+    '''
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        # Path -> [(mtime, size), content hash, plane], oldest first
+        self._entries = OrderedDict()
+        # Path -> lock held while building the plane of that path, only
+        # while it is being built
+        self._build_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, version):
+        '''
+        Return the frozen ``PixelPlane`` of the given layout version
+        (e.g. ``'2.4.0'`` for ``layout-2.4.0.yaml``) or layout file,
+        found as in ``larpixgeometry.layouts.load``.
+
+        '''
+        filename = version if version.endswith('.yaml') else (
+                'layout-%s.yaml' % version)
+        path = os.path.realpath(find(filename))
+        plane = self._lookup(path)
+        if plane is not None:
+            return plane
+        with self._lock:
+            build_lock = self._build_locks.setdefault(path, threading.Lock())
+        with build_lock:
+            try:
+                # Another thread may have built it while we waited
+                plane = self._lookup(path)
+                if plane is not None:
+                    return plane
+                # The stamp is taken first, so that a change while the
+                # file is read shows up as a changed stamp later, and the
+                # hash is that of the bytes which are parsed
+                stamp = _file_stamp(path)
+                with open(path, 'rb') as f:
+                    data = f.read()
+                instrumentation.count('bytes_read', len(data))
+                digest = hashlib.sha1(data).hexdigest()
+                plane = PixelPlane.fromDict(load(path, data=data)).freeze()
+                with self._lock:
+                    self.misses += 1
+                    self._entries[path] = [stamp, digest, plane]
+                    self._entries.move_to_end(path)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+                return plane
+            finally:
+                with self._lock:
+                    if self._build_locks.get(path) is build_lock:
+                        del self._build_locks[path]
+
+    def _lookup(self, path):
+        '''
+        Return the cached plane of ``path`` if it is up to date, or None
+        (after dropping a stale entry).
+
+        '''
+        stamp = _file_stamp(path)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is None:
+            return None
+        if entry[0] != stamp:
+            with open(path, 'rb') as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            with self._lock:
+                if digest != entry[1]:
+                    if self._entries.get(path) is entry:
+                        del self._entries[path]
+                        self.invalidations += 1
+                    return None
+                entry[0] = stamp
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+            self.hits += 1
+        return entry[2]
+
+    def stats(self):
+        '''
+        Return a dict with the ``hits``, ``misses`` and
+        ``invalidations`` so far, and the current ``size`` and
+        ``maxsize`` of the cache.
+
+        '''
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'invalidations': self.invalidations,
+                    'size': len(self._entries), 'maxsize': self.maxsize}
+
+    def clear(self):
+        '''
+        Drop all entries and reset the statistics.
+
+        '''
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.invalidations = 0
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+# The cache used by get_pixel_plane
+plane_cache = PlaneCache()
+
+def get_pixel_plane(version):
+    '''
+    Return the shared, frozen ``PixelPlane`` of the given layout version
+    (e.g. ``'2.4.0'``) or layout file from ``plane_cache``, loading it
+    on first use and again whenever the layout file changes.
+
+    >>> board = get_pixel_plane('2.4.0')
+    >>> plane_cache.stats()
+    {'hits': 0, 'misses': 1, 'invalidations': 0, 'size': 1, 'maxsize': 8}
+
+    '''
+    return plane_cache.get(version)
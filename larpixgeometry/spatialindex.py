@@ -0,0 +1,281 @@
+'''
+Uniform grid spatial index over a set of 2D points.
+
+The pixel layouts are (nearly) regular, so a uniform grid with about one
+point per cell is small and gives constant-time queries. All queries
+are vectorized and return indices into the arrays the index was built
+from.
+
+'''
+import numpy as np
+
+class GridIndex(object):
+    '''
+    A uniform grid over the points ``(x, y)``.
+
+    ``cell_size`` defaults to the square root of the area per point of
+    the bounding box, i.e. about one point per cell for a regular
+    layout.
+
+    >>> index = GridIndex(x, y)
+    >>> nearest, distance = index.nearest(points_x, points_y)
+    >>> inside = index.query_box(0, 10, 0, 10)
+
+    '''
+    # Number of query points processed at once by ``nearest``
+    chunk_size = 16384
+    # Maximum number of candidate points gathered at once by ``nearest``
+    candidate_budget = 1 << 22
+
+    def __init__(self, x, y, cell_size=None):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        n_points = len(self.x)
+        if n_points:
+            self.x0, self.y0 = self.x.min(), self.y.min()
+            width = self.x.max() - self.x0
+            height = self.y.max() - self.y0
+        else:
+            self.x0 = self.y0 = width = height = 0.
+        if cell_size is None:
+            cell_size = np.sqrt(width * height / max(n_points, 1))
+            if cell_size <= 0:
+                cell_size = max(width, height) / max(n_points, 1)
+            if cell_size <= 0:
+                cell_size = 1.
+        self.cell_size = float(cell_size)
+        self.nx = int(width // self.cell_size) + 1
+        self.ny = int(height // self.cell_size) + 1
+        cells = self._cells(*self._cell_xy(self.x, self.y))
+        # Point indices sorted by cell, with the range of cell c given by
+        # order[cell_start[c]:cell_start[c + 1]]
+        self.order = np.argsort(cells, kind='stable')
+        self.cell_start = np.searchsorted(cells[self.order],
+                np.arange(self.nx * self.ny + 1))
+        # Table of the points in each cell, padded with -1, plus one
+        # extra empty row used for cells off the grid
+        counts = np.diff(self.cell_start)
+        width = int(counts.max()) if n_points else 1
+        self._cell_table = np.full((self.nx * self.ny + 1, width), -1,
+                dtype=np.int64)
+        rank = np.arange(n_points) - self.cell_start[cells[self.order]]
+        self._cell_table[cells[self.order], rank] = self.order
+
+    def _cell_xy(self, x, y):
+        ix = np.clip(np.floor((x - self.x0) / self.cell_size), 0,
+                self.nx - 1).astype(np.int64)
+        iy = np.clip(np.floor((y - self.y0) / self.cell_size), 0,
+                self.ny - 1).astype(np.int64)
+        return ix, iy
+
+    def _cells(self, ix, iy):
+        return iy * self.nx + ix
+
+    def nearest(self, x, y):
+        '''
+        Return ``(indices, distances)`` of the nearest point to each
+        query point. ``x`` and ``y`` are broadcast against each other.
+
+        For query points with a NaN or infinite coordinate, or if the
+        index is empty, the indices are -1 and the distances are
+        infinite.
+
+        '''
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=np.float64),
+                np.asarray(y, dtype=np.float64))
+        shape = x.shape
+        x = x.reshape(-1)
+        y = y.reshape(-1)
+        indices = np.full(len(x), -1, dtype=np.int64)
+        distances = np.full(len(x), np.inf)
+        if len(self.x):
+            for start in range(0, len(x), self.chunk_size):
+                chunk = slice(start, start + self.chunk_size)
+                indices[chunk], distances[chunk] = self._nearest(x[chunk],
+                        y[chunk])
+        return indices.reshape(shape), distances.reshape(shape)
+
+    def _nearest(self, x, y):
+        indices = np.full(len(x), -1, dtype=np.int64)
+        distances = np.full(len(x), np.inf)
+        todo = np.nonzero(np.isfinite(x) & np.isfinite(y))[0]
+        # Query points off the grid start from the nearest grid cell
+        ix, iy = self._cell_xy(np.where(np.isfinite(x), x, self.x0),
+                np.where(np.isfinite(y), y, self.y0))
+        # A block of this radius around any cell covers the whole grid
+        max_radius = max(self.nx, self.ny, 2) - 1
+        radius = 1
+        while len(todo):
+            radius = min(radius, max_radius)
+            n_cells = (2*radius + 1)**2 * self._cell_table.shape[1]
+            batch = max(1, self.candidate_budget // n_cells)
+            done = np.zeros(len(todo), dtype=bool)
+            for start in range(0, len(todo), batch):
+                rows = todo[start:start + batch]
+                found, best, best_d = self._search_block(x[rows], y[rows],
+                        ix[rows], iy[rows], radius)
+                indices[rows[found]] = best[found]
+                distances[rows[found]] = best_d[found]
+                done[start:start + batch] = found
+            todo = todo[~done]
+            radius *= 2
+        return indices, distances
+
+    def _search_block(self, qx, qy, cx, cy, radius):
+        '''
+        Search the block of cells within ``radius`` of each query cell,
+        clipped to the grid, and return ``(found, indices, distances)``
+        of the nearest point in the block, where ``found`` is whether it
+        is nearer than every point outside the block.
+
+        '''
+        dx, dy = np.meshgrid(np.arange(-radius, radius + 1),
+                np.arange(-radius, radius + 1))
+        nx = cx[:, None] + dx.reshape(-1)
+        ny = cy[:, None] + dy.reshape(-1)
+        on_grid = (nx >= 0) & (nx < self.nx) & (ny >= 0) & (ny < self.ny)
+        cells = np.where(on_grid, self._cells(nx, ny), self.nx * self.ny)
+        candidates = self._cell_table[cells].reshape(len(qx), -1)
+        d2 = ((self.x[candidates] - qx[:, None])**2
+                + (self.y[candidates] - qy[:, None])**2)
+        d2[candidates < 0] = np.inf
+        best = np.argmin(d2, axis=1)
+        best_d = np.sqrt(d2[np.arange(len(qx)), best])
+        # Lower bound on the distance to any point outside the block:
+        # the distance to the nearest of the (up to four) strips of the
+        # grid left unsearched, which for points off the grid includes
+        # their distance to the grid
+        bx0 = np.maximum(cx - radius, 0)
+        bx1 = np.minimum(cx + radius, self.nx - 1) + 1
+        by0 = np.maximum(cy - radius, 0)
+        by1 = np.minimum(cy + radius, self.ny - 1) + 1
+        bound = np.full(len(qx), np.inf)
+        for exists, (sx0, sx1, sy0, sy1) in (
+                (bx0 > 0, (0, bx0, 0, self.ny)),
+                (bx1 < self.nx, (bx1, self.nx, 0, self.ny)),
+                (by0 > 0, (bx0, bx1, 0, by0)),
+                (by1 < self.ny, (bx0, bx1, by1, self.ny))):
+            gap_x = np.maximum(np.maximum(self.x0 + sx0 * self.cell_size - qx,
+                qx - (self.x0 + sx1 * self.cell_size)), 0)
+            gap_y = np.maximum(np.maximum(self.y0 + sy0 * self.cell_size - qy,
+                qy - (self.y0 + sy1 * self.cell_size)), 0)
+            bound = np.where(exists, np.minimum(bound, np.hypot(gap_x, gap_y)),
+                    bound)
+        found = best_d <= bound
+        return found, candidates[np.arange(len(qx)), best], best_d
+
+    def query_box(self, xmin, xmax, ymin, ymax):
+        '''
+        Return the sorted indices of the points with ``xmin <= x <=
+        xmax`` and ``ymin <= y <= ymax``.
+
+        '''
+        if not len(self.x) or xmin > xmax or ymin > ymax:
+            return np.zeros(0, dtype=np.int64)
+        (ix0, ix1), (iy0, iy1) = self._cell_xy(np.array([xmin, xmax]),
+                np.array([ymin, ymax]))
+        # The cells of one grid row are contiguous in ``order``
+        rows = np.arange(iy0, iy1 + 1)
+        starts = self.cell_start[self._cells(ix0, rows)]
+        stops = self.cell_start[self._cells(ix1, rows) + 1]
+        candidates = np.concatenate([self.order[start:stop]
+            for start, stop in zip(starts, stops)])
+        inside = ((self.x[candidates] >= xmin) & (self.x[candidates] <= xmax)
+                & (self.y[candidates] >= ymin) & (self.y[candidates] <= ymax))
+        return np.sort(candidates[inside])
+
+    def query_radius(self, x, y, radius):
+        '''
+        Return the sorted indices of the points within ``radius`` of
+        ``(x, y)``.
+
+        '''
+        candidates = self.query_box(x - radius, x + radius, y - radius,
+                y + radius)
+        d2 = (self.x[candidates] - x)**2 + (self.y[candidates] - y)**2
+        return candidates[d2 <= radius**2]
+
+def neighbor_graph(x, y, connectivity=4, pitch=None, groups=None,
+        tolerance=0.05):
+    '''
+    Return the 4- or 8-connected neighbors of the points ``(x, y)`` as a
+    CSR-style pair ``(offsets, indices)``: the neighbors of point ``i``
+    are ``indices[offsets[i]:offsets[i + 1]]``, in increasing order.
+
+    Two points are 4-connected neighbors if they are at most ``pitch``
+    apart and 8-connected neighbors if they are at most ``sqrt(2) *
+    pitch`` apart, both up to a relative ``tolerance``, which also
+    absorbs the slightly wider gap between the edge pixels of adjacent
+    tiles. ``pitch`` defaults to the median distance from a point to
+    its nearest other point. For layouts which are not square grids
+    (e.g. the triangle grids) this is only an approximation of
+    adjacency.
+
+    If ``groups`` is given, points in different groups (e.g. different
+    anode planes of a multi-tile detector) are never neighbors.
+
+    '''
+    if connectivity not in (4, 8):
+        raise ValueError('connectivity must be 4 or 8')
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n_points = len(x)
+    if pitch is None:
+        pitch = _median_spacing(x, y)
+    radius = pitch * (1 + tolerance) * (1 if connectivity == 4 else np.sqrt(2))
+    offsets = np.zeros(n_points + 1, dtype=np.int64)
+    if n_points < 2 or not radius > 0:
+        return offsets, np.zeros(0, dtype=np.int64)
+    index = GridIndex(x, y, cell_size=radius)
+    rows = []
+    neighbors = []
+    for start in range(0, n_points, GridIndex.chunk_size):
+        points = np.arange(start, min(start + GridIndex.chunk_size, n_points))
+        candidates = _block_candidates(index, points)
+        d2 = ((x[candidates] - x[points, None])**2
+                + (y[candidates] - y[points, None])**2)
+        keep = ((candidates >= 0) & (candidates != points[:, None])
+                & (d2 <= radius**2))
+        if groups is not None:
+            groups = np.asarray(groups)
+            keep &= groups[candidates] == groups[points, None]
+        point_rows, columns = np.nonzero(keep)
+        rows.append(points[point_rows])
+        neighbors.append(candidates[point_rows, columns])
+    rows = np.concatenate(rows)
+    neighbors = np.concatenate(neighbors)
+    order = np.lexsort((neighbors, rows))
+    np.cumsum(np.bincount(rows, minlength=n_points), out=offsets[1:])
+    return offsets, neighbors[order]
+
+def _block_candidates(index, points):
+    '''
+    Return the indices of the points in the 3 x 3 block of cells around
+    each of the given points of ``index``, padded with -1.
+
+    '''
+    cx, cy = index._cell_xy(index.x[points], index.y[points])
+    dx, dy = np.meshgrid(np.arange(-1, 2), np.arange(-1, 2))
+    nx = cx[:, None] + dx.reshape(-1)
+    ny = cy[:, None] + dy.reshape(-1)
+    on_grid = (nx >= 0) & (nx < index.nx) & (ny >= 0) & (ny < index.ny)
+    cells = np.where(on_grid, index._cells(nx, ny), index.nx * index.ny)
+    return index._cell_table[cells].reshape(len(points), -1)
+
+def _median_spacing(x, y):
+    '''
+    Return the median distance from each point to its nearest other
+    point (among the points in the surrounding cells of a default
+    ``GridIndex``), ignoring coincident points.
+
+    '''
+    if len(x) < 2:
+        return 0.
+    index = GridIndex(x, y)
+    points = np.arange(len(x))
+    candidates = _block_candidates(index, points)
+    d2 = (x[candidates] - x[:, None])**2 + (y[candidates] - y[:, None])**2
+    d2[(candidates < 0) | (d2 == 0)] = np.inf
+    nearest = np.sqrt(d2.min(axis=1))
+    nearest = nearest[np.isfinite(nearest)]
+    return float(np.median(nearest)) if len(nearest) else 0.
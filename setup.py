@@ -14,8 +14,8 @@ setup(
         author_email='skohn@lbl.gov',
         keywords='dune physics',
         packages=find_packages(),
-        install_requires=['pyyaml', 'reportlab', 'fire'],
+        install_requires=['pyyaml', 'numpy', 'reportlab', 'fire'],
         package_data={
-            'larpixgeometry.layouts':['*.yaml']
+            'larpixgeometry.layouts':['*.yaml', '*.npz']
         },
 )
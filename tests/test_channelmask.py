@@ -0,0 +1,98 @@
+import json
+
+import numpy as np
+import pytest
+
+from larpixgeometry.channelmask import ChannelMask
+from larpixgeometry.layouts import multi_tile_layout
+from larpixgeometry.layouts import patterngenerator as pg
+from larpixgeometry.multitile import MultiTileGeometry
+from larpixgeometry.pixelplane import PixelPlane
+
+CHIPS = list(range(11, 111))
+N_TILES = 16
+
+@pytest.fixture(scope='module')
+def geometry():
+    '''
+    A module of 16 tiles of 10x10 chips with 7x7 pixels each, as in the
+    2.4.0 layout, tile ``t`` on (io_group, io_channel) ``((t - 1)//8 + 1,
+    (t - 1)%8 + 1)``.
+
+    '''
+    tile = PixelPlane.fromDict(pg.build_layout(pg.tile_spec(CHIPS,
+        [(chip - 11) % 10 for chip in CHIPS],
+        [(chip - 11) // 10 for chip in CHIPS])))
+    tiles = range(1, N_TILES + 1)
+    return MultiTileGeometry.fromDict({
+        'pixel_pitch': multi_tile_layout.PIXEL_PITCH,
+        'chip_channel_to_position':
+            multi_tile_layout.chip_channel_positions(tile),
+        'tile_positions': {t: [0., 0., 0.] for t in tiles},
+        'tile_orientations': {t: [1, 1, 1] for t in tiles},
+        'tile_chip_to_io': {t: {chip: ((t - 1)//8 + 1)*1000 + (t - 1)%8 + 1
+            for chip in CHIPS} for t in tiles},
+        })
+
+# Channels 6 and 7 are not connected to a pixel, 1, 2 and 5 are
+CHANNEL_LIST = {
+        'All': [6, 7],
+        '1-1-11': [1, 8, 9],
+        '1-2-12': [2],
+        '3-1-11': [5],
+        }
+
+def test_module_size(geometry):
+    io_group, io_channel, chipid = np.meshgrid([1, 2], range(1, 9), CHIPS)
+    mask = ChannelMask.from_chips(geometry, io_group, io_channel, chipid)
+    assert len(mask) == mask.size == N_TILES * len(CHIPS) * 49
+    assert len(mask.unmatched) == 0
+    assert mask.bits.nbytes + mask.unmatched.nbytes < 10 * 1024
+    assert len(~mask) == 0
+
+def test_network_config(geometry, tmp_path):
+    filename = str(tmp_path / 'network.json')
+    with open(filename, 'w') as f:
+        json.dump({'network': {'2': {'3': {'nodes': [{'chip_id': 'ext'}]
+            + [{'chip_id': chip} for chip in CHIPS + [111]]}}}}, f)
+    mask = ChannelMask.from_network_config(geometry, filename)
+    assert len(mask) == len(CHIPS) * 49
+    assert len(mask.unmatched) == 0
+    channels = np.arange(64)
+    assert (mask.contains(2, 3, 11, channels).tolist()
+            == (geometry.channel_index(2, 3, 11, channels) >= 0).tolist())
+
+def test_dict_round_trip(geometry):
+    mask = ChannelMask.fromDict(geometry, CHANNEL_LIST)
+    assert len(mask) == 2
+    assert len(mask.unmatched) == 5
+    assert mask.contains([1, 1, 1, 3], [1, 1, 2, 1], [11, 11, 12, 11],
+            [1, 8, 2, 5]).tolist() == [True, False, True, False]
+    assert mask.toDict() == CHANNEL_LIST
+    assert ChannelMask.fromDict(geometry, mask.toDict()) == mask
+
+@pytest.mark.parametrize('extension', ['.json', '.yaml'])
+def test_file_round_trip(geometry, tmp_path, extension):
+    mask = ChannelMask.fromDict(geometry, CHANNEL_LIST)
+    filename = str(tmp_path / ('disabled' + extension))
+    mask.toFile(filename)
+    assert ChannelMask.fromFile(geometry, filename) == mask
+    assert ChannelMask.fromFile(geometry, filename).toDict() == CHANNEL_LIST
+
+def test_set_operations(geometry):
+    mask = ChannelMask.fromDict(geometry, CHANNEL_LIST)
+    other = ChannelMask.fromDict(geometry, {'1-1-11': [1, 9, 10]})
+    assert (mask | other).toDict() == dict(CHANNEL_LIST,
+            **{'1-1-11': [1, 8, 9, 10]})
+    assert (mask & other).toDict() == {'1-1-11': [1, 9]}
+    assert (mask - other).toDict() == dict(CHANNEL_LIST, **{'1-1-11': [8]})
+    assert (mask ^ other).toDict() == dict(CHANNEL_LIST,
+            **{'1-1-11': [8, 10]})
+    assert len((~mask).unmatched) == 0
+    assert mask != ChannelMask.from_array(geometry, mask.to_array())
+
+def test_unrepresentable_channels(geometry):
+    with pytest.raises(ValueError):
+        ChannelMask.fromDict(geometry, {'1-1-1000': [0]})
+    with pytest.raises(ValueError):
+        ChannelMask.fromDict(geometry, {'All': [-1]})
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from larpixgeometry import layouts
+from larpixgeometry.layouts import compiled, yamlio
+from larpixgeometry.layouts import patterngenerator as pg
+
+def _layout():
+    d = pg.build_layout(pg.tile_spec([11, 12, 21, 22], [0, 1, 0, 1],
+        [0, 0, 1, 1]))
+    d['pixels'][0][3] = [[0.0, 0.0], [1.0, 0.0], [1.0, 1.5]]
+    d['pixels'][0][4] = [[0.25, 0.25], [0.5, 0.25], [0.5, 0.5]]
+    d['chip_channel_to_position'] = {11001: [0, 1], 11002: [1, 0]}
+    d['tile_name'] = 'test'
+    # The layout as it reads back from YAML, with float positions
+    return yamlio.parse(yamlio.dumps(d))
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setenv(compiled.CACHE_DIR_ENV, str(tmp_path / 'cache'))
+    return tmp_path / 'cache'
+
+def test_decompile_compile():
+    d = _layout()
+    assert compiled.decompile_layout(compiled.compile_layout(d)) == d
+
+def test_write_read_compiled(tmp_path):
+    d = _layout()
+    path = str(tmp_path / 'layout.npz')
+    compiled.write_compiled(d, path)
+    assert compiled.read_compiled(path) == d
+    partial = compiled.read_compiled(path, sections=['pixels'],
+            outlines=False)
+    assert list(partial) == ['pixels']
+    assert partial['pixels'] == [pixel[:3] + [[], []]
+            for pixel in d['pixels']]
+
+def test_malformed_layout():
+    with pytest.raises(ValueError):
+        compiled.compile_layout({'pixels': [[0, 1.0]], 'chips': []})
+
+def test_cache_rejects_stale_hash(tmp_path, cache):
+    d = _layout()
+    filename = str(tmp_path / 'layout-test.yaml')
+    yamlio.dump(d, filename)
+    assert layouts.load(filename) == d
+    with open(filename, 'rb') as f:
+        data = f.read()
+    assert os.listdir(str(cache)) == [compiled.compiled_filename(filename,
+        compiled.source_hash(data))]
+    assert compiled.load_cached(filename, data) == d
+
+    d['tile_name'] = 'edited'
+    yamlio.dump(d, filename)
+    with open(filename, 'rb') as f:
+        assert compiled.load_cached(filename, f.read()) is None
+    assert layouts.load(filename) == d
+    assert len(os.listdir(str(cache))) == 2
@@ -0,0 +1,61 @@
+import glob
+import gzip
+import os
+import runpy
+
+import pytest
+
+from larpixgeometry.layouts import yamlio
+
+LAYOUTS = os.path.join(os.path.dirname(__file__), os.pardir, 'larpixgeometry',
+        'layouts')
+# The layouts written by the scripts before they were rewritten as specs
+# for build_layout, one pixel or chip at a time, gzipped
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+SCRIPTS = sorted(glob.glob(os.path.join(LAYOUTS, 'layout-*.py')))
+
+def _run_script(script, directory, monkeypatch):
+    '''
+    Run a layout script in ``directory``, as from the layouts directory,
+    and return its globals and the layout it wrote.
+
+    '''
+    monkeypatch.chdir(directory)
+    monkeypatch.syspath_prepend(os.path.abspath(LAYOUTS))
+    script_globals = runpy.run_path(script)
+    name = os.path.basename(script)[:-len('.py')] + '.yaml'
+    with open(os.path.join(directory, name), 'rb') as f:
+        return script_globals, yamlio.parse(f.read())
+
+@pytest.mark.parametrize('script', SCRIPTS, ids=os.path.basename)
+def test_spec_matches_legacy_layout(script, tmp_path, monkeypatch):
+    script_globals, layout = _run_script(script, str(tmp_path), monkeypatch)
+    assert layout == yamlio.parse(yamlio.dumps(
+        script_globals['pg'].build_layout(script_globals['SPEC'])))
+    legacy = os.path.join(DATA, os.path.basename(script)[:-len('.py')]
+            + '.yaml.gz')
+    with gzip.open(legacy, 'rb') as f:
+        assert yamlio.parse(f.read()) == layout
+
+def test_tile_spec_matches_chip_by_chip_layout(tmp_path, monkeypatch):
+    # The 10x10 tile, built one chip at a time as the 2.4.0 script did
+    # before it used tile_spec, with y increasing with the chip row
+    script = os.path.join(LAYOUTS, 'layout-2.4.0.py')
+    script_globals, layout = _run_script(script, str(tmp_path), monkeypatch)
+    pg = script_globals['pg']
+    pixel_pitch = 4.434
+    width = height = pixel_pitch*70
+    pixels = []
+    chips = []
+    for chip_idx, chip in enumerate(range(11, 111)):
+        column, row = script_globals['chip_xy'](chip)
+        x = column * 7 * pixel_pitch + pixel_pitch/2 - width/2
+        y = row * 7 * pixel_pitch + pixel_pitch/2 - height/2
+        pixels.extend(pg.pixels_plain_grid(pixel_pitch, 1, 1, x, y,
+            len(pixels), batch_size=7, pixels_per_grid=49))
+        chips.append([chip, pg.assign_pixels(
+            list(range(chip_idx*49, chip_idx*49 + 49)),
+            pg.grid_7x7_assignments_0_64_v2_2_1, True, range(64))])
+    assert layout == yamlio.parse(yamlio.dumps({'pixels': pixels,
+        'chips': chips, 'x': -width/2, 'y': -height/2, 'width': width,
+        'height': height}))
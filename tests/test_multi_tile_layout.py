@@ -0,0 +1,73 @@
+import json
+import os
+import uuid
+
+import pytest
+
+from larpixgeometry import layouts
+from larpixgeometry.layouts import compiled, multi_tile_layout, yamlio
+from larpixgeometry.layouts import patterngenerator as pg
+from larpixgeometry.pixelplane import PixelPlane
+
+@pytest.fixture
+def packaged_layout():
+    '''
+    A small tile layout in the package's layouts directory, known only by
+    its file name.
+
+    '''
+    name = 'layout-test-%s.yaml' % uuid.uuid4().hex
+    path = os.path.join(os.path.dirname(layouts.__file__), name)
+    yamlio.dump(pg.build_layout(pg.tile_spec([11, 12], [0, 1], [0, 0])), path)
+    yield name
+    os.remove(path)
+
+@pytest.fixture
+def network_config(tmp_path):
+    path = str(tmp_path / 'network.json')
+    with open(path, 'w') as f:
+        json.dump({'network': {'1': {'1': {'nodes': [{'chip_id': 11},
+            {'chip_id': 12}, {'chip_id': 'ext'}]}}}}, f)
+    return path
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_packaged_layout_name(packaged_layout, network_config, tmp_path,
+        monkeypatch, incremental):
+    monkeypatch.chdir(str(tmp_path))
+    monkeypatch.setenv(compiled.CACHE_DIR_ENV, str(tmp_path / 'compiled'))
+    expected = multi_tile_layout.chip_channel_positions(
+            PixelPlane.fromDict(layouts.load(packaged_layout)))
+    output = str(tmp_path / 'multi.yaml')
+    for _ in range(2):
+        multi_tile_layout.generate_layout(packaged_layout, network_config,
+                output=output, incremental=incremental,
+                cache_dir=str(tmp_path / 'cache'))
+        with open(output, 'rb') as f:
+            d = yamlio.parse(f.read())
+        assert d['tile_chip_to_io'] == {1: {11: 1001, 12: 1001}}
+        assert d['chip_channel_to_position'] == expected
+
+def test_incremental_sidecar(packaged_layout, network_config, tmp_path,
+        monkeypatch):
+    monkeypatch.setenv(compiled.CACHE_DIR_ENV, str(tmp_path / 'compiled'))
+    output = str(tmp_path / 'multi.yaml')
+    sidecars = lambda: [name for name in os.listdir(str(tmp_path))
+            if name.endswith('.npz')]
+    multi_tile_layout.generate_layout(packaged_layout, network_config,
+            output=output, incremental=True, cache_dir=str(tmp_path / 'cache'))
+    assert sidecars() == []
+    # The YAML is unchanged, but the sidecar is still written
+    for _ in range(2):
+        multi_tile_layout.generate_layout(packaged_layout, network_config,
+                output=output, incremental=True,
+                cache_dir=str(tmp_path / 'cache'), sidecar=True)
+        assert len(sidecars()) == 1
+    os.remove(os.path.join(str(tmp_path), sidecars()[0]))
+    multi_tile_layout.generate_layout(packaged_layout, network_config,
+            output=output, incremental=True, cache_dir=str(tmp_path / 'cache'),
+            sidecar=True)
+    name, = sidecars()
+    with open(output, 'rb') as f:
+        data = f.read()
+    assert (compiled.read_compiled(os.path.join(str(tmp_path), name))
+            == yamlio.parse(data))
@@ -0,0 +1,57 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from larpixgeometry.multitile import MultiTileGeometry
+
+PITCH = 4.434
+# One tile per orientation, in (z, y, x) order as in the layout files
+ORIENTATIONS = [[0, y, x] for y, x in itertools.product((1, -1), (1, -1))]
+
+def _layout():
+    # 2 chips of a 3x2 grid of pixels, channel 5 of each chip unconnected
+    positions = {}
+    for chip, channel in itertools.product((11, 12), range(5)):
+        pixel = (chip - 11) * 5 + channel
+        positions[chip*1000 + channel] = [pixel % 5, pixel // 5]
+    tiles = range(1, len(ORIENTATIONS) + 1)
+    return {
+            'pixel_pitch': PITCH,
+            'chip_channel_to_position': positions,
+            'tile_positions': {tile: [100. * tile, 10. * tile, -20. * tile]
+                for tile in tiles},
+            'tile_orientations': dict(zip(tiles, ORIENTATIONS)),
+            'tile_chip_to_io': {tile: {11: tile*1000 + 1, 12: tile*1000 + 2}
+                for tile in tiles},
+            }
+
+def test_global_local_round_trip():
+    d = _layout()
+    geometry = MultiTileGeometry.fromDict(d)
+    width, height = 5 * PITCH, 2 * PITCH
+    for tile, io in d['tile_chip_to_io'].items():
+        position = np.array(d['tile_positions'][tile])
+        orientation = np.array(d['tile_orientations'][tile])
+        for chip, io_code in io.items():
+            io_group, io_channel = divmod(io_code, 1000)
+            channels = np.arange(5)
+            x, y, z = geometry.to_global(io_group, io_channel, chip, channels)
+            np.testing.assert_array_equal(z, position[0])
+            # Back to the pixel grid of the tile
+            i = ((x - position[2]) * orientation[2] + width/2 - PITCH/2) / PITCH
+            j = ((y - position[1]) * orientation[1] + height/2 - PITCH/2) / PITCH
+            expected = np.array([d['chip_channel_to_position'][chip*1000 + c]
+                for c in channels])
+            np.testing.assert_allclose(np.column_stack((i, j)), expected,
+                    atol=1e-9)
+            assert (geometry.tiles(io_group, io_channel, chip) == tile).all()
+            rows = geometry.channel_index(io_group, io_channel, chip, channels)
+            np.testing.assert_array_equal(geometry.columns['x'][rows], x)
+
+@pytest.mark.parametrize('address', [(1, 1, 11, 5), (1, 1, 13, 0),
+    (9, 1, 11, 0), (-1, 1, 11, 0), (1, 1, 11, 1000)])
+def test_unknown_channels(address):
+    geometry = MultiTileGeometry.fromDict(_layout())
+    assert geometry.channel_index(*address) == -1
+    assert np.isnan(geometry.to_global(*address)).all()
@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+import pytest
+
+from larpixgeometry.layouts import compiled, yamlio
+from larpixgeometry.layouts import patterngenerator as pg
+from larpixgeometry.pixelplane import PixelPlane, PlaneCache
+
+def _layout():
+    d = pg.build_layout(pg.tile_spec([11, 12], [0, 1], [0, 0]))
+    d['pixels'][0][3] = [[0.0, 0.0], [1.0, 0.0], [1.0, 1.5]]
+    return yamlio.parse(yamlio.dumps(d))
+
+@pytest.fixture
+def layout_file(tmp_path, monkeypatch):
+    monkeypatch.setenv(compiled.CACHE_DIR_ENV, str(tmp_path / 'cache'))
+    path = str(tmp_path / 'layout-test.yaml')
+    yamlio.dump(_layout(), path)
+    return path
+
+def test_frozen_plane_is_read_only():
+    plane = PixelPlane.fromDict(_layout()).freeze()
+    pixel = plane.pixels[0]
+    with pytest.raises(AttributeError):
+        pixel.x = 1.
+    assert isinstance(pixel.pad_outline, tuple)
+    assert isinstance(pixel.pad_outline[0], tuple)
+    chip = plane.chips[11]
+    with pytest.raises(AttributeError):
+        chip.chipid = 13
+    with pytest.raises(AttributeError):
+        chip.channel_connections = []
+    assert isinstance(chip.channel_connections, tuple)
+    assert chip.channel_connections[0] is plane.pixels[
+            chip.channel_connections[0].pixelid]
+    with pytest.raises(TypeError):
+        plane.chips[13] = chip
+    with pytest.raises(ValueError):
+        plane.columns['x'][0] = 0.
+    with pytest.raises(AttributeError):
+        plane.unconnected_pixel.x = 0.
+    assert isinstance(plane.unconnected_pixel.channel_connection, tuple)
+
+def test_objects_from_before_freeze_stay_mutable():
+    plane = PixelPlane.fromDict(_layout())
+    pixel = plane.pixels[0]
+    plane.freeze()
+    pixel.x = 1.
+    assert plane.pixels[0] is not pixel
+    assert plane.pixels[0].x != 1.
+
+def test_plane_cache_reloads(layout_file):
+    cache = PlaneCache()
+    plane = cache.get(layout_file)
+    assert cache.get(layout_file) is plane
+    # Touched but unchanged: the same plane
+    stat = os.stat(layout_file)
+    os.utime(layout_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.get(layout_file) is plane
+    # Changed: a new plane
+    d = _layout()
+    d['pixels'][1][1] += 1.
+    yamlio.dump(d, layout_file)
+    reloaded = cache.get(layout_file)
+    assert reloaded is not plane
+    assert reloaded.pixels[d['pixels'][1][0]].x == d['pixels'][1][1]
+    assert cache.stats() == {'hits': 2, 'misses': 2, 'invalidations': 1,
+            'size': 1, 'maxsize': 8}
+    assert cache._build_locks == {}
+
+def test_plane_cache_bound(tmp_path, layout_file):
+    cache = PlaneCache(maxsize=2)
+    paths = []
+    for i in range(3):
+        path = str(tmp_path / ('layout-%d.yaml' % i))
+        yamlio.dump(_layout(), path)
+        paths.append(path)
+        cache.get(path)
+    assert cache.stats()['size'] == 2
+    planes = [cache.get(path) for path in paths[1:]]
+    assert cache.stats()['hits'] == 2
+    np.testing.assert_array_equal(planes[0].columns['x'],
+            planes[1].columns['x'])
+
+def _pixel_fields(plane):
+    return [(pixel.pixelid, pixel.x, pixel.y, [list(v) for v in
+        pixel.pad_outline], [list(v) for v in pixel.focus_outline])
+        for pixel in plane.pixels.values()]
+
+def test_to_from_file(tmp_path):
+    plane = PixelPlane.fromDict(_layout())
+    filename = str(tmp_path / 'layout-test.lpg')
+    plane.toFile(filename)
+    mapped = PixelPlane.fromFile(filename)
+    assert mapped.columns.keys() == plane.columns.keys()
+    for key, value in plane.columns.items():
+        np.testing.assert_array_equal(mapped.columns[key], value)
+    assert _pixel_fields(mapped) == _pixel_fields(plane)
+    assert list(mapped.chips) == list(plane.chips)
+    for chipid, chip in plane.chips.items():
+        assert ([pixel.pixelid for pixel in
+            mapped.chips[chipid].channel_connections]
+            == [pixel.pixelid for pixel in chip.channel_connections])
+    assert dict(mapped.dimensions) == dict(plane.dimensions)
+    assert mapped.pad_outlines.tolist() == plane.pad_outlines.tolist()
+    pixelids, _, _ = mapped.pixels_containing([0.75, 0.25], [0.25, 0.75])
+    assert pixelids.tolist() == [_layout()['pixels'][0][0], -1]
@@ -0,0 +1,54 @@
+import numpy as np
+
+from larpixgeometry.spatialindex import GridIndex
+
+def _grid(n=70, pitch=4.434):
+    i, j = np.meshgrid(np.arange(n), np.arange(n))
+    return ((i.reshape(-1) + 0.5) * pitch - n * pitch / 2,
+            (j.reshape(-1) + 0.5) * pitch - n * pitch / 2)
+
+def _brute_force(x, y, qx, qy):
+    d2 = (x[None, :] - qx[:, None])**2 + (y[None, :] - qy[:, None])**2
+    return np.sqrt(d2.min(axis=1))
+
+def _check(index, x, y, qx, qy):
+    indices, distances = index.nearest(qx, qy)
+    expected = _brute_force(x, y, qx, qy)
+    np.testing.assert_allclose(distances, expected)
+    np.testing.assert_allclose(np.hypot(x[indices] - qx, y[indices] - qy),
+            expected)
+
+def test_nearest_far_away():
+    x, y = _grid()
+    index = GridIndex(x, y)
+    rng = np.random.default_rng(0)
+    for distance in (100., 1000., 1e6):
+        angle = rng.uniform(0, 2 * np.pi, 2000)
+        qx = 155 * np.cos(angle) + distance * np.sign(np.cos(angle))
+        qy = 155 * np.sin(angle) + distance * np.sign(np.sin(angle))
+        _check(index, x, y, qx, qy)
+
+def test_nearest_mixed_near_and_far():
+    x, y = _grid()
+    index = GridIndex(x, y)
+    rng = np.random.default_rng(1)
+    qx = np.concatenate((rng.uniform(-160, 160, 3000),
+        rng.uniform(-1e4, 1e4, 3000)))
+    qy = np.concatenate((rng.uniform(-160, 160, 3000),
+        rng.uniform(-1e4, 1e4, 3000)))
+    order = rng.permutation(len(qx))
+    _check(index, x, y, qx[order], qy[order])
+
+def test_nearest_irregular_points():
+    rng = np.random.default_rng(2)
+    x, y = rng.uniform(0, 50, 500), rng.uniform(0, 5, 500)
+    index = GridIndex(x, y)
+    qx, qy = rng.uniform(-500, 500, 4000), rng.uniform(-500, 500, 4000)
+    _check(index, x, y, qx, qy)
+
+def test_nearest_non_finite():
+    x, y = _grid(4)
+    indices, distances = GridIndex(x, y).nearest([np.nan, np.inf, 0.],
+            [0., 0., np.nan])
+    assert indices.tolist() == [-1, -1, -1]
+    assert np.all(np.isinf(distances))